@@ -0,0 +1,78 @@
+"""Benchmark FAME time series writing / reading against the pandas path
+
+Uses an hourly time series over 15 years (leap days cut) which corresponds
+to the simulation horizon of the workflow.
+
+Run from the repository root: python -m benchmarks.benchmark_fame_time_series
+"""
+import os
+import tempfile
+import timeit
+
+import numpy as np
+import pandas as pd
+
+from dr_analyses.fame_time_series import (
+    read_fame_time_series,
+    save_series_for_fame,
+)
+from dr_analyses.time import create_time_index, cut_leap_days
+
+REPETITIONS = 5
+
+
+def create_benchmark_series() -> pd.Series:
+    """Create a 15-year hourly time series with random values"""
+    time_index = create_time_index(
+        "2019-12-31_23:58:00", "2034-12-31_23:58:00"
+    )
+    series = pd.Series(
+        index=time_index,
+        data=np.random.default_rng(42).random(len(time_index)),
+    )
+    return cut_leap_days(series)
+
+
+def write_with_pandas(series: pd.Series, file_name: str) -> None:
+    """Former way of writing FAME time series"""
+    to_write = series.copy()
+    to_write.index = to_write.index.astype(str).str.replace(" ", "_")
+    to_write.to_csv(file_name, header=False, sep=";")
+
+
+def read_with_pandas(file_name: str) -> pd.Series:
+    """Former way of reading FAME time series"""
+    series = pd.read_csv(file_name, sep=";", index_col=0, header=None)
+    series.index = pd.to_datetime(series.index.str.replace("_", " "))
+    return series[1]
+
+
+if __name__ == "__main__":
+    series = create_benchmark_series()
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        pandas_file = os.path.join(tmp_dir, "pandas.csv")
+        fast_file = os.path.join(tmp_dir, "fast.csv")
+        timings = {
+            "write (pandas)": timeit.timeit(
+                lambda: write_with_pandas(series, pandas_file),
+                number=REPETITIONS,
+            ),
+            "write (fame_time_series)": timeit.timeit(
+                lambda: save_series_for_fame(series, fast_file),
+                number=REPETITIONS,
+            ),
+            "read (pandas)": timeit.timeit(
+                lambda: read_with_pandas(pandas_file), number=REPETITIONS
+            ),
+            "read (fame_time_series)": timeit.timeit(
+                lambda: read_fame_time_series(fast_file, parse_dates=True),
+                number=REPETITIONS,
+            ),
+        }
+        with open(pandas_file) as pandas_output, open(fast_file) as output:
+            identical = pandas_output.read() == output.read()
+
+    print(f"Series length: {len(series)} hourly values")
+    print(f"Identical file contents: {identical}")
+    for name, timing in timings.items():
+        print(f"{name}: {timing / REPETITIONS * 1000:.1f} ms per call")
@@ -0,0 +1,78 @@
+"""Benchmark import time of the workflow entry points and dr_analyses
+
+Imports each module in a fresh interpreter with `python -X importtime`
+and reports the cumulative import time (median over repetitions) as well
+as which heavy dependencies got imported along with it. Entry points run
+their stages under `if __name__ == "__main__"`, hence importing them
+measures the startup cost before any stage is run.
+
+Run from the repository root: python -m benchmarks.benchmark_import_time
+"""
+import os
+import statistics
+import subprocess
+import sys
+from typing import Dict, List
+
+REPETITIONS = 5
+ENTRY_POINTS = [
+    "workflow",
+    "dispatch_inspection",
+    "cross_comparison",
+    "price_sensitivity_analysis",
+]
+HEAVY_DEPENDENCIES = [
+    "matplotlib",
+    "fastapi",
+    "uvicorn",
+    "pyomo",
+    "fameio",
+    "numpy_financial",
+]
+
+
+def get_dr_analyses_modules() -> List[str]:
+    """Return names of all modules of the dr_analyses package"""
+    return sorted(
+        f"dr_analyses.{file_name[:-3]}"
+        for file_name in os.listdir("dr_analyses")
+        if file_name.endswith(".py") and file_name != "__init__.py"
+    )
+
+
+def measure_import(module: str) -> Dict:
+    """Import module in a fresh interpreter and parse -X importtime output
+
+    :param str module: name of the module to import
+    :return dict: cumulative import time in ms and heavy dependencies
+    """
+    check = (
+        f"import sys, {module}; "
+        f"print(*[d for d in {HEAVY_DEPENDENCIES} if d in sys.modules])"
+    )
+    process = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", check],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    cumulative_us = 0
+    for line in process.stderr.splitlines():
+        fields = line.split("|")
+        if len(fields) == 3 and fields[2].strip() == module:
+            cumulative_us = int(fields[1])
+    return {
+        "milliseconds": cumulative_us / 1000,
+        "dependencies": process.stdout.split(),
+    }
+
+
+if __name__ == "__main__":
+    print(f"{'module':<45}{'ms':>8}  heavy dependencies imported")
+    for module in ENTRY_POINTS + get_dr_analyses_modules():
+        measurements = [measure_import(module) for _ in range(REPETITIONS)]
+        milliseconds = statistics.median(
+            measurement["milliseconds"] for measurement in measurements
+        )
+        dependencies = ", ".join(measurements[0]["dependencies"]) or "-"
+        print(f"{module:<45}{milliseconds:>8.1f}  {dependencies}")
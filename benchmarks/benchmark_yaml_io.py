@@ -0,0 +1,85 @@
+"""Benchmark scenario YAML dumping / loading with and without libyaml
+
+Uses the scenario template with all includes resolved, extended by the
+load shifting agent and investment results, i.e. a full scenario as it
+is written for each scenario of a tariff grid.
+
+Run from the repository root: python -m benchmarks.benchmark_yaml_io
+"""
+import os
+import shutil
+import tempfile
+import timeit
+
+import yaml
+from fameio.source.loader import load_yaml
+
+from dr_analyses.yaml_io import Dumper, dump_yaml_file, load_yaml_file
+
+REPETITIONS = 5
+
+
+def create_benchmark_scenario(tmp_dir: str) -> dict:
+    """Resolve scenario template and add load shifting and investments
+
+    Template includes are given relative to inputs/scenarios/<cluster>/,
+    hence the folder structure is replicated in a temporary directory.
+    """
+    scenario_folder = os.path.join(tmp_dir, "inputs", "scenarios", "cluster")
+    os.makedirs(scenario_folder)
+    shutil.copytree("template", os.path.join(tmp_dir, "template"))
+    shutil.copytree(
+        "inputs/contracts_wo_dr",
+        os.path.join(tmp_dir, "inputs", "contracts_wo_dr"),
+    )
+    scenario_file = os.path.join(scenario_folder, "scenario.yaml")
+    shutil.copyfile("template/scenario_template_wo_dr.yaml", scenario_file)
+    scenario = load_yaml(scenario_file)
+    scenario["Agents"].extend(
+        load_yaml("template/load_shifting_config_template.yaml")["Agents"]
+    )
+    scenario["Agents"].extend(
+        load_yaml("template/investment_results_template.yaml")["Agents"]
+    )
+    return scenario
+
+
+def dump_with_python(scenario: dict, file_name: str) -> None:
+    """Former way of dumping scenario yaml files"""
+    with open(file_name, "w") as file:
+        yaml.dump(scenario, file, sort_keys=False)
+
+
+if __name__ == "__main__":
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        scenario = create_benchmark_scenario(tmp_dir)
+        python_file = os.path.join(tmp_dir, "python.yaml")
+        fast_file = os.path.join(tmp_dir, "fast.yaml")
+        timings = {
+            "dump (pure Python)": timeit.timeit(
+                lambda: dump_with_python(scenario, python_file),
+                number=REPETITIONS,
+            ),
+            "dump (yaml_io)": timeit.timeit(
+                lambda: dump_yaml_file(scenario, fast_file),
+                number=REPETITIONS,
+            ),
+            "load (fameio)": timeit.timeit(
+                lambda: load_yaml(python_file), number=REPETITIONS
+            ),
+            "load (yaml_io)": timeit.timeit(
+                lambda: load_yaml_file(fast_file), number=REPETITIONS
+            ),
+        }
+        with open(python_file) as python_output, open(fast_file) as output:
+            identical = python_output.read() == output.read()
+        equal_data = load_yaml(python_file) == load_yaml_file(fast_file)
+        file_size = os.path.getsize(fast_file)
+
+    print(f"Scenario file size: {file_size / 1e6:.2f} MB")
+    libyaml_used = Dumper is getattr(yaml, "CDumper", None)
+    print(f"libyaml dumper used: {libyaml_used}")
+    print(f"Identical file contents: {identical}")
+    print(f"Identical data loaded: {equal_data}")
+    for name, timing in timings.items():
+        print(f"{name}: {timing / REPETITIONS * 1000:.1f} ms per call")
@@ -12,7 +12,8 @@ from dr_analyses.workflow_config import (
     extract_simple_config,
     extract_config_plotting,
 )
-from dr_analyses.workflow_routines import load_yaml_file, prepare_tariffs_list
+from dr_analyses.workflow_routines import prepare_tariffs_list
+from dr_analyses.yaml_io import load_yaml_file
 
 if __name__ == "__main__":
     args = add_args()
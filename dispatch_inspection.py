@@ -5,17 +5,12 @@ from dr_analyses.dispatch_inspection_routines import (
     retrieve_combined_result,
     slice_combined_result,
 )
-from dr_analyses.plotting import (
-    plot_single_dispatch_pattern,
-    configure_plots,
-    plot_weekly_dispatch_situations,
-)
 from dr_analyses.workflow_config import (
     add_args,
     extract_simple_config,
     extract_config_plotting,
 )
-from dr_analyses.workflow_routines import load_yaml_file
+from dr_analyses.yaml_io import load_yaml_file
 
 if __name__ == "__main__":
     args = add_args()
@@ -51,6 +46,13 @@ if __name__ == "__main__":
                             continue
 
     if config_workflow["plot_dispatch_situations"]:
+        # matplotlib is only imported if plots are actually created
+        from dr_analyses.plotting import (
+            configure_plots,
+            plot_single_dispatch_pattern,
+            plot_weekly_dispatch_situations,
+        )
+
         for cluster, tariffs in config_plotting["cases"].items():
             for tariff in tariffs:
                 combined_result = retrieve_combined_result(
@@ -1,13 +1,32 @@
+import copy
 import math
-import os
-from typing import Dict, List, Any
+from typing import Any, Dict, List, Tuple
 
+import numpy as np
 import pandas as pd
-import yaml
 from fameio.source.cli import Options
-from fameio.source.loader import load_yaml
 
+from dr_analyses.fame_time_series import save_series_for_fame
 from dr_analyses.time import cut_leap_days, create_time_index
+from dr_analyses.yaml_io import dump_yaml_file, load_yaml_file
+
+# Physical quantities stored as float32 in compact results;
+# monetary columns are kept at float64 precision
+COMPACT_FLOAT_COLUMNS = [
+    "NetAwardedPower",
+    "StoredMWh",
+    "CurrentShiftTime",
+    "AbsoluteNetAwardedPower",
+    "AbsoluteStoredMWh",
+    "BaselineLoadProfile",
+    "LoadAfterShifting",
+]
+COMPACT_FLAG_COLUMNS = ["ShiftCycleEnd"]
+COMPACT_METADATA_COLUMNS = ["AgentId"]
+# Summary parameters calculated from compact results deviate at most by this
+# relative tolerance from the magnitude of the physical quantities they are
+# derived from (sums are accumulated in float64 by pandas)
+COMPACT_RESULTS_RTOL = 1e-6
 
 
 def trim_file_name(file_name: str) -> str:
@@ -73,25 +92,23 @@ def replace_path_for_list_entries(
     to_iterate: Dict, entries: List, key: str
 ) -> None:
     """Replace the pointer to a dedicated file by using key"""
-    for k, v in to_iterate.items():
-        for entry in entries:
-            if entry == k:
-                new_value = (
-                    f"{v.rsplit('/', 2)[0]}/{key.split('_', 1)[0]}/"
-                    f"{v.rsplit('/', 2)[-1]}"
-                )
-                # Update with value from respective scenario
-                to_iterate[k] = new_value
+    for entry in entries:
+        if entry in to_iterate:
+            v = to_iterate[entry]
+            new_value = (
+                f"{v.rsplit('/', 2)[0]}/{key.split('_', 1)[0]}/"
+                f"{v.rsplit('/', 2)[-1]}"
+            )
+            # Update with value from respective scenario
+            to_iterate[entry] = new_value
 
 
 def replace_using_dict_values(to_iterate: Dict, entries: Dict) -> None:
     """Replace previous entries by the once in given dict entries"""
-    for k, v in to_iterate.items():
-        for entry, value in entries.items():
-            if entry == k:
-                new_value = value
-                # Update with value from respective scenario
-                to_iterate[k] = new_value
+    for entry, value in entries.items():
+        if entry in to_iterate:
+            # Update with value from respective scenario
+            to_iterate[entry] = value
 
 
 def replace_path_within_list(
@@ -99,18 +116,18 @@ def replace_path_within_list(
 ) -> None:
     """Replace values of list-structured attribute by replacing path"""
     for el in to_iterate:
-        for k, v in el.items():
-            for entry in entries:
-                if entry == k:
-                    try:
-                        new_value = (
-                            f"{v.rsplit('/', 2)[0]}/{key.split('_', 1)[0]}/"
-                            f"{v.rsplit('/', 2)[-1]}"
-                        )
-                        # Update with value from respective scenario
-                        el[k] = new_value
-                    except AttributeError:
-                        continue
+        for entry in entries:
+            if entry in el:
+                v = el[entry]
+                try:
+                    new_value = (
+                        f"{v.rsplit('/', 2)[0]}/{key.split('_', 1)[0]}/"
+                        f"{v.rsplit('/', 2)[-1]}"
+                    )
+                    # Update with value from respective scenario
+                    el[entry] = new_value
+                except AttributeError:
+                    continue
 
 
 def replace_values_within_list(to_iterate: List[Dict], entries: Dict) -> None:
@@ -160,17 +177,68 @@ def add_load_shifting_tariff(
 
 def save_to_fame_time_series(ts: pd.DataFrame, config: Dict, key: str):
     """Save given time series to FAME format for given scenario (key)"""
-    ts.index = ts.index.astype(str).str.replace(" ", "_")
-    ts.to_csv(
+    save_series_for_fame(
+        ts,
         f"{config['input_folder']}"
         f"{config['data_sub_folder']}/"
         f"{config['load_shifting_focus_cluster']}/"
         f"{key.split('_')[0]}/price_forecast.csv",
-        header=False,
-        sep=";",
     )
 
 
+def build_path_index(tree: Dict or List) -> List[Tuple[Dict or List, Any]]:
+    """Return (parent, key) pairs for all string leaves of given tree
+
+    The index allows to rewrite all string values, i.e. file paths,
+    in a single pass without traversing the tree again.
+    """
+    path_index = []
+    to_visit = [tree]
+    while to_visit:
+        node = to_visit.pop()
+        items = node.items() if isinstance(node, dict) else enumerate(node)
+        for key, value in items:
+            if isinstance(value, str):
+                path_index.append((node, key))
+            elif isinstance(value, (dict, list)):
+                to_visit.append(value)
+            elif not isinstance(value, (int, float)) and value is not None:
+                raise ValueError(
+                    f"Unexpected type of `{value}`. "
+                    f"Should be either str/list/dict."
+                )
+
+    return path_index
+
+
+def update_paths_with_focus_cluster(
+    path_index: List[Tuple[Dict or List, Any]], focus_cluster: str
+) -> None:
+    """Update all indexed paths with load shifting focus cluster"""
+    data_location_to_be_replaced = "/data/"
+    data_location_replacement = (
+        f"{data_location_to_be_replaced}{focus_cluster}/"
+    )
+    cluster_string_to_be_replaced = "ind_cluster_shift_only"
+    for parent, key in path_index:
+        value = parent[key]
+        if cluster_string_to_be_replaced in value:
+            value = replace_value(
+                value,
+                cluster_string_to_be_replaced,
+                focus_cluster,
+                exclude=focus_cluster,
+            )
+        if data_location_to_be_replaced in value:
+            value = replace_value(
+                value,
+                data_location_to_be_replaced,
+                data_location_replacement,
+                exclude=data_location_replacement,
+            )
+        parent[key] = value
+
+
 def replace_value(
     value: str, to_be_replaced: str, replacement: str, exclude: str
 ) -> str:
@@ -191,8 +259,12 @@ class Container:
     :attr dict config_convert: the configuration for converting AMIRIS results
     :attr str trimmed_scenario: scenario to be analyzed (name only)
     :attr str trimmed_baseline_scenario: baseline scenario (name only)
+    :attr dict scenario_yaml: scenario configuration; a copy of the given
+    template if provided, else read from the scenario file
     :attr pd.DataFrame or NoneType results: load shifting results from the
     simulation
+    :attr dict results_metadata: constant results columns removed
+    when compacting results
     :attr pd.DataFrame or NoneType power_prices: end consumer power price
     time series
     :attr pd.DataFrame or NoneType baseline_power_prices: end consumer power price
@@ -215,20 +287,27 @@ class Container:
         config_convert,
         config_make,
         baseline_scenario,
+        scenario_yaml: Dict = None,
     ):
         self.scenario = scenario
         self.config_workflow = config_workflow
-        self.config_convert = config_convert
-        self.config_make = config_make
+        # Copies, since output locations are set per scenario
+        self.config_convert = config_convert.copy()
+        self.config_make = config_make.copy()
         self.trimmed_scenario = trim_file_name(scenario)
         self.trimmed_baseline_scenario = trim_file_name(baseline_scenario)
-        self.scenario_yaml = load_yaml(self.scenario)
+        if scenario_yaml is not None:
+            self.scenario_yaml = copy.deepcopy(scenario_yaml)
+        else:
+            self.scenario_yaml = load_yaml_file(self.scenario)
         self.results = None
+        self.results_metadata = {}
         self.power_prices = None
         self.baseline_power_prices = None
         self.load_shifting_data = None
         self.dynamic_components = None
         self.cashflows = None
+        self.cashflow_components = None
         self.investment_expenses = None
         self.npv = None
         self.npv_per_capacity = None
@@ -239,6 +318,35 @@ class Container:
     def set_results(self, results: pd.DataFrame) -> None:
         self.results = results
 
+    def compact_results(self) -> None:
+        """Store results in a compact representation to reduce memory usage
+
+        Physical quantities are converted to float32, flags to int8 and
+        constant identifier columns are moved to results_metadata.
+        Summary parameters stay within COMPACT_RESULTS_RTOL, which is
+        checked if config_workflow["check_compact_results"] is set.
+        """
+        dtypes = {
+            **{
+                col: np.float32
+                for col in COMPACT_FLOAT_COLUMNS
+                if col in self.results.columns
+            },
+            **{
+                col: np.int8
+                for col in COMPACT_FLAG_COLUMNS
+                if col in self.results.columns
+            },
+        }
+        self.results = self.results.astype(dtypes)
+        for col in COMPACT_METADATA_COLUMNS:
+            if (
+                col in self.results.columns
+                and self.results[col].nunique() == 1
+            ):
+                self.results_metadata[col] = self.results[col].iloc[0].item()
+                self.results.drop(columns=col, inplace=True)
+
     def set_power_prices(self, power_prices: pd.DataFrame) -> None:
         self.power_prices = power_prices
 
@@ -307,7 +415,9 @@ class Container:
             templates["load_shifting"],
             key,
         )
-        self.scenario_yaml["Agents"].append(templates["load_shifting"])
+        self.scenario_yaml["Agents"].append(
+            copy.deepcopy(templates["load_shifting"])
+        )
 
     def add_load_shifting_agent(
         self, load_shifting_config: Dict, key: str
@@ -453,7 +563,9 @@ class Container:
     ):
         """Update load shedding config for a given scenario"""
         demand_trader = self.get_agents_by_type("DemandTrader")[0]
-        self.update_demand_trader(demand_trader, key, load_shedding_template)
+        self.update_demand_trader(
+            demand_trader, key, copy.deepcopy(load_shedding_template)
+        )
 
     def get_agents_by_type(self, agent_type: str) -> List[Dict]:
         """Returns list of agents of given type"""
@@ -496,7 +608,7 @@ class Container:
                 key,
                 entries=["InstalledPowerInMW"],
             )
-        self.scenario_yaml["Agents"].extend(investment_results)
+        self.scenario_yaml["Agents"].extend(copy.deepcopy(investment_results))
 
     def create_dummy_price_forecast(self, key: str):
         """Create a dummy price forecast file containing only 0 entries"""
@@ -523,27 +635,34 @@ class Container:
             entries=["PriceForecastInEURperMWH"],
         )
 
-    def change_contract_location(self, path_to_new_contracts: str) -> None:
-        """Change the contract location to one of the subfolders in order to account for changes"""
-        contracts = []
-        contract_files = [
-            path_to_new_contracts + "/" + file
-            for file in os.listdir(path_to_new_contracts)
-            if "IGNORE_" not in file and file.endswith(".yaml")
-        ]
-        for file in contract_files:
-            contracts.extend(load_yaml(file)["Contracts"])
-        self.scenario_yaml["Contracts"] = contracts
+    def change_contracts(self, contracts: List[Dict]) -> None:
+        """Replace contracts, e.g. by those including demand response"""
+        self.scenario_yaml["Contracts"] = copy.deepcopy(contracts)
+
+    def set_load_shifting_service_url(self, service_url: str) -> None:
+        """Point load shifting agents to the given load shifting API"""
+        for agent in self.get_agents_by_type("LoadShiftingTrader"):
+            agent["Attributes"]["Strategy"]["Api"]["ServiceUrl"] = service_url
 
     def save_scenario_yaml(self) -> None:
         """Save 'scenario_yaml' attribute to yaml file"""
-        with open(self.scenario, "w") as file:
-            yaml.dump(self.scenario_yaml, file, sort_keys=False)
+        dump_yaml_file(self.scenario_yaml, self.scenario)
 
     def add_cashflows(self, cashflows: List):
         """Save cashflow results in container object"""
         self.cashflows = cashflows
 
+    def add_cashflow_components(self, cashflow_components: pd.DataFrame):
+        """Save annual cashflow components in container object"""
+        self.cashflow_components = cashflow_components
+
+    def write_cashflow_components(self) -> None:
+        """Write annual cashflow components to disk for financial sweeps"""
+        self.cashflow_components.to_csv(
+            self.config_convert[Options.OUTPUT] + "/cashflow_components.csv",
+            sep=";",
+        )
+
     def add_npv(self, npv: float):
         """Save net present value (NPV) results in container object"""
         self.npv = npv
@@ -573,64 +692,3 @@ class Container:
             - 2019
             + 1
         )
-
-    def update_all_paths_with_focus_cluster(self):
-        """Update all paths in yaml with load shifting focus cluster"""
-        data_location_to_be_replaced = "/data/"
-        data_location_replacement = (
-            f"{data_location_to_be_replaced}"
-            f"{self.config_workflow['load_shifting_focus_cluster']}/"
-        )
-        cluster_string_to_be_replaced = "ind_cluster_shift_only"
-        cluster_string_replacement = self.config_workflow[
-            "load_shifting_focus_cluster"
-        ]
-        for agent in self.scenario_yaml["Agents"]:
-            if "Attributes" in agent:
-                for key, val in agent["Attributes"].items():
-                    self.replace_recursively(
-                        agent["Attributes"],
-                        key,
-                        val,
-                        cluster_string_to_be_replaced,
-                        cluster_string_replacement,
-                    )
-                    self.replace_recursively(
-                        agent["Attributes"],
-                        key,
-                        val,
-                        data_location_to_be_replaced,
-                        data_location_replacement,
-                    )
-
-    def replace_recursively(
-        self,
-        agent: Dict,
-        key: str,
-        value: Any,
-        to_be_replaced: str,
-        replacement: str,
-    ):
-        """Recursively replaces value when given string is found in `value`"""
-        if isinstance(value, str):
-            if to_be_replaced in value:
-                agent[key] = replace_value(
-                    value, to_be_replaced, replacement, exclude=replacement
-                )
-        elif isinstance(value, dict):
-            for k, v in value.items():
-                self.replace_recursively(
-                    value, k, v, to_be_replaced, replacement
-                )
-        elif isinstance(value, list):
-            for item in value:
-                for k, v in item.items():
-                    self.replace_recursively(
-                        item, k, v, to_be_replaced, replacement
-                    )
-        elif isinstance(value, int) or isinstance(value, float):
-            pass
-        else:
-            raise ValueError(
-                f"Unexpected type of `{value}`. Should be either str/list/dict."
-            )
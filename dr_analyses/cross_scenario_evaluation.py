@@ -1,4 +1,5 @@
-from typing import Dict
+import os
+from typing import Dict, List
 
 import pandas as pd
 
@@ -6,20 +7,41 @@ from dr_analyses.container import trim_file_name
 from dr_analyses.workflow_routines import make_directory_if_missing
 
 
-def read_scenario_result(config_workflow: Dict, scenario: str) -> pd.Series:
-    """Read the scenario result and return it"""
-    print(f"Adding results for scenario {scenario} from file.")
-    return pd.read_csv(
+def get_scenario_result_file(config_workflow: Dict, scenario: str) -> str:
+    """Return the file holding the summary parameters of a scenario"""
+    return (
         f"{config_workflow['output_folder']}"
         f"{config_workflow['load_shifting_focus_cluster']}/"
         f"{trim_file_name(scenario).split('_')[3]}/"
         f"{trim_file_name(scenario)}"
-        f"/parameter_summary.csv",
+        f"/parameter_summary.csv"
+    )
+
+
+def read_scenario_result(config_workflow: Dict, scenario: str) -> pd.Series:
+    """Read the scenario result and return it"""
+    print(f"Adding results for scenario {scenario} from file.")
+    return pd.read_csv(
+        get_scenario_result_file(config_workflow, scenario),
         sep=";",
         index_col=0,
     )["Summary"]
 
 
+def get_missing_scenario_results(
+    config_workflow: Dict, scenario_files: Dict[str, str]
+) -> List[str]:
+    """Return tariff scenarios without summary parameters, e.g. of shards"""
+    return [
+        dr_scen
+        for dr_scen, scenario in scenario_files.items()
+        if "_wo_dr" not in scenario
+        and not os.path.isfile(
+            get_scenario_result_file(config_workflow, scenario)
+        )
+    ]
+
+
 def concat_results(scenario_results: Dict) -> pd.DataFrame:
     """Combine parameter results to an overall data set"""
     overall_results = pd.concat(
@@ -0,0 +1,171 @@
+from typing import List
+
+import numpy as np
+import pandas as pd
+
+FAME_TIME_STAMP_LENGTH = 19
+# (start position, number of digits) of year, month, day, hour, minute, second
+FAME_TIME_STAMP_FIELDS = [(0, 4), (5, 2), (8, 2), (11, 2), (14, 2), (17, 2)]
+FAME_TIME_STAMP_SEPARATORS = {4: "-", 7: "-", 10: "_", 13: ":", 16: ":"}
+
+
+def create_fame_time_stamps(
+    year, month=1, day=1, hour=0, minute=0, second=0
+) -> np.ndarray:
+    """Return FAME time stamps (YYYY-MM-DD_hh:mm:ss) from integer arrays
+
+    All arguments may be scalars or integer arrays of matching length.
+    Digits are written into a fixed-width character buffer instead of
+    formatting each time stamp individually.
+    """
+    components = np.broadcast_arrays(
+        *[
+            np.atleast_1d(np.asarray(component, dtype=np.int64))
+            for component in [year, month, day, hour, minute, second]
+        ]
+    )
+    buffer = np.empty(
+        (components[0].size, FAME_TIME_STAMP_LENGTH), dtype=np.uint8
+    )
+    for position, separator in FAME_TIME_STAMP_SEPARATORS.items():
+        buffer[:, position] = ord(separator)
+    for component, (start, width) in zip(components, FAME_TIME_STAMP_FIELDS):
+        remainder = component.ravel()
+        for position in range(start + width - 1, start - 1, -1):
+            buffer[:, position] = remainder % 10 + ord("0")
+            remainder = remainder // 10
+
+    return buffer.view(f"S{FAME_TIME_STAMP_LENGTH}").ravel().astype(str)
+
+
+def convert_to_fame_time_stamps(index: pd.DatetimeIndex) -> np.ndarray:
+    """Return FAME time stamps for a given DatetimeIndex"""
+    return create_fame_time_stamps(
+        index.year,
+        index.month,
+        index.day,
+        index.hour,
+        index.minute,
+        index.second,
+    )
+
+
+def parse_fame_time_stamps(time_stamps) -> pd.DatetimeIndex:
+    """Parse FAME time stamps to a DatetimeIndex using fixed-width digits"""
+    buffer = (
+        np.asarray(time_stamps, dtype=f"S{FAME_TIME_STAMP_LENGTH}")
+        .view(np.uint8)
+        .reshape(-1, FAME_TIME_STAMP_LENGTH)
+        .astype(np.int64)
+        - ord("0")
+    )
+    year, month, day, hour, minute, second = [
+        buffer[:, start : start + width] @ (10 ** np.arange(width - 1, -1, -1))
+        for start, width in FAME_TIME_STAMP_FIELDS
+    ]
+    seconds = (
+        days_since_epoch(year, month, day) * 86400
+        + hour * 3600
+        + minute * 60
+        + second
+    )
+
+    return pd.DatetimeIndex(seconds.astype("datetime64[s]"))
+
+
+def days_since_epoch(
+    year: np.ndarray, month: np.ndarray, day: np.ndarray
+) -> np.ndarray:
+    """Return days since 1970-01-01 for civil dates (proleptic Gregorian)"""
+    year = year - (month <= 2)
+    era = year // 400
+    year_of_era = year - era * 400
+    day_of_year = (153 * np.where(month > 2, month - 3, month + 9) + 2) // 5
+    day_of_year += day - 1
+    day_of_era = (
+        year_of_era * 365
+        + year_of_era // 4
+        - year_of_era // 100
+        + day_of_year
+    )
+    return era * 146097 + day_of_era - 719468
+
+
+def format_values(values) -> List[str]:
+    """Format values like pandas' csv writer does (shortest repr, NaN empty)
+
+    Floats of lower precision than float64 are formatted by the shortest
+    repr of their own dtype, e.g. float32 values by seven digits or less.
+    """
+    values = np.asarray(values)
+    if values.dtype.kind == "f" and values.dtype != np.float64:
+        return [str(value) if value == value else "" for value in values]
+    return [
+        repr(value) if value == value else "" for value in values.tolist()
+    ]
+
+
+def write_fame_time_series(file_name: str, time_stamps, values) -> None:
+    """Write a FAME time series file in one buffered call
+
+    :param str file_name: file to write to
+    :param np.ndarray time_stamps: FAME time stamps
+    :param np.ndarray values: values belonging to the time stamps
+    """
+    if len(time_stamps) != len(values):
+        raise ValueError(
+            f"Number of time stamps ({len(time_stamps)}) does not match "
+            f"number of values ({len(values)})."
+        )
+    with open(file_name, "w") as file:
+        file.write(
+            "".join(
+                [
+                    f"{time_stamp};{value}\n"
+                    for time_stamp, value in zip(
+                        np.asarray(time_stamps).tolist(),
+                        format_values(values),
+                    )
+                ]
+            )
+        )
+
+
+def save_series_for_fame(
+    time_series: pd.Series or pd.DataFrame, file_name: str
+) -> None:
+    """Save a time series (or a single-column DataFrame) in FAME format
+
+    The index may either be a DatetimeIndex or already hold FAME time stamps.
+    """
+    if isinstance(time_series, pd.DataFrame):
+        if len(time_series.columns) != 1:
+            raise ValueError(
+                "Only single-column DataFrames can be saved as FAME time "
+                "series."
+            )
+        time_series = time_series.iloc[:, 0]
+    if isinstance(time_series.index, pd.DatetimeIndex):
+        time_stamps = convert_to_fame_time_stamps(time_series.index)
+    else:
+        time_stamps = time_series.index.astype(str)
+    write_fame_time_series(file_name, time_stamps, time_series.values)
+
+
+def read_fame_time_series(
+    file_name: str, parse_dates: bool = False
+) -> pd.Series:
+    """Read a FAME time series file and return it as a Series
+
+    :param str file_name: file to read from
+    :param bool parse_dates: if True, return a DatetimeIndex instead of
+    FAME time stamps
+    """
+    time_series = pd.read_csv(
+        file_name, sep=";", header=None, index_col=0, dtype={0: str}
+    )[1]
+    if parse_dates:
+        time_series.index = parse_fame_time_stamps(time_series.index.values)
+        time_series.index.name = 0
+
+    return time_series
@@ -0,0 +1,238 @@
+import os
+from typing import Dict, List
+
+import numpy as np
+import pandas as pd
+
+from dr_analyses.cross_scenario_evaluation import get_scenario_result_file
+from dr_analyses.results_subroutines import calculate_annuity_factor
+from dr_analyses.workflow_routines import make_directory_if_missing
+
+SWEEP_DIMENSIONS = [
+    "scenario",
+    "interest_rate",
+    "investment_year",
+    "investment_expenses_scaling",
+]
+
+
+def get_cashflow_components_file(config_workflow: Dict, scenario: str) -> str:
+    """Return the file holding the annual cashflow components of a scenario"""
+    result_file = get_scenario_result_file(config_workflow, scenario)
+    return f"{os.path.dirname(result_file)}/cashflow_components.csv"
+
+
+def read_cashflow_components(
+    config_workflow: Dict, scenario_files: Dict[str, str]
+) -> Dict[str, pd.DataFrame]:
+    """Read cashflow components of all tariff scenarios processed so far"""
+    components = {}
+    for dr_scen, scenario in scenario_files.items():
+        if "_wo_dr" in scenario:
+            continue
+        file_name = get_cashflow_components_file(config_workflow, scenario)
+        if not os.path.isfile(file_name):
+            print(
+                f"No cashflow components for scenario {dr_scen}. "
+                "Process and aggregate its results to include it."
+            )
+            continue
+        components[dr_scen] = pd.read_csv(file_name, sep=";", index_col=0)
+
+    return components
+
+
+def get_specific_values(
+    table: pd.DataFrame, investment_years: np.ndarray, n_years: int
+) -> np.ndarray:
+    """Return values of a cost table per investment year and year of use
+
+    :param pd.DataFrame table: specific costs per year, starting in 2020
+    :param np.ndarray investment_years: investment years to evaluate
+    :param int n_years: number of years of use, i.e. simulated years
+    :return np.ndarray: specific costs of shape (investment years, n_years)
+    """
+    year_indices = investment_years - 2020
+    if year_indices.min() < 0 or year_indices.max() + n_years > len(table):
+        raise ValueError(
+            f"Investment years must be between 2020 and "
+            f"{2020 + len(table) - n_years} for cost data covering "
+            f"{len(table)} years. You passed: {list(investment_years)}."
+        )
+    return table.iloc[:, 0].values[
+        year_indices[:, np.newaxis] + np.arange(n_years)[np.newaxis, :]
+    ]
+
+
+def calculate_financial_sweep(
+    components: Dict[str, pd.DataFrame],
+    investment_expenses: Dict,
+    fixed_costs: Dict,
+    interest_rates: List[float],
+    investment_years: List[int],
+    investment_expenses_scalings: List[float],
+    annuity_mode: str,
+    lifetime: int,
+) -> pd.DataFrame:
+    """Evaluate NPV and annuity of all scenarios over a financial grid
+
+    All combinations of scenarios and financial parameters are evaluated
+    at once by broadcasting arrays of shape (scenario, interest rate,
+    investment year, scaling) analogously to calculate_net_present_value
+    and calculate_load_shifting_annuity.
+
+    :param dict components: annual cashflow components per scenario
+    :param dict investment_expenses: specific investments per dr scenario
+    :param dict fixed_costs: specific fixed costs per dr scenario
+    :param list interest_rates: interest rates to evaluate (non-zero)
+    :param list investment_years: investment years to evaluate
+    :param list investment_expenses_scalings: factors for investments
+    :param str annuity_mode: "multiple_years" or "single_year"
+    :param int lifetime: lifetime used in annuity_mode "single_year"
+    :return pd.DataFrame: results indexed by SWEEP_DIMENSIONS
+    """
+    scenarios = list(components)
+    n_years = {len(components[scenario]) for scenario in scenarios}
+    if len(n_years) != 1:
+        raise ValueError(
+            "Cashflow components must cover the same number of years "
+            f"for all scenarios. Found: {sorted(n_years)}."
+        )
+    n_years = n_years.pop()
+    interest_rates = np.asarray(interest_rates, dtype=float)
+    investment_years = np.asarray(investment_years, dtype=int)
+    scalings = np.asarray(investment_expenses_scalings, dtype=float)
+
+    # Shape (scenario, year)
+    net_revenues = np.stack(
+        [
+            components[scenario]["OpportunityRevenues"].values
+            - components[scenario]["VariableCosts"].values
+            for scenario in scenarios
+        ]
+    )
+    power = np.array(
+        [components[scenario]["PowerInMW"].iloc[0] for scenario in scenarios]
+    )
+    first_simulated_year = np.array(
+        [
+            components[scenario]["FirstSimulatedYear"].iloc[0]
+            for scenario in scenarios
+        ]
+    )
+    # Shape (scenario, investment year[, year])
+    specific_investments = np.stack(
+        [
+            get_specific_values(
+                investment_expenses[scenario.split("_", 1)[0]],
+                investment_years,
+                1,
+            )[:, 0]
+            for scenario in scenarios
+        ]
+    )
+    specific_fixed_costs = np.stack(
+        [
+            get_specific_values(
+                fixed_costs[scenario.split("_", 1)[0]],
+                investment_years,
+                n_years,
+            )
+            for scenario in scenarios
+        ]
+    )
+
+    cashflows = (
+        net_revenues[:, np.newaxis, :]
+        - power[:, np.newaxis, np.newaxis] * specific_fixed_costs
+    )
+    # Investment at year 0, cashflows of the first year discounted once
+    discount_factors = (1 + interest_rates[:, np.newaxis]) ** -(
+        np.arange(n_years) + 1
+    )
+    # Shape (scenario, interest rate, investment year, scaling)
+    investments = (
+        specific_investments[:, np.newaxis, :, np.newaxis]
+        * power[:, np.newaxis, np.newaxis, np.newaxis]
+        * scalings[np.newaxis, np.newaxis, np.newaxis, :]
+    )
+    npv = (
+        np.einsum("sty,ry->srt", cashflows, discount_factors)[
+            ..., np.newaxis
+        ]
+        - investments
+    )
+    npv_per_capacity = npv / power[:, np.newaxis, np.newaxis, np.newaxis]
+
+    if annuity_mode == "multiple_years":
+        annuity_factors = calculate_annuity_factor(n_years, interest_rates)
+        annuity = npv * annuity_factors[:, np.newaxis, np.newaxis]
+    elif annuity_mode == "single_year":
+        annuity_factors = calculate_annuity_factor(lifetime, interest_rates)
+        simulation_year_discounted_cashflows = (
+            cashflows[:, np.newaxis, :, 0]
+            * (1 + interest_rates[np.newaxis, :, np.newaxis])
+            ** -first_simulated_year[:, np.newaxis, np.newaxis]
+        )
+        annuity = (
+            -investments * annuity_factors[:, np.newaxis, np.newaxis]
+            + simulation_year_discounted_cashflows[..., np.newaxis]
+        )
+    else:
+        raise ValueError(
+            f"`annuity_mode` must be one of ['multiple_years', 'single_year']"
+            f"You passed an invalid value: {annuity_mode}."
+        )
+
+    shape = npv.shape
+    return pd.DataFrame(
+        {
+            "InvestmentExpenses": np.broadcast_to(investments, shape).ravel(),
+            "NetPresentValue": npv.ravel(),
+            "NetPresentValuePerCapacity": npv_per_capacity.ravel(),
+            "Annuity": annuity.ravel(),
+        },
+        index=pd.MultiIndex.from_product(
+            [scenarios, interest_rates, investment_years, scalings],
+            names=SWEEP_DIMENSIONS,
+        ),
+    )
+
+
+def run_financial_sweep(
+    config_workflow: Dict,
+    scenario_files: Dict[str, str],
+    investment_expenses: Dict,
+    fixed_costs: Dict,
+) -> pd.DataFrame:
+    """Evaluate the financial sweep from processed results and write it"""
+    config_sweep = config_workflow["financial_sweep"]
+    components = read_cashflow_components(config_workflow, scenario_files)
+    if not components:
+        raise FileNotFoundError(
+            "No cashflow components found. Process and aggregate scenario "
+            "results before running a financial sweep."
+        )
+    sweep = calculate_financial_sweep(
+        components,
+        investment_expenses,
+        fixed_costs,
+        config_sweep["interest_rates"],
+        config_sweep["investment_years"],
+        config_sweep["investment_expenses_scalings"],
+        config_workflow["annuity_mode"],
+        config_workflow["lifetime"],
+    )
+    data_output_folder = (
+        f"{config_workflow['output_folder']}"
+        f"{config_workflow['data_output']}"
+        f"{config_workflow['load_shifting_focus_cluster']}/"
+    )
+    make_directory_if_missing(data_output_folder)
+    sweep.to_csv(f"{data_output_folder}financial_sweep.csv", sep=";")
+    print(
+        f"Financial sweep of {len(components)} scenarios over "
+        f"{len(sweep) // len(components)} parameter combinations written."
+    )
+
+    return sweep
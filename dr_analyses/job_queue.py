@@ -0,0 +1,210 @@
+import os
+import socket
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+
+JOB_STATUSES = ["queued", "running", "done", "failed"]
+
+
+def get_queue_file(config_workflow: Dict) -> str:
+    """Return the job queue file of the focus cluster"""
+    return (
+        f"{config_workflow['output_folder']}"
+        f"{config_workflow['load_shifting_focus_cluster']}/job_queue.sqlite"
+    )
+
+
+def get_worker_name() -> str:
+    """Return a name identifying this worker process across machines"""
+    return f"{socket.gethostname()}_{os.getpid()}"
+
+
+def format_progress(progress: Dict[str, int]) -> str:
+    """Return number of jobs per status as a single line"""
+    return ", ".join(
+        f"{progress[status]} {status}" for status in JOB_STATUSES
+    )
+
+
+class JobQueue:
+    """Queue of tariff scenario jobs in a SQLite file drained by workers
+
+    Workers on one or several machines sharing the file claim queued jobs
+    and send heartbeats while running them. Jobs of workers that stopped
+    sending heartbeats as well as failed jobs are queued again until they
+    were attempted max_attempts times. Requires a file system supporting
+    file locks, since SQLite relies on these for concurrent access.
+
+    Attributes
+    ----------
+    file_name: str
+        SQLite file holding the jobs
+
+    heartbeat_interval: float
+        Seconds between heartbeats of a running job
+
+    heartbeat_timeout: float
+        Seconds without heartbeat after which a running job is retried
+
+    max_attempts: int
+        Number of times a job is attempted before it is marked failed
+    """
+
+    def __init__(
+        self,
+        file_name: str,
+        heartbeat_interval: float = 60,
+        heartbeat_timeout: float = 600,
+        max_attempts: int = 3,
+    ):
+        self.file_name = file_name
+        self.heartbeat_interval = heartbeat_interval
+        self.heartbeat_timeout = heartbeat_timeout
+        self.max_attempts = max_attempts
+        os.makedirs(os.path.dirname(file_name) or ".", exist_ok=True)
+        with self._transaction() as connection:
+            connection.execute(
+                """CREATE TABLE IF NOT EXISTS jobs (
+                    dr_scen TEXT PRIMARY KEY,
+                    dr_scen_short TEXT NOT NULL,
+                    scenario TEXT NOT NULL,
+                    baseline_scenario TEXT NOT NULL,
+                    status TEXT NOT NULL,
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    worker TEXT,
+                    heartbeat REAL,
+                    error TEXT
+                )"""
+            )
+
+    @contextmanager
+    def _transaction(self):
+        """Yield a connection holding the write lock until committed"""
+        connection = sqlite3.connect(
+            self.file_name, timeout=60, isolation_level=None
+        )
+        connection.row_factory = sqlite3.Row
+        try:
+            connection.execute("BEGIN IMMEDIATE")
+            try:
+                yield connection
+            except BaseException:
+                connection.execute("ROLLBACK")
+                raise
+            connection.execute("COMMIT")
+        finally:
+            connection.close()
+
+    def enqueue(self, jobs: List[Dict]) -> None:
+        """Queue jobs not known yet, and jobs failed before once again
+
+        :param list jobs: dicts of dr_scen, dr_scen_short, scenario and
+            baseline_scenario
+        """
+        with self._transaction() as connection:
+            connection.executemany(
+                """INSERT INTO jobs (dr_scen, dr_scen_short, scenario,
+                    baseline_scenario, status)
+                VALUES (:dr_scen, :dr_scen_short, :scenario,
+                    :baseline_scenario, 'queued')
+                ON CONFLICT (dr_scen) DO UPDATE SET
+                    status = 'queued', attempts = 0, error = NULL
+                WHERE status = 'failed'""",
+                jobs,
+            )
+
+    def get_statuses(self) -> Dict[str, str]:
+        """Return status of each job by dr_scen"""
+        with self._transaction() as connection:
+            rows = connection.execute("SELECT dr_scen, status FROM jobs")
+            return {row["dr_scen"]: row["status"] for row in rows}
+
+    def get_progress(self) -> Dict[str, int]:
+        """Return number of jobs per status"""
+        progress = {status: 0 for status in JOB_STATUSES}
+        for status in self.get_statuses().values():
+            progress[status] += 1
+        return progress
+
+    def claim(self, worker: str) -> Optional[Dict]:
+        """Claim the next queued job for worker, None if none is queued
+
+        Running jobs without a recent heartbeat are retried first.
+        """
+        now = time.time()
+        with self._transaction() as connection:
+            connection.execute(
+                """UPDATE jobs SET
+                    status = CASE WHEN attempts < ? THEN 'queued'
+                        ELSE 'failed' END,
+                    error = 'No heartbeat from worker ' || worker
+                WHERE status = 'running' AND heartbeat < ?""",
+                (self.max_attempts, now - self.heartbeat_timeout),
+            )
+            job = connection.execute(
+                "SELECT * FROM jobs WHERE status = 'queued' "
+                "ORDER BY dr_scen_short, dr_scen LIMIT 1"
+            ).fetchone()
+            if job is None:
+                return None
+            connection.execute(
+                """UPDATE jobs SET status = 'running',
+                    attempts = attempts + 1, worker = ?, heartbeat = ?
+                WHERE dr_scen = ?""",
+                (worker, now, job["dr_scen"]),
+            )
+            return dict(job)
+
+    def heartbeat(self, dr_scen: str) -> None:
+        """Signal that the job is still being worked on"""
+        with self._transaction() as connection:
+            connection.execute(
+                "UPDATE jobs SET heartbeat = ? WHERE dr_scen = ?",
+                (time.time(), dr_scen),
+            )
+
+    @contextmanager
+    def keep_alive(self, dr_scen: str):
+        """Send heartbeats for the job in the background"""
+        stopped = threading.Event()
+
+        def send_heartbeats():
+            while not stopped.wait(self.heartbeat_interval):
+                self.heartbeat(dr_scen)
+
+        thread = threading.Thread(target=send_heartbeats, daemon=True)
+        thread.start()
+        try:
+            yield
+        finally:
+            stopped.set()
+            thread.join()
+
+    def complete(self, dr_scen: str) -> None:
+        """Mark job done"""
+        with self._transaction() as connection:
+            connection.execute(
+                "UPDATE jobs SET status = 'done', error = NULL "
+                "WHERE dr_scen = ?",
+                (dr_scen,),
+            )
+
+    def fail(self, dr_scen: str, error: str) -> None:
+        """Queue job again or mark it failed if out of attempts"""
+        with self._transaction() as connection:
+            connection.execute(
+                """UPDATE jobs SET
+                    status = CASE WHEN attempts < ? THEN 'queued'
+                        ELSE 'failed' END,
+                    error = ?
+                WHERE dr_scen = ?""",
+                (self.max_attempts, error, dr_scen),
+            )
+
+    def is_drained(self) -> bool:
+        """Return whether no job is queued or running anymore"""
+        progress = self.get_progress()
+        return progress["queued"] == 0 and progress["running"] == 0
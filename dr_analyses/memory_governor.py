@@ -0,0 +1,185 @@
+import json
+import logging as log
+import os
+import subprocess
+import sys
+import threading
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Tuple
+
+from load_shifting_api.metrics import get_resident_memory
+
+try:
+    import resource
+except ImportError:  # not available on Windows
+    resource = None
+
+# ru_maxrss is given in bytes on macOS and in kilobytes elsewhere
+MAXRSS_PER_MB = 1024**2 if sys.platform == "darwin" else 1024
+# Seconds between checks of the memory of this process for waiting runs
+RECHECK_INTERVAL = 5.0
+
+_GOVERNOR = None
+_GOVERNOR_LOCK = threading.Lock()
+
+
+def get_own_memory() -> Optional[float]:
+    """Return resident memory of this process in MB if measurable
+
+    Includes the load shifting API running in this process, i.e. the
+    models being solved. Falls back to the peak resident memory where the
+    current one cannot be measured.
+    """
+    memory_mb = get_resident_memory()
+    if memory_mb is not None or resource is None:
+        return memory_mb
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / MAXRSS_PER_MB
+
+
+def run_process(command: List[str]) -> Tuple[int, Optional[float]]:
+    """Run command and return its exit status and peak memory in MB
+
+    :param list command: program and its arguments
+    :return tuple: exit status and peak resident memory if measurable
+    """
+    process = subprocess.Popen(command)
+    if not hasattr(os, "wait4"):
+        return process.wait(), None
+    _, wait_status, usage = os.wait4(process.pid, 0)
+    if os.WIFEXITED(wait_status):
+        status = os.WEXITSTATUS(wait_status)
+    else:
+        status = -os.WTERMSIG(wait_status)
+    # Reaped already, prevent Popen from waiting for the process
+    process.returncode = status
+    return status, usage.ru_maxrss / MAXRSS_PER_MB
+
+
+class MemoryGovernor:
+    """Admit concurrent AMIRIS runs as long as they fit a memory budget
+
+    The memory needed by a run is estimated by the largest sum of the peak
+    memory of AMIRIS and the largest load shifting solve measured for a
+    run so far, or initial_estimate_mb before the first measurement.
+    Peaks are kept per scenario in a calibration file to be used by
+    subsequent workflow runs. Runs are admitted against the current memory
+    of this process, including the load shifting API, plus the estimates
+    of the runs admitted. A run is always admitted if no other one is
+    running.
+
+    Attributes
+    ----------
+    budget_mb: float or None
+        Memory available to the workflow; None admits one run at a time
+
+    initial_estimate_mb: float
+        Peak memory assumed for a run until measured
+
+    calibration_file: str or None
+        Json file keeping peaks measured per scenario
+
+    peaks: dict
+        Peaks in MB of AMIRIS ("jvm_mb") and of the load shifting solves
+        ("api_solve_mb") per scenario
+    """
+
+    def __init__(
+        self,
+        budget_mb: float = None,
+        initial_estimate_mb: float = 16000,
+        calibration_file: str = None,
+    ):
+        self.budget_mb = budget_mb
+        self.initial_estimate_mb = initial_estimate_mb
+        self.calibration_file = calibration_file
+        self.peaks = {}
+        self._running = 0
+        self._reserved_mb = 0.0
+        self._condition = threading.Condition()
+        if calibration_file is not None and os.path.isfile(calibration_file):
+            with open(calibration_file) as file:
+                self.peaks = {
+                    scenario: (
+                        peaks
+                        # calibration files of AMIRIS peaks only
+                        if isinstance(peaks, dict)
+                        else {"jvm_mb": peaks, "api_solve_mb": 0.0}
+                    )
+                    for scenario, peaks in json.load(file).items()
+                }
+
+    def get_estimate(self) -> float:
+        """Return memory in MB reserved for a run"""
+        if not self.peaks:
+            return self.initial_estimate_mb
+        return max(
+            peaks["jvm_mb"] + peaks["api_solve_mb"]
+            for peaks in self.peaks.values()
+        )
+
+    def _fits(self, estimate_mb: float) -> bool:
+        """Return whether another run fits into the memory budget"""
+        if self._running == 0:
+            return True
+        if self.budget_mb is None:
+            return False
+        own_mb = get_own_memory() or 0.0
+        return own_mb + self._reserved_mb + estimate_mb <= self.budget_mb
+
+    @contextmanager
+    def admit(self, scenario: str):
+        """Block until a run fits the budget and reserve memory for it
+
+        Yields a dict to set the measured peaks of AMIRIS ("jvm_mb") and
+        of the load shifting solves ("api_solve_mb") of the run in.
+        """
+        with self._condition:
+            estimate_mb = self.get_estimate()
+            # memory of this process may shrink without any run finishing
+            while not self._fits(estimate_mb):
+                self._condition.wait(RECHECK_INTERVAL)
+            self._running += 1
+            self._reserved_mb += estimate_mb
+        measurement = {"jvm_mb": None, "api_solve_mb": None}
+        try:
+            yield measurement
+        finally:
+            with self._condition:
+                self._running -= 1
+                self._reserved_mb -= estimate_mb
+                if measurement["jvm_mb"] is not None:
+                    self.peaks[scenario] = {
+                        "jvm_mb": measurement["jvm_mb"],
+                        "api_solve_mb": measurement["api_solve_mb"] or 0.0,
+                    }
+                    self._write_calibration()
+                self._condition.notify_all()
+
+    def _write_calibration(self) -> None:
+        """Write peaks measured to the calibration file if given"""
+        if self.calibration_file is None:
+            return
+        directory = os.path.dirname(self.calibration_file)
+        os.makedirs(directory or ".", exist_ok=True)
+        temporary_file = f"{self.calibration_file}.{os.getpid()}.tmp"
+        with open(temporary_file, "w") as file:
+            json.dump(self.peaks, file, indent=2)
+        os.replace(temporary_file, self.calibration_file)
+
+
+def get_memory_governor(config_workflow: Dict) -> MemoryGovernor:
+    """Return the governor shared by all AMIRIS runs of this process"""
+    global _GOVERNOR
+    with _GOVERNOR_LOCK:
+        if _GOVERNOR is None:
+            config = config_workflow["memory_governor"]
+            _GOVERNOR = MemoryGovernor(
+                config["budget_mb"],
+                config["initial_estimate_mb"],
+                config["calibration_file"],
+            )
+            log.info(
+                f"AMIRIS runs admitted within {config['budget_mb']} MB, "
+                f"estimating {_GOVERNOR.get_estimate():.0f} MB per run"
+            )
+        return _GOVERNOR
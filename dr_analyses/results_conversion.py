@@ -0,0 +1,233 @@
+import logging as log
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+import numpy as np
+import pandas as pd
+from fameio.source.cli import Options, ResolveOptions
+from fameio.source.results.agent_type import AgentTypeLog
+from fameio.source.results.csv_writer import CsvWriter
+from fameio.source.results.data_transformer import DataTransformer
+from fameio.source.results.output_dao import OutputDAO
+from fameio.source.results.reader import Reader
+from fameprotobuf.Services_pb2 import Output
+
+from dr_analyses.results_reader import (
+    INDEX_DTYPES,
+    OUTPUT_SPECS,
+    get_required_columns,
+)
+
+
+def get_required_agents() -> List[str]:
+    """Return agent types whose outputs are read by the workflow"""
+    return list(OUTPUT_SPECS)
+
+
+def convert_agent_outputs(
+    file_path: str, output_folder: str, config_convert: Dict
+) -> None:
+    """Convert required agent outputs of an AMIRIS protobuf file to csv
+
+    Only agents and columns declared in the output specs are written.
+    Time steps are kept as FAME time steps (integers).
+
+    :param str file_path: AMIRIS protobuf output file
+    :param str output_folder: folder to write csv files to
+    :param dict config_convert: fameio convert configuration
+    """
+    writer = CsvWriter(
+        Path(output_folder),
+        Path(file_path),
+        config_convert.get(Options.SINGLE_AGENT_EXPORT, False),
+    )
+    agent_type_log = AgentTypeLog(requested_agents=get_required_agents())
+    data_transformer = DataTransformer.build(
+        config_convert.get(
+            Options.RESOLVE_COMPLEX_FIELD, ResolveOptions.IGNORE
+        )
+    )
+    with open(Path(file_path), "rb") as file_stream:
+        reader = Reader.get_reader(
+            file=file_stream,
+            read_single=config_convert.get(Options.MEMORY_SAVING, False),
+        )
+        while data_storages := reader.read():
+            output = OutputDAO(data_storages, agent_type_log)
+            for agent in output.get_sorted_agents_to_extract():
+                data = output.get_agent_data(agent, data_transformer)
+                if None in data:
+                    writer.write_to_files(
+                        agent, {None: prune_columns(agent, data[None])}
+                    )
+    if not agent_type_log.has_any_agent_type():
+        log.error(f"File {file_path} did not contain any output data.")
+
+
+def prune_columns(agent: str, data: pd.DataFrame) -> pd.DataFrame:
+    """Return agent output limited to the columns declared as required"""
+    required = get_required_columns(agent, data.columns)
+    return data.drop(
+        columns=[column for column in data.columns if column not in required]
+    )
+
+
+def load_agent_outputs(
+    file_path: str, config_convert: Dict
+) -> Dict[str, pd.DataFrame]:
+    """Load required agent outputs of an AMIRIS protobuf file to memory
+
+    Values are written to column arrays directly from the protobuf
+    messages. The frames obtained equal those read back from the csv
+    files written by convert_agent_outputs.
+
+    :param str file_path: AMIRIS protobuf output file
+    :param dict config_convert: fameio convert configuration
+    :return dict: agent outputs per agent type
+    """
+    column_maps = {}
+    batches = {agent: [] for agent in get_required_agents()}
+    with open(Path(file_path), "rb") as file_stream:
+        reader = Reader.get_reader(
+            file=file_stream,
+            read_single=config_convert.get(Options.MEMORY_SAVING, False),
+        )
+        while data_storages := reader.read():
+            blocks = {agent: [] for agent in batches}
+            for data_storage in data_storages:
+                if not data_storage.HasField("output"):
+                    continue
+                for agent_type in data_storage.output.agentType:
+                    if agent_type.className in batches:
+                        column_maps[agent_type.className] = get_column_map(
+                            agent_type
+                        )
+                for series in data_storage.output.series:
+                    if series.className in column_maps:
+                        blocks[series.className].append(
+                            extract_series(
+                                series, column_maps[series.className]
+                            )
+                        )
+            for agent, agent_blocks in blocks.items():
+                if agent_blocks:
+                    batches[agent].append(
+                        combine_blocks(agent_blocks, column_maps[agent])
+                    )
+    if not column_maps:
+        log.error(f"File {file_path} did not contain any output data.")
+
+    return {
+        agent: pd.concat(agent_batches, ignore_index=True)
+        for agent, agent_batches in batches.items()
+        if agent_batches
+    }
+
+
+def get_column_map(agent_type: Output.AgentType) -> Dict[int, str]:
+    """Return required simple columns of an agent type by field id"""
+    simple_columns = {
+        field.fieldId: field.fieldName
+        for field in agent_type.field
+        if len(field.indexName) == 0
+    }
+    required = get_required_columns(
+        agent_type.className, list(simple_columns.values())
+    )
+    return {
+        field_id: name
+        for field_id, name in simple_columns.items()
+        if name in required
+    }
+
+
+def extract_series(
+    series: Output.Series, column_map: Dict[int, str]
+) -> Tuple[int, np.ndarray, np.ndarray]:
+    """Return agent id, time steps and values of required columns"""
+    positions = {
+        field_id: position for position, field_id in enumerate(column_map)
+    }
+    time_steps = np.empty(len(series.line), dtype=np.int64)
+    values = np.full((len(series.line), len(positions)), np.nan)
+    for row, line in enumerate(series.line):
+        time_steps[row] = line.timeStep
+        for column in line.column:
+            position = positions.get(column.fieldId)
+            if position is not None:
+                values[row, position] = column.value
+
+    return series.agentId, time_steps, values
+
+
+def combine_blocks(
+    blocks: List[Tuple[int, np.ndarray, np.ndarray]],
+    column_map: Dict[int, str],
+) -> pd.DataFrame:
+    """Combine series of an agent type sorted by agent id and time step
+
+    Columns without any value are dropped as done by fameio.
+    """
+    agent_ids = np.concatenate(
+        [
+            np.full(len(time_steps), agent_id)
+            for agent_id, time_steps, _ in blocks
+        ]
+    ).astype(INDEX_DTYPES["AgentId"])
+    time_steps = np.concatenate([time_steps for _, time_steps, _ in blocks])
+    values = np.concatenate([values for _, _, values in blocks])
+    order = np.lexsort((time_steps, agent_ids))
+    data = pd.DataFrame(values[order], columns=list(column_map.values()))
+    data.insert(0, "TimeStep", time_steps[order])
+    data.insert(0, "AgentId", agent_ids[order])
+
+    return data.dropna(how="all", axis=1)
+
+
+def run_in_parallel(function, arguments: List[Tuple], n_workers: int) -> List:
+    """Call function for all arguments using a pool of processes"""
+    if len(arguments) == 1 or n_workers == 1:
+        return [
+            function(*function_arguments) for function_arguments in arguments
+        ]
+    with ProcessPoolExecutor(
+        max_workers=n_workers,
+        mp_context=multiprocessing.get_context("spawn"),
+    ) as executor:
+        futures = [
+            executor.submit(function, *function_arguments)
+            for function_arguments in arguments
+        ]
+        return [future.result() for future in futures]
+
+
+def convert_agent_outputs_in_parallel(
+    conversions: List[Tuple[str, str]], config_convert: Dict, n_workers: int
+) -> None:
+    """Convert several AMIRIS output files using a pool of processes
+
+    :param list conversions: tuples of protobuf file and output folder
+    :param dict config_convert: fameio convert configuration
+    :param int n_workers: number of worker processes
+    """
+    run_in_parallel(
+        convert_agent_outputs,
+        [
+            (file_path, output_folder, config_convert)
+            for file_path, output_folder in conversions
+        ],
+        n_workers,
+    )
+
+
+def load_agent_outputs_in_parallel(
+    file_paths: List[str], config_convert: Dict, n_workers: int
+) -> List[Dict[str, pd.DataFrame]]:
+    """Load several AMIRIS output files using a pool of processes"""
+    return run_in_parallel(
+        load_agent_outputs,
+        [(file_path, config_convert) for file_path in file_paths],
+        n_workers,
+    )
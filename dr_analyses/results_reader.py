@@ -0,0 +1,158 @@
+import logging as log
+import os
+from typing import Dict, List, Tuple, Union
+
+import numpy as np
+import pandas as pd
+
+# Columns, dtypes and row filters needed from the AMIRIS agent outputs;
+# "columns" may be a list of column names or a callable used as `usecols`,
+# "downcast" lists (physical) columns that may be stored as float32
+OUTPUT_SPECS = {
+    "DemandTrader": {
+        "columns": ["AgentId", "TimeStep", "AwardedEnergyInMWH"],
+        "dropna": ["AwardedEnergyInMWH"],
+        "downcast": ["AwardedEnergyInMWH"],
+    },
+    "VariableRenewableOperator": {
+        "columns": ["AgentId", "TimeStep", "OfferedPowerInMW"],
+        "dropna": ["OfferedPowerInMW"],
+        "downcast": ["OfferedPowerInMW"],
+    },
+    "EnergyExchangeMulti": {
+        "columns": ["AgentId", "TimeStep", "ElectricityPriceInEURperMWH"],
+        "dropna": [],
+        "downcast": [],
+    },
+    "LoadShiftingTrader": {
+        "columns": lambda column: "Offered" not in column,
+        "dropna": [],
+        "downcast": ["NetAwardedPower", "StoredMWh"],
+    },
+}
+# TimeStep is left as read, since fameio writes it as integer or as UTC
+# string depending on Options.TIME
+INDEX_DTYPES = {"AgentId": np.int64}
+
+READ_STATISTICS = {"files": 0, "bytes_read": 0, "bytes_in_memory": 0}
+
+# Agent outputs loaded directly from AMIRIS protobuf files, keyed by the
+# (normalised) folder their csv files would have been written to
+LOADED_OUTPUTS = {}
+
+
+def read_agent_output(
+    folder: str, agent: str, config: Dict, file_name: str = None
+) -> pd.DataFrame:
+    """Read the columns needed from an AMIRIS agent output file
+
+    The file is read in chunks of config["output_reader"]["chunk_size"]
+    rows (all at once if None), applying the row filter of the agent's
+    output spec to each chunk so that memory stays bounded. Outputs
+    loaded to memory for the folder are used instead of the file.
+
+    :param str folder: folder holding the converted AMIRIS results
+    :param str agent: agent type to read results for (key of OUTPUT_SPECS)
+    :param dict config: workflow configuration
+    :param str file_name: file to read if differing from <agent>.csv
+    :return pd.DataFrame: pruned agent results
+    """
+    spec = OUTPUT_SPECS[agent]
+    if file_name is None:
+        file_name = f"{agent}.csv"
+    file_path = f"{folder}/{file_name}"
+    downcast = (
+        spec["downcast"]
+        if config["output_reader"]["downcast_to_float32"]
+        else []
+    )
+    loaded_outputs = LOADED_OUTPUTS.get(os.path.normpath(folder))
+    if file_name == f"{agent}.csv" and loaded_outputs is not None:
+        return prune_chunk(
+            loaded_outputs["outputs"][agent].copy(), spec["dropna"], downcast
+        )
+    data = pd.read_csv(
+        file_path,
+        sep=";",
+        usecols=spec["columns"],
+        dtype=INDEX_DTYPES,
+        chunksize=config["output_reader"]["chunk_size"],
+    )
+    if isinstance(data, pd.DataFrame):
+        data = prune_chunk(data, spec["dropna"], downcast)
+    else:
+        data = pd.concat(
+            [prune_chunk(chunk, spec["dropna"], downcast) for chunk in data]
+        )
+    add_read_statistics(file_path, data)
+
+    return data
+
+
+def get_required_columns(agent: str, columns: List[str]) -> List[str]:
+    """Return those of the given columns needed from an agent's output"""
+    required = OUTPUT_SPECS[agent]["columns"]
+    if callable(required):
+        return [column for column in columns if required(column)]
+
+    return [column for column in columns if column in required]
+
+
+def prune_chunk(
+    chunk: pd.DataFrame, dropna: List[str], downcast: List[str]
+) -> pd.DataFrame:
+    """Drop rows with missing entries and downcast columns of a chunk"""
+    if dropna:
+        chunk = chunk.dropna(subset=dropna)
+    to_downcast = [column for column in downcast if column in chunk.columns]
+    if to_downcast:
+        chunk = chunk.astype({column: np.float32 for column in to_downcast})
+
+    return chunk
+
+
+def add_read_statistics(file_path: str, data: pd.DataFrame) -> None:
+    """Update and log the statistics on agent outputs read"""
+    bytes_read = os.path.getsize(file_path)
+    bytes_in_memory = int(data.memory_usage(deep=False).sum())
+    READ_STATISTICS["files"] += 1
+    READ_STATISTICS["bytes_read"] += bytes_read
+    READ_STATISTICS["bytes_in_memory"] += bytes_in_memory
+    log.info(
+        f"Read {bytes_read / 1e6:.1f} MB from {file_path} "
+        f"({bytes_in_memory / 1e6:.1f} MB in memory)"
+    )
+
+
+def register_agent_outputs(
+    folder: str, outputs: Dict[str, pd.DataFrame], fingerprint: Tuple
+) -> None:
+    """Register agent outputs loaded to memory in place of a csv folder
+
+    :param str folder: folder the csv files would have been written to
+    :param dict outputs: agent outputs per agent type
+    :param tuple fingerprint: fingerprint of the AMIRIS output file
+    """
+    LOADED_OUTPUTS[os.path.normpath(folder)] = {
+        "outputs": outputs,
+        "fingerprint": fingerprint,
+    }
+
+
+def release_agent_outputs(folder: str) -> None:
+    """Remove agent outputs for a folder from memory if registered"""
+    LOADED_OUTPUTS.pop(os.path.normpath(folder), None)
+
+
+def get_output_fingerprint(folder: str) -> Union[Tuple, None]:
+    """Return fingerprint of outputs loaded for a folder, None if not"""
+    loaded_outputs = LOADED_OUTPUTS.get(os.path.normpath(folder))
+    if loaded_outputs is None:
+        return None
+
+    return loaded_outputs["fingerprint"]
+
+
+def get_read_statistics() -> Dict[str, int]:
+    """Return number of agent output files and bytes read so far"""
+    return READ_STATISTICS.copy()
@@ -6,6 +6,8 @@ import pandas as pd
 from fameio.source.cli import Options
 
 from dr_analyses.container import Container
+from dr_analyses.fame_time_series import convert_to_fame_time_stamps
+from dr_analyses.results_reader import read_agent_output
 from dr_analyses.time import cut_leap_days, create_time_index, AMIRIS_TIMESTEPS_PER_YEAR
 
 
@@ -45,13 +47,13 @@ def calculate_dynamic_price_time_series(
     instead of those of current scenario
     """
     if use_baseline_prices:
-        power_prices = pd.read_csv(
+        power_prices = read_agent_output(
             f"{cont.config_workflow['output_folder']}"
             f"{cont.config_workflow['load_shifting_focus_cluster']}/"
             f"{cont.trimmed_scenario.split('_')[3]}/"
-            f"{cont.trimmed_baseline_scenario}"
-            f"/EnergyExchangeMulti.csv",
-            sep=";",
+            f"{cont.trimmed_baseline_scenario}",
+            "EnergyExchangeMulti",
+            cont.config_workflow,
         )
     else:
         if not cont.config_convert[Options.OUTPUT]:
@@ -59,9 +61,10 @@ def calculate_dynamic_price_time_series(
                 "Processing results without aggregating them first "
                 "is not implemented."
             )
-        power_prices = pd.read_csv(
-            cont.config_convert[Options.OUTPUT] + "/EnergyExchangeMulti.csv",
-            sep=";",
+        power_prices = read_agent_output(
+            cont.config_convert[Options.OUTPUT],
+            "EnergyExchangeMulti",
+            cont.config_workflow,
         )
 
     power_prices = power_prices[["ElectricityPriceInEURperMWH"]]
@@ -147,8 +150,7 @@ def create_fame_time_index(ts: pd.DataFrame, cont: Container) -> pd.DataFrame:
     time_index = create_time_index(start_time, end_time)
     dummy_series = pd.Series(index=time_index, data=0)
     dummy_series = cut_leap_days(dummy_series)
-    ts.set_index(dummy_series.index, inplace=True)
-    ts.index = ts.index.astype(str).str.replace(" ", "_")
+    ts.index = convert_to_fame_time_stamps(dummy_series.index)
 
     return ts
 
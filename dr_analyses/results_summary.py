@@ -1,6 +1,9 @@
 import math
+from typing import Dict
 
-from dr_analyses.container import Container
+import numpy as np
+
+from dr_analyses.container import COMPACT_RESULTS_RTOL, Container
 from dr_analyses.time import AMIRIS_TIMESTEPS_PER_YEAR
 
 
@@ -18,6 +21,13 @@ def calc_summary_parameters(cont: Container) -> None:
         )
         raise ValueError(msg)
 
+    calculate_summary(cont)
+    cont.set_summary_series()
+    cont.write_summary()
+
+
+def calculate_summary(cont: Container) -> Dict:
+    """Calculate summary parameters, set them to Container and return them"""
     cont.initialize_summary()
     add_full_shift_cycles(cont)
     add_peak_load_summary(cont)
@@ -25,8 +35,40 @@ def calc_summary_parameters(cont: Container) -> None:
     add_energy_payments_summary(cont)
     add_total_costs_and_savings_summary(cont)
     add_investments_and_npv_summary(cont)
-    cont.set_summary_series()
-    cont.write_summary()
+
+    return cont.summary
+
+
+def check_compact_summary(full_summary: Dict, compact_summary: Dict) -> None:
+    """Raise if compact results changed summary parameters beyond tolerance
+
+    Deviations are compared to COMPACT_RESULTS_RTOL times the magnitude of
+    the quantities a parameter is derived from, i.e. the peak loads for
+    the peak load change.
+    """
+    magnitudes = {
+        param: abs(value) for param, value in full_summary.items()
+    }
+    magnitudes["PeakLoadChange"] = max(
+        magnitudes["PeakLoadBeforeShifting"],
+        magnitudes["PeakLoadAfterShifting"],
+    )
+    deviating = {
+        param: (full_summary[param], compact_summary[param])
+        for param in full_summary
+        if not np.isclose(
+            compact_summary[param],
+            full_summary[param],
+            rtol=0,
+            atol=COMPACT_RESULTS_RTOL * magnitudes[param],
+            equal_nan=True,
+        )
+    }
+    if deviating:
+        raise ValueError(
+            "Summary parameters of compact results deviate by more than "
+            f"{COMPACT_RESULTS_RTOL} (full, compact): {deviating}"
+        )
 
 
 def add_full_shift_cycles(cont: Container) -> None:
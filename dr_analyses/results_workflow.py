@@ -2,11 +2,11 @@ import warnings
 from typing import Dict, List
 
 import numpy as np
-import numpy_financial as npf
 import pandas as pd
 from fameio.source.cli import Options
 
 from dr_analyses.container import Container
+from dr_analyses.results_reader import read_agent_output
 from dr_analyses.results_subroutines import (
     add_abs_values,
     add_baseline_load_profile,
@@ -24,9 +24,10 @@ def calc_load_shifting_results(cont: Container, key: str) -> None:
     :param Container cont: container object holding configuration
     :param str key: Identifier for current scenario
     """
-    results = pd.read_csv(
-        f"{cont.config_convert[Options.OUTPUT]}/LoadShiftingTrader.csv",
-        sep=";",
+    results = read_agent_output(
+        cont.config_convert[Options.OUTPUT],
+        "LoadShiftingTrader",
+        cont.config_workflow,
     )
 
     # Hack: Shift output for variable costs from optimizer
@@ -35,11 +36,7 @@ def calc_load_shifting_results(cont: Container, key: str) -> None:
         "VariableShiftingCostsFromOptimiser"
     ].shift(periods=1)
     results.set_index(["AgentId", "TimeStep"], inplace=True)
-    results = (
-        results[[col for col in results.columns if "Offered" not in col]]
-        .dropna(how="all")
-        .reset_index(drop=False)
-    )
+    results = results.dropna(how="all").reset_index(drop=False)
     check_for_rescheduling(results)
     add_abs_values(results, ["NetAwardedPower", "StoredMWh"])
     results["ShiftCycleEnd"] = np.where(
@@ -91,6 +88,9 @@ def calculate_net_present_value(
     cash_flows.extend(
         extract_load_shifting_cashflows(cont, dr_scen, fixed_costs)
     )
+    # Imported on first use to keep startup of the workflow fast
+    import numpy_financial as npf
+
     npv = npf.npv(interest_rate, cash_flows)
 
     return npv
@@ -104,9 +104,35 @@ def extract_load_shifting_cashflows(
     Opportunity revenues: the reduction in payments compared to the baseline
     Costs: Variable shifting costs and fixed costs
     """
-    cashflows = []
-    payment_columns = ["TotalPayments", "CapacityPayment"]
+    components = extract_annual_cashflow_components(cont)
     year_index_shift = int(cont.config_workflow["investment_year"]) - 2020
+    specific_fixed_costs = fixed_costs[dr_scen.split("_", 1)[0]][1].iloc[
+        year_index_shift : year_index_shift + len(components)
+    ]
+    annual_fixed_costs = (
+        components["PowerInMW"].values * specific_fixed_costs.values
+    )
+
+    return list(
+        components["OpportunityRevenues"].values
+        - components["VariableCosts"].values
+        - annual_fixed_costs
+    )
+
+
+def extract_annual_cashflow_components(cont: Container) -> pd.DataFrame:
+    """Extract annual cashflow components independent of financial inputs
+
+    Fixed costs and investment expenses depend on the investment year and
+    are derived from installed power. Components are kept per scenario to
+    evaluate financial parameters without re-simulation.
+
+    :return pd.DataFrame: opportunity revenues and variable costs per
+        simulated year as well as installed power and the number of the
+        first simulated year
+    """
+    components = []
+    payment_columns = ["TotalPayments", "CapacityPayment"]
 
     for i in range(derive_lifetime_from_simulation_horizon(cont.results)):
         stop = (i + 1) * AMIRIS_TIMESTEPS_PER_YEAR - 1
@@ -134,17 +160,19 @@ def extract_load_shifting_cashflows(
             .loc[i * AMIRIS_TIMESTEPS_PER_YEAR : stop]
             .sum()
         )
-        annual_fixed_costs = (
-            cont.load_shifting_data["Attributes"]["LoadShiftingPortfolio"][
-                "PowerInMW"
-            ]
-        ) * fixed_costs[dr_scen.split("_", 1)[0]][1].iloc[i + year_index_shift]
-
-        cashflows.append(
-            opportunity_revenues - variable_costs - annual_fixed_costs
-        )
+        components.append([opportunity_revenues, variable_costs])
+
+    components = pd.DataFrame(
+        components,
+        columns=["OpportunityRevenues", "VariableCosts"],
+        index=pd.RangeIndex(len(components), name="Year"),
+    )
+    components["PowerInMW"] = cont.load_shifting_data["Attributes"][
+        "LoadShiftingPortfolio"
+    ]["PowerInMW"]
+    components["FirstSimulatedYear"] = cont.get_number_of_simulated_year()
 
-    return cashflows
+    return components
 
 
 def calculate_net_present_value_per_capacity(
@@ -0,0 +1,161 @@
+import json
+import os
+import threading
+from datetime import datetime
+from typing import Dict, List, Tuple
+
+from dr_analyses.workflow_routines import get_file_fingerprint
+
+# Stages of a scenario in order of execution; baseline scenarios end with
+# the conversion of their results
+STAGES = ["prepare", "make", "run", "convert", "process", "aggregate"]
+BASELINE_STAGES = STAGES[:4]
+
+
+def get_manifest_file(
+    config_workflow: Dict, shard: Tuple[int, int] = None, worker: str = None
+) -> str:
+    """Return the manifest file of a workflow run for the focus cluster
+
+    Each shard of a sharded run and each job queue worker keeps a
+    manifest of its own.
+    """
+    suffix = ""
+    if shard is not None:
+        suffix = f"_shard_{shard[0]}_of_{shard[1]}"
+    elif worker is not None:
+        suffix = f"_worker_{worker}"
+    return (
+        f"{config_workflow['output_folder']}"
+        f"{config_workflow['load_shifting_focus_cluster']}/"
+        f"run_manifest{suffix}.json"
+    )
+
+
+class RunManifest:
+    """Completion status and output fingerprints of scenario stages
+
+    Each stage completed for a scenario is recorded together with the
+    fingerprints of the files it wrote and whether its results persist
+    beyond the run. The manifest is written to disk after each stage,
+    so that a crashed run can be resumed where it stopped.
+
+    Attributes
+    ----------
+    file_name: str
+        Json file the manifest is written to
+
+    resume: bool
+        Whether stages completed by a previous run are skipped
+
+    scenarios: dict
+        Record of completed stages per (trimmed) scenario name
+    """
+
+    def __init__(self, file_name: str, resume: bool = False):
+        self.file_name = file_name
+        self.resume = resume
+        self.scenarios = {}
+        self._pending = {}
+        self._lock = threading.Lock()
+        if resume and os.path.isfile(file_name):
+            with open(file_name) as file:
+                self.scenarios = json.load(file)["scenarios"]
+
+    def is_complete(self, scenario: str, stage: str) -> bool:
+        """Return whether stage is complete and its outputs are unchanged"""
+        record = self.scenarios.get(scenario, {}).get(stage)
+        if record is None or record["status"] != "complete":
+            return False
+        return all(
+            os.path.isfile(path)
+            and list(get_file_fingerprint(path)) == fingerprint
+            for path, fingerprint in record["outputs"].items()
+        )
+
+    def plan(
+        self, scenario: str, stages: List[str], outputs_needed: bool = False
+    ) -> List[str]:
+        """Determine and return the stages of a scenario left to run
+
+        Resumes at the first incomplete stage. Stages whose results only
+        live in memory are re-run if a stage resumed, or with
+        outputs_needed another scenario, depends on them. Since containers
+        are held in memory, the first stage preparing them is re-run
+        whenever any other stage is.
+
+        :param str scenario: trimmed scenario name
+        :param list stages: all stages of the scenario in order
+        :param bool outputs_needed: whether other scenarios need results
+        :return list: stages to run
+        """
+        if not self.resume:
+            pending = list(stages)
+        else:
+            start = next(
+                (
+                    number
+                    for number, stage in enumerate(stages)
+                    if not self.is_complete(scenario, stage)
+                ),
+                len(stages),
+            )
+            if start < len(stages) or outputs_needed:
+                while (
+                    start > 0
+                    and not self.scenarios[scenario][stages[start - 1]][
+                        "persistent"
+                    ]
+                ):
+                    start -= 1
+            pending = stages[start:]
+            if pending and stages[0] not in pending:
+                pending = [stages[0], *pending]
+        self._pending[scenario] = pending
+        return pending
+
+    def is_pending(self, scenario: str, stage: str) -> bool:
+        """Return whether stage is to be run, i.e. all stages if unplanned"""
+        return stage in self._pending.get(scenario, STAGES)
+
+    def complete(
+        self,
+        scenario: str,
+        stage: str,
+        outputs: List[str] = (),
+        persistent: bool = True,
+    ) -> None:
+        """Record a completed stage and write the manifest to disk
+
+        Completing a stage with persistent results invalidates the records
+        of subsequent stages, since they were derived from former results.
+
+        :param str scenario: trimmed scenario name
+        :param str stage: stage completed
+        :param list outputs: files written by the stage
+        :param bool persistent: whether its results outlive the run
+        """
+        record = {
+            "status": "complete",
+            "completed": datetime.now().isoformat(timespec="seconds"),
+            "persistent": persistent,
+            "outputs": {
+                file_name: list(get_file_fingerprint(file_name))
+                for file_name in outputs
+            },
+        }
+        with self._lock:
+            stages = self.scenarios.setdefault(scenario, {})
+            if persistent:
+                for subsequent_stage in STAGES[STAGES.index(stage) + 1 :]:
+                    stages.pop(subsequent_stage, None)
+            stages[stage] = record
+            self._write()
+
+    def _write(self) -> None:
+        """Write manifest atomically to its file"""
+        os.makedirs(os.path.dirname(self.file_name) or ".", exist_ok=True)
+        temporary_file = f"{self.file_name}.{os.getpid()}.tmp"
+        with open(temporary_file, "w") as file:
+            json.dump({"scenarios": self.scenarios}, file, indent=2)
+        os.replace(temporary_file, self.file_name)
@@ -0,0 +1,123 @@
+import logging as log
+import os
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import List
+
+from fameio.source.cli import Options
+from fameio.source.scenario import Scenario
+from fameio.source.time import ConversionException
+from fameio.source.validator import SchemaValidator
+from fameio.source.writer import ProtoWriter, ProtoWriterException
+from fameprotobuf.InputFile_pb2 import InputData
+
+from dr_analyses.container import Container
+from dr_analyses.workflow_routines import (
+    get_file_fingerprint,
+    set_config_make_output,
+)
+
+# Parsed time series (protobuf messages) shared by all scenario compilations
+# of a workflow run, keyed by file path and fingerprint
+TIME_SERIES_POOL = {}
+TIME_SERIES_POOL_LOCK = threading.Lock()
+
+
+class PooledProtoWriter(ProtoWriter):
+    """ProtoWriter parsing each time series file only once per workflow run
+
+    Time series are converted to protobuf messages on first use and
+    copied from the shared pool for all subsequent scenarios.
+    """
+
+    def _set_time_series(self, pb_input):
+        """Adds all time series from the shared pool to given `pb_input`"""
+        ids_of_series_by_name = (
+            self.time_series_manager.get_ids_of_series_by_name()
+        )
+        for identifier, unique_id in ids_of_series_by_name.items():
+            pb_series = pb_input.timeSeries.add()
+            pb_series.CopyFrom(self._get_pooled_series(identifier))
+            pb_series.seriesId = unique_id
+            if isinstance(identifier, str):
+                pb_series.seriesName = identifier
+
+    def _get_pooled_series(self, identifier) -> InputData.TimeSeriesDao:
+        """Return time series message for identifier, parsing it if new"""
+        pool_key = identifier
+        if isinstance(identifier, str):
+            series_path = self._path_resolver.resolve_series_file_path(
+                identifier
+            )
+            if series_path and os.path.exists(series_path):
+                pool_key = (
+                    os.path.abspath(series_path),
+                    get_file_fingerprint(series_path),
+                )
+        with TIME_SERIES_POOL_LOCK:
+            pooled_series = TIME_SERIES_POOL.get(pool_key)
+            is_owner = pooled_series is None
+            if is_owner:
+                pooled_series = Future()
+                TIME_SERIES_POOL[pool_key] = pooled_series
+        if is_owner:
+            try:
+                pooled_series.set_result(self._parse_series(identifier))
+            except BaseException as error:
+                with TIME_SERIES_POOL_LOCK:
+                    del TIME_SERIES_POOL[pool_key]
+                pooled_series.set_exception(error)
+                raise
+
+        return pooled_series.result()
+
+    def _parse_series(self, identifier) -> InputData.TimeSeriesDao:
+        """Parse time series as done by fameio's ProtoWriter"""
+        series = InputData.TimeSeriesDao()
+        # Placeholder for required field, set per scenario when copied
+        series.seriesId = 0
+        series_name, data_frame = self._get_series_as_dataframe(identifier)
+        series.seriesName = series_name
+        try:
+            ProtoWriter._add_rows_to_series(series, data_frame)
+        except TypeError as error:
+            raise ProtoWriterException(
+                ProtoWriter._CORRUPT_TIME_SERIES_VALUE.format(identifier)
+            ) from error
+        except ConversionException as error:
+            raise ProtoWriterException(
+                ProtoWriter._CORRUPT_TIME_SERIES_KEY.format(identifier)
+            ) from error
+
+        return series
+
+
+def compile_scenario(cont: Container) -> None:
+    """Compile scenario of given container to protobuf using the pool
+
+    Equivalent to fameio's make_config, but compiles the scenario
+    held in memory instead of re-reading its yaml file.
+    """
+    print(f"Compiling scenario {cont.trimmed_scenario}")
+    set_config_make_output(cont)
+    scenario = Scenario.from_dict(cont.scenario_yaml)
+    SchemaValidator.ensure_is_valid_scenario(scenario)
+    writer = PooledProtoWriter(cont.config_make[Options.OUTPUT])
+    writer.write_validated_scenario(scenario)
+    print(f"Scenario {cont.trimmed_scenario} compiled")
+
+
+def compile_scenarios(containers: List[Container], n_workers: int) -> None:
+    """Compile scenarios of given containers in parallel"""
+    with ThreadPoolExecutor(max_workers=n_workers) as executor:
+        for future in [
+            executor.submit(compile_scenario, cont) for cont in containers
+        ]:
+            future.result()
+    log.info(f"Time series pool holds {len(TIME_SERIES_POOL)} series")
+
+
+def clear_time_series_pool() -> None:
+    """Remove all time series from the pool, e.g. to free memory"""
+    with TIME_SERIES_POOL_LOCK:
+        TIME_SERIES_POOL.clear()
@@ -0,0 +1,147 @@
+import argparse
+import hashlib
+import os
+import socket
+import time
+from contextlib import contextmanager
+from typing import Dict, Tuple
+
+
+def parse_shard(shard: str) -> Tuple[int, int]:
+    """Parse a shard given as "i/n" with 1 <= i <= n"""
+    try:
+        index, count = (int(part) for part in shard.split("/"))
+    except ValueError:
+        raise argparse.ArgumentTypeError(
+            f"Shard '{shard}' is not of the form i/n, e.g. 1/4."
+        )
+    if not 1 <= index <= count:
+        raise argparse.ArgumentTypeError(
+            f"Shard index of '{shard}' has to be between 1 and {count}."
+        )
+    return index, count
+
+
+def select_shard(
+    tariff_scenarios: Dict[str, str], shard: Tuple[int, int]
+) -> Dict[str, str]:
+    """Return the tariff scenarios assigned to a shard
+
+    Scenarios are sorted by name and dealt out round-robin, so that each
+    invocation with the same config derives the same partition.
+    """
+    index, count = shard
+    return {
+        dr_scen: tariff_scenarios[dr_scen]
+        for dr_scen in sorted(tariff_scenarios)[index - 1 :: count]
+    }
+
+
+def get_shared_folder(config_workflow: Dict) -> str:
+    """Return folder holding lock and marker files shared by all shards"""
+    return (
+        f"{config_workflow['output_folder']}"
+        f"{config_workflow['load_shifting_focus_cluster']}/shared/"
+    )
+
+
+def get_run_key(config_file: str, run_id: str) -> str:
+    """Return a key of a sharded run derived from its id and config"""
+    run_key = hashlib.sha256(run_id.encode("utf-8"))
+    with open(config_file, "rb") as file:
+        run_key.update(file.read())
+    return run_key.hexdigest()[:16]
+
+
+class SharedStage:
+    """Stage run once for all shards, coordinated by lock and marker files
+
+    The first shard acquiring the lock runs the stage and writes the
+    marker once it completed; all other shards wait for the marker. If
+    the running shard fails, it releases the lock, so that a waiting
+    shard takes over. Markers hold the key of the run they were written
+    by; those of other runs or configs are outdated and ignored. Requires
+    a folder shared by all nodes.
+
+    Attributes
+    ----------
+    lock_file: str
+        File created exclusively by the shard running the stage
+
+    marker_file: str
+        File indicating that the stage is complete
+
+    run_key: str
+        Key of the run, see get_run_key
+
+    timeout: float
+        Seconds to wait for another shard to complete the stage
+
+    poll_interval: float
+        Seconds between checks for the marker
+    """
+
+    def __init__(
+        self,
+        folder: str,
+        name: str,
+        run_key: str,
+        timeout: float,
+        poll_interval: float = 10.0,
+    ):
+        os.makedirs(folder, exist_ok=True)
+        self.lock_file = f"{folder}{name}.lock"
+        self.marker_file = f"{folder}{name}.done"
+        self.run_key = run_key
+        self.timeout = timeout
+        self.poll_interval = poll_interval
+
+    def is_complete(self) -> bool:
+        """Return whether the stage was completed by a shard of this run"""
+        try:
+            with open(self.marker_file) as file:
+                return file.readline().strip() == self.run_key
+        except FileNotFoundError:
+            return False
+
+    def claim(self) -> bool:
+        """Return True if this shard has to run the stage, False if done
+
+        :raises TimeoutError: if the stage was not completed in time
+        """
+        deadline = time.perf_counter() + self.timeout
+        while not self.is_complete():
+            try:
+                descriptor = os.open(
+                    self.lock_file, os.O_CREAT | os.O_EXCL | os.O_WRONLY
+                )
+            except FileExistsError:
+                if time.perf_counter() > deadline:
+                    raise TimeoutError(
+                        f"Shared stage not completed within {self.timeout} "
+                        f"s. Remove {self.lock_file} if its owner crashed."
+                    )
+                time.sleep(self.poll_interval)
+                continue
+            with os.fdopen(descriptor, "w") as file:
+                file.write(f"{socket.gethostname()} {os.getpid()}\n")
+            if not self.is_complete():
+                return True
+            # Completed by another shard in the meantime
+            os.remove(self.lock_file)
+        return False
+
+    @contextmanager
+    def hold(self):
+        """Mark stage complete on success, release the lock on failure"""
+        try:
+            yield
+        except BaseException:
+            os.remove(self.lock_file)
+            raise
+        temporary_file = f"{self.marker_file}.{os.getpid()}.tmp"
+        with open(temporary_file, "w") as file:
+            file.write(f"{self.run_key}\n")
+            file.write(f"{socket.gethostname()} {os.getpid()}\n")
+        os.replace(temporary_file, self.marker_file)
+        os.remove(self.lock_file)
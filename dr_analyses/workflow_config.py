@@ -1,15 +1,14 @@
-import shutil
-
-import yaml
 from fameio.source.cli import Options, ResolveOptions
 import argparse
+import socket
 from typing import Dict
 
-from fameio.source.loader import load_yaml
+from dr_analyses.sharding import parse_shard
+from dr_analyses.yaml_io import dump_yaml_file, load_yaml_file
 
 
-def add_args():
-    """Add command line argument for config file"""
+def create_parser() -> argparse.ArgumentParser:
+    """Create parser with command line argument for config file"""
     parser = argparse.ArgumentParser()
     parser.add_argument(
         "-f",
@@ -18,7 +17,59 @@ def add_args():
         default="./config.yml",
         help="Specify input config file",
     )
-    return parser.parse_args()
+    return parser
+
+
+def add_args():
+    """Add command line argument for config file"""
+    return create_parser().parse_args()
+
+
+def add_workflow_args():
+    """Add command line arguments for config file and run modes"""
+    parser = create_parser()
+    parser.add_argument(
+        "--resume",
+        action="store_true",
+        help="Skip stages completed according to the run manifest",
+    )
+    modes = parser.add_mutually_exclusive_group()
+    modes.add_argument(
+        "--shard",
+        type=parse_shard,
+        default=None,
+        help="Run only shard i/n of the tariff scenarios, e.g. 1/4",
+    )
+    parser.add_argument(
+        "--run-id",
+        default=None,
+        help="Identify the sharded run, the same for all of its shards",
+    )
+    parser.add_argument(
+        "--worker-name",
+        default=socket.gethostname(),
+        help="Name of the run manifest of a worker, unique among running "
+        "workers; defaults to the host name",
+    )
+    modes.add_argument(
+        "--merge",
+        action="store_true",
+        help="Evaluate the results of all shards or workers",
+    )
+    modes.add_argument(
+        "--enqueue",
+        action="store_true",
+        help="Prepare tariff scenarios and queue them for workers",
+    )
+    modes.add_argument(
+        "--worker",
+        action="store_true",
+        help="Simulate tariff scenarios from the job queue until drained",
+    )
+    args = parser.parse_args()
+    if args.shard is not None and args.run_id is None:
+        parser.error("--shard requires a --run-id shared by all shards")
+    return args
 
 
 def extract_simple_config(config: Dict, key):
@@ -90,11 +141,7 @@ def update_run_properties(
         new_file_name += config["optional_file_add_on"]
     new_setup_file = f"{new_file_name}.yaml"
 
-    shutil.copyfile(
-        f"{default_run_properties['setup']}",
-        new_setup_file,
-    )
-    fame_setup = load_yaml(new_setup_file)
+    fame_setup = load_yaml_file(default_run_properties["setup"])
     fame_setup["outputFilePrefix"] = (
         f"{fame_setup['outputFilePrefix']}_"
         f"{config['load_shifting_focus_cluster']}_{dr_scen}_{tariff_string}"
@@ -102,8 +149,7 @@ def update_run_properties(
     if "optional_file_add_on" in config:
         fame_setup["outputFilePrefix"] += config["optional_file_add_on"]
 
-    with open(new_setup_file, "w") as file:
-        yaml.dump(fame_setup, file, sort_keys=False)
+    dump_yaml_file(fame_setup, new_setup_file)
 
     run_properties = default_run_properties.copy()
     run_properties["setup"] = new_setup_file
@@ -1,19 +1,33 @@
-import logging as log
 import os
-import pathlib as pt
+import shlex
 import shutil
-from typing import List, Dict
+from typing import List, Dict, Optional
 
 import numpy as np
 import pandas as pd
-import yaml
-from fameio.scripts.convert_results import run as convert_results
-from fameio.scripts.make_config import run as make_config
-from fameio.source import PathResolver
 from fameio.source.cli import Options
-from fameio.source.loader import load_yaml, make_yaml_loader_builder
 
-from dr_analyses.container import Container, replace_value
+from dr_analyses.container import (
+    Container,
+    build_path_index,
+    replace_value,
+    update_paths_with_focus_cluster,
+)
+from dr_analyses.memory_governor import run_process
+from dr_analyses.fame_time_series import (
+    create_fame_time_stamps,
+    read_fame_time_series,
+    write_fame_time_series,
+)
+from dr_analyses.results_conversion import (
+    convert_agent_outputs_in_parallel,
+    load_agent_outputs_in_parallel,
+)
+from dr_analyses.results_reader import (
+    read_agent_output,
+    register_agent_outputs,
+)
+from dr_analyses.yaml_io import dump_yaml_file, load_yaml_file
 
 FLH_ASSERTIONS = {
     "hoho_cluster_shift_only": "smaller",
@@ -44,6 +58,12 @@ def make_directory_if_missing(folder: str) -> None:
         print(f"Failed to create directory: {e}")
 
 
+def get_file_fingerprint(file_name: str) -> (int, int):
+    """Return modification time and size of a file to detect changes"""
+    file_stats = os.stat(file_name)
+    return file_stats.st_mtime_ns, file_stats.st_size
+
+
 def get_all_yaml_files_in_folder_except(
     folder: str, file_list: List[str]
 ) -> List[str]:
@@ -56,22 +76,10 @@ def get_all_yaml_files_in_folder_except(
     ]
 
 
-def load_yaml_file(yaml_file_path: str, path_resolver=PathResolver()):
-    """Load a yaml file
-
-    Duplicate of from fameio.source.loader.load_yaml
-    except for making encoding explicit
-    """
-    log.info("Loading yaml from {}".format(yaml_file_path))
-    with open(pt.Path(yaml_file_path), "r", encoding="utf-8") as configfile:
-        data = yaml.load(configfile, make_yaml_loader_builder(path_resolver))
-    return data
-
-
 def prepare_tariff_configs(config: Dict, dr_scen: str) -> None:
     """Read, prepare and return load shifting tariff model configs"""
     print(f"Preparing tariff configs for scenario {dr_scen}.")
-    tariff_config_template = load_yaml(
+    tariff_config_template = load_yaml_file(
         f"{config['template_folder']}tariff_model_config_template.yaml"
     )["Configs"]
 
@@ -134,16 +142,11 @@ def prepare_tariffs_from_file(
 
     tariff_model_configs = {"Configs": tariff_config_template}
 
-    with open(
+    dump_yaml_file(
+        tariff_model_configs,
         f"{config['template_folder']}tariff_model_configs_"
         f"{config['load_shifting_focus_cluster']}_{dr_scen}.yaml",
-        "w",
-    ) as file:
-        yaml.dump(
-            tariff_model_configs,
-            file,
-            sort_keys=False,
-        )
+    )
 
 
 def obtain_parameterization_from_file(
@@ -260,16 +263,11 @@ def prepare_tariffs_skeleton_from_workflow(
 
     tariff_model_configs = {"Configs": tariff_config_template}
 
-    with open(
+    dump_yaml_file(
+        tariff_model_configs,
         f"{config['template_folder']}tariff_model_configs_"
         f"{config['load_shifting_focus_cluster']}_{dr_scen}.yaml",
-        "w",
-    ) as file:
-        yaml.dump(
-            tariff_model_configs,
-            file,
-            sort_keys=False,
-        )
+    )
 
 
 def prepare_tariffs_list(config: Dict, kind: str):
@@ -300,9 +298,15 @@ def drop_duplicate_scenarios(overview: pd.DataFrame) -> pd.DataFrame:
     return overview
 
 
-def prepare_tariffs_from_workflow(cont: Container, templates: Dict):
+def prepare_tariffs_from_workflow(
+    cont: Container, templates: Dict, all_tariffs: bool = False
+):
     """Prepare actual tariffs while calculating multipliers
-    and payments for each year"""
+    and payments for each year
+
+    If all_tariffs is True, the tariff components for all tariff scenarios
+    of the respective demand response scenario are calculated at once.
+    """
     print(f"Preparing tariffs for scenario {cont.trimmed_scenario}.")
     baseline_power_prices = pd.read_csv(
         f"{cont.config_workflow['input_folder']}"
@@ -333,7 +337,7 @@ def prepare_tariffs_from_workflow(cont: Container, templates: Dict):
     )
     tariff_info = preprocess_tariff_information(cont, baseline_prices_and_load)
     calculate_tariffs_for_dr_scen(
-        cont, tariff_info, templates, baseline_prices_and_load
+        cont, tariff_info, templates, baseline_prices_and_load, all_tariffs
     )
     print(f"Tariffs for scenario {cont.trimmed_scenario} compiled.")
 
@@ -566,6 +570,7 @@ def calculate_tariffs_for_dr_scen(
     tariff_info: pd.DataFrame,
     templates: Dict,
     baseline_prices_and_load: pd.DataFrame,
+    all_tariffs: bool = False,
 ):
     """Calculate and store different tariff components resp. multipliers"""
     overall_tariff = tariff_info["value"]
@@ -573,7 +578,8 @@ def calculate_tariffs_for_dr_scen(
     tariff_configs = templates["tariffs"][cont.trimmed_scenario.split("_")[3]]
     for no in range(len(tariff_configs)):
         if (
-            tariff_configs[no]["Name"]
+            all_tariffs
+            or tariff_configs[no]["Name"]
             == cont.trimmed_scenario.split("_", 4)[-1]
         ):
             tariff_config = tariff_configs[no]
@@ -581,8 +587,8 @@ def calculate_tariffs_for_dr_scen(
                 tariff_config, overall_tariff, baseline_prices_and_load
             )
             for key, component in tariff_components.items():
-                component.index = (
-                    component.index.astype(str) + "-01-01_00:00:00"
+                time_stamps = create_fame_time_stamps(
+                    component.index.astype(int)
                 )
                 to_be_replaced = "/data/"
                 replacement = (
@@ -596,7 +602,9 @@ def calculate_tariffs_for_dr_scen(
                         replacement,
                         exclude=replacement,
                     )
-                    component.to_csv(file_name, header=False, sep=";")
+                    write_fame_time_series(
+                        file_name, time_stamps, component.values
+                    )
                 elif key == "Multiplier":
                     file_name = replace_value(
                         tariff_config["DynamicTariffComponents"][0][key],
@@ -604,7 +612,9 @@ def calculate_tariffs_for_dr_scen(
                         replacement,
                         exclude=replacement,
                     )
-                    component.to_csv(file_name, header=False, sep=";")
+                    write_fame_time_series(
+                        file_name, time_stamps, component.values
+                    )
                 else:
                     raise ValueError("Invalid key for tariff configurations.")
 
@@ -662,29 +672,97 @@ def calculate_capacity_tariff_per_mw(
 
 def read_tariff_configs(config: Dict, dr_scen: str):
     """Read and return load shifting tariff model configs"""
-    return load_yaml(
+    return load_yaml_file(
         f"{config['template_folder']}tariff_model_configs_"
         f"{config['load_shifting_focus_cluster']}_{dr_scen}.yaml"
     )["Configs"]
 
 
+def read_templates(config: Dict) -> Dict:
+    """Read all templates once per workflow run and return them
+
+    Paths are updated with the load shifting focus cluster once here,
+    so that scenarios derived from the templates already point to it.
+    Tariff configs are added per demand response scenario
+    in prepare_scenario_dicts.
+    """
+    templates = {
+        "tariffs": {},
+        "scenario": read_scenario_template(config),
+        "load_shifting": read_load_shifting_template(config),
+        "load_shedding": read_load_shedding_template(config),
+        "investment_results": read_investment_results_template(config),
+        "contracts_w_dr": read_contracts(
+            f"{config['input_folder']}/contracts_w_dr"
+        ),
+    }
+    update_paths_with_focus_cluster(
+        build_path_index(
+            [
+                agent["Attributes"]
+                for agent in templates["scenario"]["Agents"]
+                + [templates["load_shifting"]]
+                + templates["investment_results"]
+                if "Attributes" in agent
+            ]
+            + [templates["load_shedding"]]
+        ),
+        config["load_shifting_focus_cluster"],
+    )
+
+    return templates
+
+
+def read_scenario_template(config: Dict) -> Dict:
+    """Read and return the scenario template
+
+    The template is copied to the scenario folder once beforehand
+    since its includes are given relative to the scenario location.
+    """
+    scenario_template = (
+        f"{config['input_folder']}/"
+        f"{config['scenario_sub_folder']}/"
+        f"{config['load_shifting_focus_cluster']}/"
+        f"scenario_template_wo_dr.yaml"
+    )
+    shutil.copyfile(
+        f"{config['template_folder']}/scenario_template_wo_dr.yaml",
+        scenario_template,
+    )
+    return load_yaml_file(scenario_template)
+
+
+def read_contracts(path_to_contracts: str) -> List[Dict]:
+    """Read and return contracts from all contract files in given folder"""
+    contracts = []
+    contract_files = [
+        path_to_contracts + "/" + file
+        for file in os.listdir(path_to_contracts)
+        if "IGNORE_" not in file and file.endswith(".yaml")
+    ]
+    for file in contract_files:
+        contracts.extend(load_yaml_file(file)["Contracts"])
+
+    return contracts
+
+
 def read_load_shifting_template(config: Dict) -> Dict:
     """Read and return load shifting tariff model configs"""
-    return load_yaml(
+    return load_yaml_file(
         f"{config['template_folder']}load_shifting_config_template.yaml"
     )["Agents"][0]
 
 
 def read_load_shedding_template(config: Dict) -> Dict:
     """Read and return load shifting tariff model configs"""
-    return load_yaml(
+    return load_yaml_file(
         f"{config['template_folder']}load_shedding_config_template.yaml"
     )["Attributes"]
 
 
 def read_investment_results_template(config: Dict) -> Dict:
     """Read and return pommesinvest investment results used as input"""
-    return load_yaml(
+    return load_yaml_file(
         f"{config['template_folder']}investment_results_template.yaml"
     )["Agents"]
 
@@ -707,16 +785,16 @@ def prepare_scenario_dicts(
 
     for dr_scen, dr_scen_name in config["demand_response_scenarios"].items():
         templates["tariffs"][dr_scen] = read_tariff_configs(config, dr_scen)
+        update_paths_with_focus_cluster(
+            build_path_index(templates["tariffs"][dr_scen]),
+            config["load_shifting_focus_cluster"],
+        )
         scenario = (
             f"{config['input_folder']}/"
             f"{config['scenario_sub_folder']}/"
             f"{config['load_shifting_focus_cluster']}/"
             f"scenario_wo_dr_{dr_scen}.yaml"
         )
-        shutil.copyfile(
-            f"{config['template_folder']}/scenario_template_wo_dr.yaml",
-            scenario,
-        )
         scenario_files[f"{dr_scen}_wo_dr"] = scenario
         baseline_scenarios[dr_scen] = scenario
 
@@ -729,10 +807,6 @@ def prepare_scenario_dicts(
                 f"{config['load_shifting_focus_cluster']}/"
                 f"{dr_scen_name}_{tariff_name}.yaml"
             )
-            shutil.copyfile(
-                f"{config['template_folder']}/scenario_template_wo_dr.yaml",
-                scenario,
-            )
             scenario_files[f"{dr_scen}_{tariff_name}"] = scenario
 
         investment_expenses[dr_scen] = read_capital_expenses(
@@ -776,6 +850,9 @@ def initialize_scenario_results_dict(config: Dict) -> Dict:
 
 def make_scenario_config(cont: Container) -> None:
     """Make a config for a given scenario with absolute path"""
+    # Imported on first use, since scenarios are compiled in memory instead
+    from fameio.scripts.make_config import run as make_config
+
     print(f"Compiling scenario {cont.trimmed_scenario}")
     set_config_make_output(cont)
     make_config(cont.scenario, cont.config_make)
@@ -795,24 +872,71 @@ def set_config_make_output(cont: Container) -> None:
     )
 
 
-def run_amiris(run_properties: Dict, cont: Container) -> None:
-    """Run AMIRIS for given run properties and make configuration"""
+def run_amiris(run_properties: Dict, cont: Container) -> Optional[float]:
+    """Run AMIRIS for given run properties and make configuration
+
+    A setup file specific to the scenario lets AMIRIS write its output
+    file named for the scenario, so that several scenarios can be run at
+    once. Outputs of previous runs are removed beforehand, so that a
+    failed run leaves no output behind. Return peak memory of the JVM in
+    MB if measurable.
+
+    :raises RuntimeError: if AMIRIS exits with a nonzero status
+    """
     if Options.OUTPUT not in cont.config_make.keys():
         set_config_make_output(cont)
 
+    scenario_output = get_scenario_output_file(cont)
+    if os.path.exists(scenario_output):
+        os.remove(scenario_output)
+    setup_file = write_scenario_setup(run_properties["setup"], cont)
     call_amiris = "java -ea -cp {} {} {} -f {} -s {}".format(
         run_properties["exe"],
         run_properties["logging"],
         run_properties["main"],
         cont.config_make[Options.OUTPUT],
-        run_properties["setup"],
+        setup_file,
+    )
+    try:
+        status, peak_mb = run_process(shlex.split(call_amiris))
+    finally:
+        os.remove(setup_file)
+    if status != 0:
+        raise RuntimeError(
+            f"AMIRIS run of scenario {cont.trimmed_scenario} failed "
+            f"with exit status {status}"
+        )
+    return peak_mb
+
+
+def write_scenario_setup(setup_file: str, cont: Container) -> str:
+    """Write a copy of the AMIRIS setup with an output file per scenario
+
+    :param str setup_file: setup of the dr scenario
+    :param Container cont: scenario to be run
+    :return str: path of the setup file written
+    """
+    fame_setup = load_yaml_file(setup_file)
+    output_file = os.path.basename(get_scenario_output_file(cont))
+    fame_setup["outputFilePrefix"] = output_file[: -len(".pb")]
+    scenario_setup_file = (
+        f"{setup_file.rsplit('.', 1)[0]}_{cont.trimmed_scenario}.yaml"
+    )
+    dump_yaml_file(fame_setup, scenario_setup_file)
+    return scenario_setup_file
+
+
+def get_scenario_output_file(cont: Container) -> str:
+    """Return the AMIRIS output file renamed for the scenario"""
+    return (
+        f"{cont.config_workflow['output_folder']}/amiris-output_"
+        f"{cont.config_workflow['load_shifting_focus_cluster']}_"
+        f"{cont.trimmed_scenario}.pb"
     )
-    os.system(call_amiris)
 
 
-def convert_amiris_results(cont: Container) -> None:
-    """Convert AMIRIS results from a previous model run"""
-    print(f"Converting scenario {cont.trimmed_scenario} results")
+def set_config_convert_output(cont: Container) -> None:
+    """Define output folder for converted AMIRIS results"""
     focus_cluster = cont.config_workflow["load_shifting_focus_cluster"]
     dr_scenario = cont.trimmed_scenario.split("_")[3]
     cont.config_convert[Options.OUTPUT] = (
@@ -825,48 +949,70 @@ def convert_amiris_results(cont: Container) -> None:
         f"{cont.config_workflow['output_folder']}/"
         f"{focus_cluster}/{dr_scenario}/"
     )
-    add_string = (
-        f"{cont.config_workflow['tariff_config']['energy']['min_share']}-"
-        f"{cont.config_workflow['tariff_config']['energy']['max_share']}_"
-        f"dynamic_"
-        f"{cont.config_workflow['tariff_config']['capacity']['min_share']}-"
-        f"{cont.config_workflow['tariff_config']['capacity']['max_share']}_LP"
-    )
-    if "optional_file_add_on" in cont.config_workflow:
-        add_string += cont.config_workflow["optional_file_add_on"]
-    convert_results(
-        f"{cont.config_workflow['output_folder']}/"
-        f"amiris-output_{focus_cluster}_{dr_scenario}_{add_string}.pb",
-        cont.config_convert,
-    )
-    print(f"Scenario {cont.trimmed_scenario} results converted")
+
+
+def convert_amiris_results(containers: List[Container]) -> None:
+    """Convert AMIRIS results from previous model runs
+
+    Only agent outputs required by the workflow are converted.
+    Several scenarios are converted in parallel. In mode "in_memory",
+    outputs are loaded to memory instead of being written to csv files.
+    """
+    config_workflow = containers[0].config_workflow
+    conversions = []
+    for cont in containers:
+        print(f"Converting scenario {cont.trimmed_scenario} results")
+        set_config_convert_output(cont)
+        amiris_output = get_scenario_output_file(cont)
+        if not os.path.exists(amiris_output):
+            raise FileNotFoundError(
+                f"No AMIRIS output {amiris_output} of scenario "
+                f"{cont.trimmed_scenario} to convert."
+            )
+        conversions.append(
+            (amiris_output, cont.config_convert[Options.OUTPUT])
+        )
+    if config_workflow["result_conversion"]["mode"] == "in_memory":
+        all_outputs = load_agent_outputs_in_parallel(
+            [amiris_output for amiris_output, _ in conversions],
+            containers[0].config_convert,
+            config_workflow["result_conversion"]["n_workers"],
+        )
+        for (amiris_output, output_folder), outputs in zip(
+            conversions, all_outputs
+        ):
+            register_agent_outputs(
+                output_folder, outputs, get_file_fingerprint(amiris_output)
+            )
+    else:
+        convert_agent_outputs_in_parallel(
+            conversions,
+            containers[0].config_convert,
+            config_workflow["result_conversion"]["n_workers"],
+        )
+    for cont in containers:
+        print(f"Scenario {cont.trimmed_scenario} results converted")
 
 
 def store_price_forecast_from_baseline(cont: Container) -> None:
     """Store price forecast obtained from scenario without demand response"""
-    baseline_power_price = pd.read_csv(
+    baseline_power_price = read_agent_output(
         f"{cont.config_workflow['output_folder']}"
         f"{cont.config_workflow['load_shifting_focus_cluster']}/"
         f"{cont.trimmed_scenario.split('_')[3]}/"
-        f"{cont.trimmed_baseline_scenario}"
-        f"/EnergyExchangeMulti.csv",
-        sep=";",
+        f"{cont.trimmed_baseline_scenario}",
+        "EnergyExchangeMulti",
+        cont.config_workflow,
     )["ElectricityPriceInEURperMWH"]
-    price_forecast = pd.read_csv(
+    price_forecast_file = (
         f"{cont.config_workflow['input_folder']}"
         f"{cont.config_workflow['data_sub_folder']}/"
         f"{cont.config_workflow['load_shifting_focus_cluster']}/"
-        f"{cont.trimmed_scenario.split('_')[3]}/price_forecast.csv",
-        sep=";",
-        header=None,
-        index_col=0,
+        f"{cont.trimmed_scenario.split('_')[3]}/price_forecast.csv"
     )
-    price_forecast[1] = baseline_power_price.values
-    price_forecast.to_csv(
-        f"{cont.config_workflow['input_folder']}"
-        f"{cont.config_workflow['data_sub_folder']}/"
-        f"{cont.config_workflow['load_shifting_focus_cluster']}/"
-        f"{cont.trimmed_scenario.split('_')[3]}/price_forecast.csv",
-        sep=";",
-        header=False,
+    price_forecast = read_fame_time_series(price_forecast_file)
+    write_fame_time_series(
+        price_forecast_file,
+        price_forecast.index.values,
+        baseline_power_price.values,
     )
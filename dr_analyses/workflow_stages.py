@@ -0,0 +1,609 @@
+import logging as log
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List
+
+import pandas as pd
+from fameio.source.cli import Options
+
+from dr_analyses.container import Container, trim_file_name
+from dr_analyses.job_queue import JobQueue, format_progress, get_worker_name
+from dr_analyses.memory_governor import MemoryGovernor, get_memory_governor
+from dr_analyses.results_conversion import get_required_agents
+from dr_analyses.results_reader import release_agent_outputs
+from dr_analyses.results_summary import (
+    calc_summary_parameters,
+    calculate_summary,
+    check_compact_summary,
+)
+from dr_analyses.results_workflow import (
+    add_power_payments,
+    calc_load_shifting_results,
+    obtain_scenario_and_baseline_prices,
+    write_results,
+    extract_annual_cashflow_components,
+    extract_load_shifting_cashflows,
+    add_capacity_payments,
+    calculate_net_present_value,
+    add_discounted_payments_to_results,
+    calculate_load_shifting_annuity,
+    calculate_net_present_value_per_capacity,
+)
+from dr_analyses.run_manifest import BASELINE_STAGES, RunManifest
+from dr_analyses.scenario_compilation import (
+    clear_time_series_pool,
+    compile_scenarios,
+)
+from dr_analyses.workflow_routines import (
+    convert_amiris_results,
+    get_scenario_output_file,
+    run_amiris,
+    prepare_tariffs_from_workflow,
+    store_price_forecast_from_baseline,
+)
+from price_sensitivity_analysis import analyse_price_sensitivities_for_dr_scen
+
+
+def group_scenarios_by_dr_scenario(
+    scenario_files: Dict[str, str], baseline_scenarios: Dict[str, str]
+) -> Dict[str, Dict]:
+    """Group scenarios into baseline and tariff scenarios per dr scenario"""
+    grouped_scenarios = {}
+    for dr_scen_short, baseline_scenario in baseline_scenarios.items():
+        grouped_scenarios[dr_scen_short] = {
+            "baseline": (f"{dr_scen_short}_wo_dr", baseline_scenario),
+            "tariffs": {
+                dr_scen: scenario
+                for dr_scen, scenario in scenario_files.items()
+                if dr_scen.split("_", 1)[0] == dr_scen_short
+                and scenario != baseline_scenario
+            },
+        }
+
+    return grouped_scenarios
+
+
+def create_container(
+    scenario: str,
+    templates: Dict,
+    baseline_scenario: str,
+    config_workflow: Dict,
+    config_convert: Dict,
+    config_make: Dict,
+) -> Container:
+    """Create a Container from the scenario template with general settings"""
+    cont = Container(
+        scenario,
+        config_workflow,
+        config_convert,
+        config_make,
+        baseline_scenario,
+        templates["scenario"],
+    )
+    cont.adapt_simulation_time_frame(config_workflow["simulation"])
+    cont.adapt_shortage_capacity(
+        config_workflow["simulation"]["artificial_shortage_capacity_in_MW"]
+    )
+    return cont
+
+
+def add_scenario_specific_data(
+    cont: Container, dr_scen: str, templates: Dict
+) -> None:
+    """Add load shedding, investment and opex data of the dr scenario"""
+    cont.update_load_shedding_config(dr_scen, templates["load_shedding"])
+    cont.add_investment_capacities_for_scenario(
+        dr_scen, templates["investment_results"]
+    )
+    cont.update_opex_for_scenario(dr_scen)
+
+
+def prepare_baseline_scenario(
+    dr_scen: str,
+    scenario: str,
+    templates: Dict,
+    config_workflow: Dict,
+    config_convert: Dict,
+    config_make: Dict,
+) -> Container:
+    """Prepare the baseline scenario (without demand response)"""
+    cont = create_container(
+        scenario,
+        templates,
+        scenario,
+        config_workflow,
+        config_convert,
+        config_make,
+    )
+    cont.create_dummy_price_forecast(dr_scen)
+    cont.update_price_forecast(dr_scen)
+    add_scenario_specific_data(cont, dr_scen, templates)
+
+    return cont
+
+
+def run_baseline_stages(
+    dr_scen: str,
+    scenario: str,
+    templates: Dict,
+    config_workflow: Dict,
+    config_convert: Dict,
+    config_make: Dict,
+    run_properties: Dict,
+    load_shifting_api_thread,
+    manifest: RunManifest,
+    outputs_needed: bool,
+) -> List[Container]:
+    """Run the stages of a baseline scenario left according to manifest
+
+    Stores the price forecast obtained from its results for the tariff
+    scenarios. Return the baseline container if it was prepared.
+    """
+    if not manifest.plan(
+        trim_file_name(scenario), BASELINE_STAGES, outputs_needed
+    ):
+        return []
+    cont = prepare_baseline_scenario(
+        dr_scen,
+        scenario,
+        templates,
+        config_workflow,
+        config_convert,
+        config_make,
+    )
+    manifest.complete(cont.trimmed_scenario, "prepare", persistent=False)
+    if config_workflow["amiris_analyses"]["make_scenario"]:
+        make_scenarios([cont], config_workflow, manifest)
+    simulate_scenarios(
+        [cont], run_properties, load_shifting_api_thread, manifest
+    )
+    if config_workflow["amiris_analyses"][
+        "convert_results"
+    ] and manifest.is_pending(cont.trimmed_scenario, "convert"):
+        store_price_forecast_from_baseline(cont)
+
+    return [cont]
+
+
+def load_baseline_results(
+    scenario: str,
+    templates: Dict,
+    config_workflow: Dict,
+    config_convert: Dict,
+    config_make: Dict,
+) -> List[Container]:
+    """Load results of a baseline run by another shard if held in memory
+
+    In mode "csv", the converted results are read from the shared results
+    folder instead. Return the baseline container if results were loaded.
+    """
+    if config_workflow["result_conversion"]["mode"] != "in_memory":
+        return []
+    cont = create_container(
+        scenario,
+        templates,
+        scenario,
+        config_workflow,
+        config_convert,
+        config_make,
+    )
+    convert_amiris_results([cont])
+
+    return [cont]
+
+
+def prepare_tariff_inputs(
+    tariff_scenarios: Dict[str, str],
+    templates: Dict,
+    baseline_scenario: str,
+    config_workflow: Dict,
+    config_convert: Dict,
+    config_make: Dict,
+) -> None:
+    """Calculate tariffs of all tariff scenarios of a dr scenario at once
+
+    Used when tariff scenarios are split across shards, so that shared
+    tariff input files are written by a single shard only.
+    """
+    if (
+        not tariff_scenarios
+        or config_workflow["tariff_config"]["mode"] != "from_workflow"
+    ):
+        return
+    cont = create_container(
+        tariff_scenarios[sorted(tariff_scenarios)[0]],
+        templates,
+        baseline_scenario,
+        config_workflow,
+        config_convert,
+        config_make,
+    )
+    prepare_tariffs_from_workflow(cont, templates, all_tariffs=True)
+
+
+def prepare_tariff_scenarios(
+    tariff_scenarios: Dict[str, str],
+    templates: Dict,
+    baseline_scenario: str,
+    config_workflow: Dict,
+    config_convert: Dict,
+    config_make: Dict,
+    prepare_all_tariffs: bool = True,
+) -> (Dict[str, Container], List[Dict]):
+    """Prepare all tariff scenarios of a dr scenario
+
+    Requires the baseline results of the dr scenario. Tariffs and
+    price sensitivities are calculated once for all tariff scenarios
+    while preparing the first one; tariffs only if prepare_all_tariffs,
+    i.e. unless already done by prepare_tariff_inputs. Return containers
+    per tariff scenario and price sensitivity plots deferred for later
+    creation.
+    """
+    containers = {}
+    deferred_price_sensitivity_plots = []
+    for number, (dr_scen, scenario) in enumerate(tariff_scenarios.items()):
+        cont = create_container(
+            scenario,
+            templates,
+            baseline_scenario,
+            config_workflow,
+            config_convert,
+            config_make,
+        )
+        cont.add_load_shifting_agent(templates["load_shifting"], dr_scen)
+        if (
+            number == 0
+            and prepare_all_tariffs
+            and config_workflow["tariff_config"]["mode"] == "from_workflow"
+        ):
+            prepare_tariffs_from_workflow(cont, templates, all_tariffs=True)
+        cont.add_load_shifting_config(dr_scen, templates)
+        cont.update_price_forecast(dr_scen)
+        cont.change_contracts(templates["contracts_w_dr"])
+        add_scenario_specific_data(cont, dr_scen, templates)
+        if number == 0:
+            # Power margins do not differ between tariff scenarios
+            power_margins = cont.evaluate_shifting_power_margins()
+            deferred_price_sensitivity_plots.extend(
+                analyse_price_sensitivities_for_dr_scen(
+                    config_workflow, list(tariff_scenarios), power_margins
+                )
+            )
+        cont.replace_price_sensitivity_for_load_shifting(dr_scen)
+        containers[dr_scen] = cont
+
+    return containers, deferred_price_sensitivity_plots
+
+
+def make_scenarios(
+    containers: List[Container], config_workflow: Dict, manifest: RunManifest
+):
+    """Save scenario yaml files and compile them in parallel"""
+    containers = [
+        cont
+        for cont in containers
+        if manifest.is_pending(cont.trimmed_scenario, "make")
+    ]
+    for cont in containers:
+        cont.save_scenario_yaml()
+    compile_scenarios(
+        containers, config_workflow["scenario_compilation"]["n_workers"]
+    )
+    for cont in containers:
+        manifest.complete(
+            cont.trimmed_scenario, "make", [cont.config_make[Options.OUTPUT]]
+        )
+
+
+def simulate_scenarios(
+    containers: List[Container],
+    run_properties: Dict,
+    load_shifting_api_thread,
+    manifest: RunManifest,
+) -> None:
+    """Run AMIRIS for compiled scenarios and convert their results
+
+    Scenarios are run concurrently as far as admitted by the memory
+    governor. A run only counts as complete if AMIRIS succeeded and wrote
+    its output. Failed runs are raised once all runs have finished.
+    """
+    if not containers:
+        return
+    config_workflow = containers[0].config_workflow
+    amiris_analyses = config_workflow["amiris_analyses"]
+    to_run = [
+        cont
+        for cont in containers
+        if manifest.is_pending(cont.trimmed_scenario, "run")
+    ]
+    if amiris_analyses["run_amiris"] and to_run:
+        if (
+            load_shifting_api_thread is None
+            or not load_shifting_api_thread.is_alive()
+        ):
+            raise Exception("LoadShiftingAPI is not available.")
+        governor = get_memory_governor(config_workflow)
+        failures = []
+        with ThreadPoolExecutor(max_workers=len(to_run)) as executor:
+            for cont, future in [
+                (
+                    cont,
+                    executor.submit(
+                        run_amiris_governed,
+                        governor,
+                        load_shifting_api_thread,
+                        run_properties,
+                        cont,
+                    ),
+                )
+                for cont in to_run
+            ]:
+                try:
+                    future.result()
+                except RuntimeError as error:
+                    failures.append(str(error))
+                    continue
+                amiris_output = get_scenario_output_file(cont)
+                if os.path.exists(amiris_output):
+                    manifest.complete(
+                        cont.trimmed_scenario, "run", [amiris_output]
+                    )
+        if failures:
+            raise RuntimeError("\n".join(failures))
+    to_convert = [
+        cont
+        for cont in containers
+        if manifest.is_pending(cont.trimmed_scenario, "convert")
+    ]
+    if amiris_analyses["convert_results"] and to_convert:
+        convert_amiris_results(to_convert)
+        in_memory = config_workflow["result_conversion"]["mode"] == "in_memory"
+        for cont in to_convert:
+            manifest.complete(
+                cont.trimmed_scenario,
+                "convert",
+                [] if in_memory else get_converted_files(cont),
+                persistent=not in_memory,
+            )
+
+
+def run_amiris_governed(
+    governor: MemoryGovernor,
+    load_shifting_api_thread,
+    run_properties: Dict,
+    cont: Container,
+) -> None:
+    """Run AMIRIS once admitted and record its peak memory as well as
+    the largest memory taken by a load shifting solve meanwhile"""
+    with governor.admit(cont.trimmed_scenario) as measurement:
+        with load_shifting_api_thread.track_solve_memory() as solve_memory:
+            measurement["jvm_mb"] = run_amiris(run_properties, cont)
+        measurement["api_solve_mb"] = solve_memory["peak_mb"]
+    if measurement["jvm_mb"] is not None:
+        print(
+            f"AMIRIS run of scenario {cont.trimmed_scenario} peaked at "
+            f"{measurement['jvm_mb']:.0f} MB, its load shifting solves at "
+            f"{measurement['api_solve_mb'] or 0.0:.0f} MB"
+        )
+
+
+def get_converted_files(cont: Container) -> List[str]:
+    """Return csv files of agent outputs converted for a scenario"""
+    return [
+        file_name
+        for file_name in (
+            f"{cont.config_convert[Options.OUTPUT]}/{agent}.csv"
+            for agent in get_required_agents()
+        )
+        if os.path.isfile(file_name)
+    ]
+
+
+def process_scenario_results(
+    cont: Container,
+    dr_scen: str,
+    investment_expenses: Dict,
+    fixed_costs: Dict,
+    manifest: RunManifest,
+) -> None:
+    """Process results of a tariff scenario and add them to its Container
+
+    Processed results are needed in memory for aggregation, hence the
+    stage is recorded as not persistent even if results are written.
+    """
+    obtain_scenario_and_baseline_prices(cont)
+    calc_load_shifting_results(cont, dr_scen)
+    add_power_payments(
+        cont,
+        cont.config_workflow["amiris_analyses"][
+            "use_baseline_prices_for_comparison"
+        ],
+    )
+    add_capacity_payments(
+        cont,
+    )
+    add_discounted_payments_to_results(
+        [
+            "BaselineTotalPayments",
+            "ShiftingTotalPayments",
+            "VariableShiftingCostsFromOptimiser",
+        ],
+        cont,
+    )
+    cont.add_cashflow_components(extract_annual_cashflow_components(cont))
+    cont.add_cashflows(
+        extract_load_shifting_cashflows(cont, dr_scen, fixed_costs)
+    )
+    cont.add_npv(
+        calculate_net_present_value(
+            cont, dr_scen, investment_expenses, fixed_costs
+        )
+    )
+    cont.add_npv_per_capacity(calculate_net_present_value_per_capacity(cont))
+    cont.add_annuity(calculate_load_shifting_annuity(cont))
+    if cont.config_workflow["write_results"]:
+        write_results(cont)
+    if cont.config_workflow["compact_results"]:
+        check_compact = cont.config_workflow["check_compact_results"]
+        if check_compact:
+            full_summary = calculate_summary(cont)
+        cont.compact_results()
+        if check_compact:
+            check_compact_summary(full_summary, calculate_summary(cont))
+    manifest.complete(cont.trimmed_scenario, "process", persistent=False)
+
+
+def release_scenario_outputs(containers: List[Container]) -> None:
+    """Remove agent outputs of scenarios loaded to memory"""
+    for cont in containers:
+        if cont.config_convert.get(Options.OUTPUT):
+            release_agent_outputs(cont.config_convert[Options.OUTPUT])
+
+
+def aggregate_scenario_results(
+    cont: Container, manifest: RunManifest
+) -> pd.Series:
+    """Calculate and return summary parameters of a tariff scenario
+
+    Cashflow components are written alongside for financial sweeps.
+    """
+    calc_summary_parameters(cont)
+    cont.write_cashflow_components()
+    manifest.complete(
+        cont.trimmed_scenario,
+        "aggregate",
+        [
+            f"{cont.config_convert[Options.OUTPUT]}/parameter_summary.csv",
+            f"{cont.config_convert[Options.OUTPUT]}/cashflow_components.csv",
+        ],
+    )
+    return cont.summary_series
+
+
+def enqueue_tariff_scenarios(
+    containers: Dict[str, Container],
+    job_queue: JobQueue,
+    dr_scen_short: str,
+    baseline_scenario: str,
+) -> None:
+    """Save prepared tariff scenarios and queue them for workers"""
+    for cont in containers.values():
+        cont.save_scenario_yaml()
+    job_queue.enqueue(
+        [
+            {
+                "dr_scen": dr_scen,
+                "dr_scen_short": dr_scen_short,
+                "scenario": cont.scenario,
+                "baseline_scenario": baseline_scenario,
+            }
+            for dr_scen, cont in containers.items()
+        ]
+    )
+
+
+def run_tariff_job(
+    job: Dict,
+    config_workflow: Dict,
+    config_convert: Dict,
+    config_make: Dict,
+    run_properties: Dict,
+    load_shifting_api_thread,
+    manifest: RunManifest,
+    investment_expenses: Dict,
+    fixed_costs: Dict,
+) -> None:
+    """Make and simulate a tariff scenario prepared when enqueued
+
+    The container is restored from the scenario yaml saved when enqueued
+    and compiled to use the load shifting API of this worker. Results are
+    aggregated to the shared results folder.
+    """
+    cont = Container(
+        job["scenario"],
+        config_workflow,
+        config_convert,
+        config_make,
+        job["baseline_scenario"],
+    )
+    if load_shifting_api_thread is not None:
+        cont.set_load_shifting_service_url(load_shifting_api_thread.get_url())
+    if config_workflow["amiris_analyses"]["make_scenario"]:
+        make_scenarios([cont], config_workflow, manifest)
+    simulate_scenarios(
+        [cont], run_properties, load_shifting_api_thread, manifest
+    )
+    if config_workflow["amiris_analyses"]["process_results"]:
+        process_scenario_results(
+            cont, job["dr_scen"], investment_expenses, fixed_costs, manifest
+        )
+    if config_workflow["amiris_analyses"]["aggregate_results"]:
+        aggregate_scenario_results(cont, manifest)
+    release_scenario_outputs([cont])
+
+
+def drain_job_queue(
+    job_queue: JobQueue,
+    templates: Dict,
+    config_workflow: Dict,
+    config_convert: Dict,
+    config_make: Dict,
+    run_properties: Dict[str, Dict],
+    load_shifting_api_thread,
+    manifest: RunManifest,
+    investment_expenses: Dict,
+    fixed_costs: Dict,
+) -> None:
+    """Run queued tariff scenario jobs until no job is left
+
+    Waits for jobs running on other workers, since they are queued again
+    if they fail. Failed jobs are logged and retried by the queue. Jobs
+    are claimed ordered by dr scenario, so the time series pool is cleared
+    whenever the dr scenario changes.
+    """
+    worker = get_worker_name()
+    baseline_conts = {}
+    dr_scen_short = None
+    while True:
+        job = job_queue.claim(worker)
+        if job is None:
+            if job_queue.is_drained():
+                break
+            time.sleep(config_workflow["job_queue"]["poll_interval"])
+            continue
+        print(f"Worker {worker} running job {job['dr_scen']}")
+        if job["dr_scen_short"] != dr_scen_short:
+            clear_time_series_pool()
+            dr_scen_short = job["dr_scen_short"]
+        try:
+            with job_queue.keep_alive(job["dr_scen"]):
+                if job["baseline_scenario"] not in baseline_conts:
+                    baseline_conts[
+                        job["baseline_scenario"]
+                    ] = load_baseline_results(
+                        job["baseline_scenario"],
+                        templates,
+                        config_workflow,
+                        config_convert,
+                        config_make,
+                    )
+                run_tariff_job(
+                    job,
+                    config_workflow,
+                    config_convert,
+                    config_make,
+                    run_properties[job["dr_scen_short"]],
+                    load_shifting_api_thread,
+                    manifest,
+                    investment_expenses,
+                    fixed_costs,
+                )
+        except Exception as error:
+            log.exception(f"Job {job['dr_scen']} failed")
+            job_queue.fail(job["dr_scen"], repr(error))
+        else:
+            job_queue.complete(job["dr_scen"])
+        print(f"Job queue: {format_progress(job_queue.get_progress())}")
+    for conts in baseline_conts.values():
+        release_scenario_outputs(conts)
@@ -0,0 +1,44 @@
+import logging as log
+import pathlib as pt
+from typing import Any
+
+import yaml
+from fameio.source import PathResolver
+from fameio.source.loader import make_yaml_loader_builder
+
+# Use libyaml-backed (C) loader and dumper if PyYAML was built against it
+try:
+    from yaml import CSafeLoader as SafeLoader, CDumper as Dumper
+except ImportError:
+    from yaml import SafeLoader, Dumper
+
+INCLUDE_TAG = "!include"
+
+
+def load_yaml_file(yaml_file_path: str, path_resolver=PathResolver()):
+    """Load a yaml file
+
+    Duplicate of from fameio.source.loader.load_yaml
+    except for making encoding explicit. Files without includes
+    are parsed using the libyaml-backed loader if available.
+    """
+    log.info("Loading yaml from {}".format(yaml_file_path))
+    with open(pt.Path(yaml_file_path), "r", encoding="utf-8") as configfile:
+        content = configfile.read()
+        if INCLUDE_TAG in content:
+            # fameio's loader resolves includes relative to the file location
+            configfile.seek(0)
+            return yaml.load(
+                configfile, make_yaml_loader_builder(path_resolver)
+            )
+
+    return yaml.load(content, Loader=SafeLoader)
+
+
+def dump_yaml_file(data: Any, yaml_file_path: str) -> None:
+    """Dump data to a yaml file keeping the order of keys
+
+    Uses the libyaml-backed dumper if available.
+    """
+    with open(yaml_file_path, "w", encoding="utf-8") as file:
+        yaml.dump(data, file, Dumper=Dumper, sort_keys=False)
@@ -0,0 +1,118 @@
+import gzip
+import hashlib
+import json
+import logging as log
+import os
+import threading
+from collections import OrderedDict
+from typing import Dict, Optional
+
+from fastapi.encoders import jsonable_encoder
+
+from .micro_model import Inputs
+
+# Increase to invalidate responses persisted by an outdated model version
+CACHE_VERSION = 1
+
+
+def get_cache_key(inputs: Inputs, **settings) -> str:
+    """Return a canonical hash of the inputs and service settings
+
+    :param Inputs inputs: micro model inputs
+    :param settings: service settings affecting the response
+    :return str: sha256 hex digest
+    """
+    payload = {
+        "version": CACHE_VERSION,
+        "inputs": jsonable_encoder(inputs),
+        "settings": settings,
+    }
+    canonical = json.dumps(payload, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """Cache of micro model responses keyed by a hash of their inputs
+
+    Holds the most recently used responses in memory. If a directory is
+    given, responses are also stored there as gzipped json files, so that
+    they survive restarts of the server.
+
+    Attributes
+    ----------
+    max_entries: int
+        Maximum number of responses held in memory
+
+    directory: str or None
+        Folder to persist responses to
+
+    statistics: dict
+        Number of hits in memory, on disk and misses
+    """
+
+    def __init__(self, max_entries: int = 1024, directory: str = None):
+        self.max_entries = max_entries
+        self.directory = directory
+        self.statistics = {"memory_hits": 0, "disk_hits": 0, "misses": 0}
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        if directory is not None:
+            os.makedirs(directory, exist_ok=True)
+
+    def get(self, key: str) -> Optional[Dict]:
+        """Return cached entry for key, None if not cached"""
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.statistics["memory_hits"] += 1
+                return self._entries[key]
+        entry = self._read(key)
+        with self._lock:
+            if entry is None:
+                self.statistics["misses"] += 1
+                return None
+            self.statistics["disk_hits"] += 1
+            self._add(key, entry)
+        return entry
+
+    def put(self, key: str, entry: Dict) -> None:
+        """Cache a json serializable entry for key"""
+        with self._lock:
+            self._add(key, entry)
+        self._write(key, entry)
+
+    def _add(self, key: str, entry: Dict) -> None:
+        """Add entry to memory, evicting the least recently used ones"""
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def _get_file_path(self, key: str) -> str:
+        """Return path of the file persisting the entry for key"""
+        return f"{self.directory}/{key[:2]}/{key}.json.gz"
+
+    def _read(self, key: str) -> Optional[Dict]:
+        """Read entry for key from disk, None if not persisted"""
+        if self.directory is None:
+            return None
+        file_path = self._get_file_path(key)
+        if not os.path.isfile(file_path):
+            return None
+        try:
+            with gzip.open(file_path, "rt", encoding="utf-8") as file:
+                return json.load(file)
+        except (OSError, ValueError) as error:
+            log.warning(f"Ignoring unreadable cache file {file_path}: {error}")
+            return None
+
+    def _write(self, key: str, entry: Dict) -> None:
+        """Persist entry for key atomically if a directory is given"""
+        if self.directory is None:
+            return
+        file_path = self._get_file_path(key)
+        os.makedirs(os.path.dirname(file_path), exist_ok=True)
+        temporary_path = f"{file_path}.{os.getpid()}.tmp"
+        with gzip.open(temporary_path, "wt", encoding="utf-8") as file:
+            json.dump(entry, file)
+        os.replace(temporary_path, file_path)
@@ -1,17 +1,59 @@
+import json
+import logging as log
 import socket
 import threading
-from contextlib import closing
+import time
+import urllib.error
+import urllib.request
+from contextlib import closing, contextmanager
+from typing import Dict, Iterator, Optional
 
 import uvicorn
-from fastapi import FastAPI
-from fastapi.responses import HTMLResponse
+from fastapi import FastAPI, Response
+from fastapi.concurrency import run_in_threadpool
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import HTMLResponse, PlainTextResponse
 
-from .micro_model import micro_model_api, ModelResponse, Inputs
+from .cache import ResponseCache, get_cache_key
+from .metrics import ApiMetrics
+from .micro_model import (
+    DEFAULT_FORMULATION,
+    FORMULATIONS,
+    run_micro_model,
+    ModelResponse,
+    Inputs,
+)
+from .recording import RequestRecorder
 
 HOST = "127.0.0.1"
 END_POINT = "/load_shift"
+# Response headers reporting metadata of a model run
+METADATA_HEADERS = {
+    "variables_eliminated": "X-Presolve-Eliminated-Variables",
+    "constraints_eliminated": "X-Presolve-Eliminated-Constraints",
+    "approximation_error": "X-Price-Sensitivity-Approximation-Error",
+    "solver_interface": "X-Solver-Interface",
+    "write_seconds": "X-Solver-Write-Seconds",
+    "solve_seconds": "X-Solver-Solve-Seconds",
+    "load_seconds": "X-Solver-Load-Seconds",
+    "build_seconds": "X-Model-Build-Seconds",
+    "extract_seconds": "X-Model-Extract-Seconds",
+    "variables": "X-Model-Variables",
+    "constraints": "X-Model-Constraints",
+    "termination_condition": "X-Solver-Termination-Condition",
+    "solve_memory_mb": "X-Solver-Memory-MB",
+}
+OPTIMAL_TERMINATION = "optimal"
 
 app = FastAPI()
+app.state.formulation = DEFAULT_FORMULATION
+app.state.pwl_segments = 0
+app.state.response_cache = ResponseCache()
+app.state.recorder = None
+app.state.metrics = ApiMetrics()
+app.state.solve_slots = threading.BoundedSemaphore(1)
+app.state.warm_up_solver = None
+app.state.readiness = {"ready": False, "warm_up_seconds": None, "error": None}
 
 
 @app.get("/", response_class=HTMLResponse)
@@ -20,9 +62,141 @@ async def root():
     Please check the <a href="/docs">documentation</a></body></html>"""
 
 
+@app.on_event("startup")
+async def start_up():
+    await run_in_threadpool(warm_up, app.state.warm_up_solver)
+
+
+def warm_up(solver: Optional[str]) -> None:
+    """Solve a tiny model to import pyomo and solver plugins in advance
+
+    Failures are reported by the readiness probe instead of stopping the
+    server. Without a solver, the server is ready right away.
+    """
+    start = time.perf_counter()
+    try:
+        if solver is not None:
+            run_micro_model(
+                create_warm_up_inputs(solver),
+                app.state.formulation,
+                app.state.pwl_segments,
+            )
+    except Exception as error:
+        log.error(f"Warm-up of the load shifting API failed: {error}")
+        app.state.readiness["error"] = repr(error)
+        return
+    app.state.readiness["warm_up_seconds"] = time.perf_counter() - start
+    app.state.readiness["ready"] = True
+
+
+def create_warm_up_inputs(solver: str, time_steps: int = 4) -> Inputs:
+    """Return inputs of a tiny model with a shift from peak to off-peak"""
+    return Inputs(
+        peak_load_price=1.0,
+        variable_costs_down=[0.0] * time_steps,
+        variable_costs_up=[0.0] * time_steps,
+        max_shifting_time=1,
+        interference_time=1,
+        peak_demand_before=1.0,
+        max_capacity_down=0.5,
+        max_capacity_up=0.5,
+        efficiency=1.0,
+        activate_annual_limits=False,
+        solver=solver,
+        max_activations=0,
+        initial_energy_level=0.0,
+        normalized_baseline_load=[(1 + t % 2) / 2 for t in range(time_steps)],
+        energy_price=[50.0 * (1 + t % 2) for t in range(time_steps)],
+        availability_up=[1.0] * time_steps,
+        availability_down=[1.0] * time_steps,
+        price_sensitivity=[0.0] * time_steps,
+    )
+
+
+@app.get("/ready")
+async def ready(response: Response):
+    if not app.state.readiness["ready"]:
+        response.status_code = 503
+    return app.state.readiness
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    return app.state.metrics.render()
+
+
+def solve_request(inputs: Inputs):
+    """Run the micro model once a solve slot is free"""
+    app.state.metrics.queue()
+    with app.state.solve_slots:
+        app.state.metrics.start()
+        try:
+            return run_micro_model(
+                inputs, app.state.formulation, app.state.pwl_segments
+            )
+        finally:
+            app.state.metrics.finish()
+
+
 @app.post(END_POINT)
-async def call_micro_model(inputs: Inputs) -> ModelResponse:
-    return micro_model_api(inputs)
+async def call_micro_model(
+    inputs: Inputs, response: Response
+) -> ModelResponse:
+    try:
+        return await answer_request(inputs, response)
+    except Exception:
+        app.state.metrics.observe_error()
+        raise
+
+
+async def answer_request(inputs: Inputs, response: Response) -> ModelResponse:
+    """Answer a request from cache or by solving the micro model"""
+    received = time.perf_counter()
+    cache = app.state.response_cache
+    cache_key = get_cache_key(
+        inputs,
+        formulation=app.state.formulation,
+        pwl_segments=app.state.pwl_segments,
+    )
+    entry = cache.get(cache_key) if cache is not None else None
+    cache_hit = entry is not None
+    response.headers["X-Cache"] = "hit" if cache_hit else "miss"
+    response.headers["X-Queue-Depth"] = str(
+        app.state.metrics.get_queue_depth()
+    )
+    if not cache_hit:
+        model_response, metadata = await run_in_threadpool(
+            solve_request, inputs
+        )
+        entry = {
+            "response": jsonable_encoder(model_response),
+            "metadata": metadata,
+        }
+        # Non-optimal solves answer with zero schedules not to be reused
+        if (
+            cache is not None
+            and metadata["termination_condition"] == OPTIMAL_TERMINATION
+        ):
+            cache.put(cache_key, entry)
+    for key, header in METADATA_HEADERS.items():
+        # Measurements of the original solve do not apply to cache hits
+        if cache_hit and key.endswith(("_seconds", "_mb")):
+            continue
+        # timings included in solving are not reported separately
+        if entry["metadata"].get(key) is not None:
+            response.headers[header] = str(entry["metadata"][key])
+    duration = time.perf_counter() - received
+    app.state.metrics.observe_request(duration, cache_hit, entry["metadata"])
+    if app.state.recorder is not None:
+        app.state.recorder.record(
+            inputs,
+            {} if cache_hit else entry["metadata"],
+            received,
+            duration,
+            cache_hit,
+        )
+
+    return ModelResponse(**entry["response"])
 
 
 class LoadShiftingApiThread(threading.Thread):
@@ -39,11 +213,41 @@ class LoadShiftingApiThread(threading.Thread):
             s.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
             return s.getsockname()[1]
 
-    def __init__(self):
+    def __init__(
+        self,
+        formulation: str = DEFAULT_FORMULATION,
+        pwl_segments: int = 0,
+        cache_size: int = 1024,
+        cache_directory: str = None,
+        record_directory: str = None,
+        max_concurrent_solves: int = 1,
+        warm_up_solver: str = None,
+    ):
         super().__init__()
         self.runnable = self.start_server
         self.daemon = True
         self.port = self.find_free_port()
+        if formulation not in FORMULATIONS:
+            raise ValueError(
+                f"Unknown formulation '{formulation}'. "
+                f"Choose one of {list(FORMULATIONS)}."
+            )
+        app.state.formulation = formulation
+        app.state.pwl_segments = pwl_segments
+        app.state.response_cache = (
+            ResponseCache(cache_size, cache_directory)
+            if cache_size > 0
+            else None
+        )
+        app.state.solve_slots = threading.BoundedSemaphore(
+            max_concurrent_solves
+        )
+        app.state.warm_up_solver = warm_up_solver
+        app.state.recorder = (
+            RequestRecorder(record_directory)
+            if record_directory is not None
+            else None
+        )
 
     def run(self) -> None:
         self.runnable(self.port)
@@ -51,6 +255,45 @@ class LoadShiftingApiThread(threading.Thread):
     def get_url(self):
         return f"http://{HOST}:{self.port}{END_POINT}/"
 
+    @contextmanager
+    def track_solve_memory(self) -> Iterator[Dict]:
+        """Yield a dict holding the largest memory in MB taken by a solve
+        in the meantime as "peak_mb", None if nothing was solved"""
+        window = app.state.metrics.open_memory_window()
+        try:
+            yield window
+        finally:
+            app.state.metrics.close_memory_window(window)
+
+    def wait_until_ready(self, timeout: float) -> None:
+        """Block until the server is warmed up and ready to solve
+
+        :param float timeout: seconds to wait at maximum
+        :raises RuntimeError: if the server stopped or its warm-up failed
+        :raises TimeoutError: if the server did not get ready in time
+        """
+        ready_url = f"http://{HOST}:{self.port}/ready"
+        deadline = time.perf_counter() + timeout
+        while time.perf_counter() < deadline:
+            if not self.is_alive():
+                raise RuntimeError("Load shifting API server stopped.")
+            try:
+                with urllib.request.urlopen(ready_url, timeout=1):
+                    return
+            except urllib.error.HTTPError as error:
+                readiness = json.load(error)
+                if readiness["error"] is not None:
+                    raise RuntimeError(
+                        "Warm-up of the load shifting API failed: "
+                        f"{readiness['error']}"
+                    )
+            except OSError:
+                pass
+            time.sleep(0.1)
+        raise TimeoutError(
+            f"Load shifting API at {ready_url} not ready within {timeout} s."
+        )
+
 
 if __name__ == "__main__":
     LoadShiftingApiThread.start_server(
@@ -0,0 +1,190 @@
+import mmap
+import threading
+from typing import Dict, List, Optional
+
+# Upper bounds of the request duration histogram in seconds
+DURATION_BUCKETS = [0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0]
+# Timings of a model run summarized by phase
+PHASES = ["build", "write", "solve", "load", "extract"]
+
+
+def get_resident_memory() -> Optional[float]:
+    """Return current resident memory of this process in MB if measurable
+
+    Only available where the proc file system is, i.e. on Linux.
+    """
+    try:
+        with open("/proc/self/statm") as file:
+            resident_pages = int(file.read().split()[1])
+    except OSError:
+        return None
+    return resident_pages * mmap.PAGESIZE / 1024**2
+
+
+class ApiMetrics:
+    """Performance metrics of the load shifting API
+
+    Counts requests by cache hit and solver termination condition, keeps
+    track of requests waiting for and holding a solve slot and summarizes
+    request durations, model run phases and problem sizes. Rendered in the
+    Prometheus text exposition format. In addition, the largest memory
+    needed by a solve is tracked for each memory window opened.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.waiting = 0
+        self.in_progress = 0
+        self.errors = 0
+        self.requests = {}
+        self.duration_buckets = [0] * len(DURATION_BUCKETS)
+        self.duration_sum = 0.0
+        self.duration_count = 0
+        self.phase_sums = {phase: 0.0 for phase in PHASES}
+        self.phase_counts = {phase: 0 for phase in PHASES}
+        self.last_problem_size = {"variables": 0, "constraints": 0}
+        self.memory_windows = {}
+
+    def get_queue_depth(self) -> int:
+        """Return number of requests waiting for a solve slot"""
+        with self._lock:
+            return self.waiting
+
+    def queue(self) -> None:
+        """Count a request waiting for a solve slot"""
+        with self._lock:
+            self.waiting += 1
+
+    def start(self) -> None:
+        """Count a request that obtained a solve slot"""
+        with self._lock:
+            self.waiting -= 1
+            self.in_progress += 1
+
+    def finish(self) -> None:
+        """Count a request that released its solve slot"""
+        with self._lock:
+            self.in_progress -= 1
+
+    def open_memory_window(self) -> Dict:
+        """Return a dict holding the largest solve memory from now on"""
+        window = {"peak_mb": None}
+        with self._lock:
+            self.memory_windows[id(window)] = window
+        return window
+
+    def close_memory_window(self, window: Dict) -> None:
+        """Stop tracking solve memory in a window"""
+        with self._lock:
+            del self.memory_windows[id(window)]
+
+    def observe_error(self) -> None:
+        """Count a request that failed"""
+        with self._lock:
+            self.errors += 1
+
+    def observe_request(
+        self, duration: float, cache_hit: bool, metadata: Dict
+    ) -> None:
+        """Add a request answered and the metadata of its model run"""
+        labels = (
+            "hit" if cache_hit else "miss",
+            str(metadata.get("termination_condition")),
+        )
+        with self._lock:
+            self.requests[labels] = self.requests.get(labels, 0) + 1
+            for number, bound in enumerate(DURATION_BUCKETS):
+                if duration <= bound:
+                    self.duration_buckets[number] += 1
+            self.duration_sum += duration
+            self.duration_count += 1
+            if cache_hit:
+                return
+            for phase in PHASES:
+                seconds = metadata.get(f"{phase}_seconds")
+                if seconds is not None:
+                    self.phase_sums[phase] += seconds
+                    self.phase_counts[phase] += 1
+            for size in self.last_problem_size:
+                self.last_problem_size[size] = metadata[size]
+            memory_mb = metadata.get("solve_memory_mb")
+            if memory_mb is None:
+                return
+            for window in self.memory_windows.values():
+                window["peak_mb"] = max(window["peak_mb"] or 0.0, memory_mb)
+
+    def render(self) -> str:
+        """Return metrics in the Prometheus text exposition format"""
+        with self._lock:
+            lines = [
+                "# HELP load_shift_requests_total Requests answered.",
+                "# TYPE load_shift_requests_total counter",
+            ]
+            for (cache, termination), count in sorted(self.requests.items()):
+                lines.append(
+                    f'load_shift_requests_total{{cache="{cache}",'
+                    f'termination_condition="{termination}"}} {count}'
+                )
+            lines += get_metric(
+                "load_shift_request_errors_total",
+                "counter",
+                "Requests failed.",
+                self.errors,
+            )
+            lines += get_metric(
+                "load_shift_queue_depth",
+                "gauge",
+                "Requests waiting for a solve slot.",
+                self.waiting,
+            )
+            lines += get_metric(
+                "load_shift_requests_in_progress",
+                "gauge",
+                "Requests being solved.",
+                self.in_progress,
+            )
+            lines += [
+                "# HELP load_shift_request_duration_seconds Time to answer "
+                "a request.",
+                "# TYPE load_shift_request_duration_seconds histogram",
+            ]
+            for bound, count in zip(DURATION_BUCKETS, self.duration_buckets):
+                lines.append(
+                    "load_shift_request_duration_seconds_bucket"
+                    f'{{le="{bound}"}} {count}'
+                )
+            lines += [
+                "load_shift_request_duration_seconds_bucket"
+                f'{{le="+Inf"}} {self.duration_count}',
+                "load_shift_request_duration_seconds_sum "
+                f"{self.duration_sum}",
+                "load_shift_request_duration_seconds_count "
+                f"{self.duration_count}",
+                "# HELP load_shift_phase_seconds Time spent per model run "
+                "phase.",
+                "# TYPE load_shift_phase_seconds summary",
+            ]
+            for phase in PHASES:
+                lines += [
+                    f'load_shift_phase_seconds_sum{{phase="{phase}"}} '
+                    f"{self.phase_sums[phase]}",
+                    f'load_shift_phase_seconds_count{{phase="{phase}"}} '
+                    f"{self.phase_counts[phase]}",
+                ]
+            for size, value in self.last_problem_size.items():
+                lines += get_metric(
+                    f"load_shift_last_model_{size}",
+                    "gauge",
+                    f"Number of {size} of the model solved last.",
+                    value,
+                )
+        return "\n".join(lines) + "\n"
+
+
+def get_metric(name: str, kind: str, description: str, value) -> List[str]:
+    """Return lines of a metric without labels in the text format"""
+    return [
+        f"# HELP {name} {description}",
+        f"# TYPE {name} {kind}",
+        f"{name} {value}",
+    ]
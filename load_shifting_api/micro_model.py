@@ -1,13 +1,23 @@
-from typing import List
+import time
+from typing import Any, Dict, List, Optional, Tuple
 
 import pyomo.environ as pyo
 from pydantic import BaseModel
 
+from .metrics import get_resident_memory
+from .model.compactloadshiftmodel import CompactLoadShiftOptimizationModel
 from .model.loadshiftmodel import (
     LoadShiftOptimizationModel,
 )
 from .model.processing import extract_results
 
+# Available formulations of the load shifting model
+FORMULATIONS = {
+    "h_indexed": LoadShiftOptimizationModel,
+    "compact": CompactLoadShiftOptimizationModel,
+}
+DEFAULT_FORMULATION = "h_indexed"
+
 
 class Inputs(BaseModel):
     """Inputs to the load shifting micro-model"""
@@ -34,6 +44,16 @@ class Inputs(BaseModel):
     availability_down: List[float]
     price_sensitivity: List[float]
 
+    # Model formulation; service default applies if not given
+    formulation: Optional[str] = None
+
+    # Eliminate variables being zero due to the inputs before solving
+    presolve: bool = True
+
+    # Linear segments approximating the price sensitivity costs (0: exact);
+    # service default applies if not given
+    pwl_segments: Optional[int] = None
+
 
 class ModelResponse(BaseModel):
     """Output from the load shifting micro-model"""
@@ -44,32 +64,93 @@ class ModelResponse(BaseModel):
     overall_variable_costs: float
 
 
-def micro_model_api(inputs: Inputs) -> ModelResponse:
+def micro_model_api(
+    inputs: Inputs,
+    formulation: str = DEFAULT_FORMULATION,
+    pwl_segments: int = 0,
+) -> ModelResponse:
     """
     Trigger a micro-model run using the given inputs
 
     Args:
         inputs: Inputs
             Collection of all necessary micro-model inputs
+        formulation: str
+            Model formulation used unless specified in inputs
+        pwl_segments: int
+            Segments approximating the price sensitivity costs used unless
+            specified in inputs
 
     Returns:
         ModelResponse
     """
-    demand_after, upshift, downshift, overall_variable_costs = run_model(
-        inputs
-    )
+    response, _ = run_micro_model(inputs, formulation, pwl_segments)
+
+    return response
+
+
+def run_micro_model(
+    inputs: Inputs,
+    formulation: str = DEFAULT_FORMULATION,
+    pwl_segments: int = 0,
+) -> Tuple[ModelResponse, Dict[str, Any]]:
+    """Trigger a micro-model run and return response and run metadata
+
+    Args:
+        inputs: Inputs
+            Collection of all necessary micro-model inputs
+        formulation: str
+            Model formulation used unless specified in inputs
+        pwl_segments: int
+            Segments approximating the price sensitivity costs used unless
+            specified in inputs
 
-    return ModelResponse(
+    Returns:
+        ModelResponse and metadata, i.e. number of variables and constraints
+        eliminated by presolve, the price sensitivity approximation error,
+        the solver interface used, its termination condition, the model size,
+        the memory taken by the model run and timings of building the model,
+        writing, solving and loading it as well as extracting results
+    """
+    if inputs.pwl_segments is not None:
+        pwl_segments = inputs.pwl_segments
+    (
+        demand_after,
+        upshift,
+        downshift,
+        overall_variable_costs,
+        metadata,
+    ) = run_model(inputs, inputs.formulation or formulation, pwl_segments)
+    response = ModelResponse(
         demand_after=demand_after,
         upshift=upshift,
         downshift=downshift,
         overall_variable_costs=overall_variable_costs,
     )
 
+    return response, metadata
 
-def run_model(inputs: Inputs):
-    """Run load shift optimization model and return model results"""
-    lsm = LoadShiftOptimizationModel(
+
+def run_model(
+    inputs: Inputs,
+    formulation: str = DEFAULT_FORMULATION,
+    pwl_segments: int = 0,
+):
+    """Run load shift optimization model and return model results
+    as well as run metadata
+
+    The memory taken by the model run is measured as the growth of the
+    resident memory of this process while the model is held, so it
+    includes concurrent model runs and excludes memory reused from
+    earlier ones.
+    """
+    if formulation not in FORMULATIONS:
+        raise ValueError(
+            f"Unknown formulation '{formulation}'. "
+            f"Choose one of {list(FORMULATIONS)}."
+        )
+    memory_before = get_resident_memory()
+    lsm = FORMULATIONS[formulation](
         normalized_baseline_load=inputs.normalized_baseline_load,
         energy_price=inputs.energy_price,
         availability_up=inputs.availability_up,
@@ -88,12 +169,37 @@ def run_model(inputs: Inputs):
         solver=inputs.solver,
         max_activations=inputs.max_activations,
         initial_energy_level=0,  # inputs.initial_energy_level,
+        presolve=inputs.presolve,
+        pwl_segments=pwl_segments,
     )
+    start = time.perf_counter()
     extract_results(lsm, rounding_precision=4)
+    extract_seconds = time.perf_counter() - start
+    memory_after = get_resident_memory()
+    solve_memory_mb = (
+        max(memory_after - memory_before, 0.0)
+        if memory_before is not None
+        else None
+    )
 
     return (
         lsm.demand_after,
         lsm.upshift,
         lsm.downshift,
         pyo.value(lsm.model.overall_variable_costs),
+        {
+            **lsm.presolve_statistics,
+            "approximation_error": lsm.get_approximation_error(),
+            "solver_interface": lsm.solver_interface,
+            "termination_condition": lsm.termination_condition,
+            "variables": lsm.model.nvariables(),
+            "constraints": lsm.model.nconstraints(),
+            "solve_memory_mb": solve_memory_mb,
+            "build_seconds": lsm.build_seconds,
+            **{
+                f"{step}_seconds": seconds
+                for step, seconds in lsm.solve_timings.items()
+            },
+            "extract_seconds": extract_seconds,
+        },
     )
@@ -0,0 +1,535 @@
+import pyomo.environ as pyo
+
+from .loadshiftmodel import LoadShiftOptimizationModel
+
+
+class CompactLoadShiftOptimizationModel(LoadShiftOptimizationModel):
+    """A compact model to minimize the energy procurement costs for load
+    shifting
+
+    Depicts the same load shifting physics as LoadShiftOptimizationModel,
+    but without indexing shifts by their shifting time. Instead of
+    balancing each shift exactly after its shifting time, cumulated shifts
+    and cumulated balancing are linked: Balancing may only compensate for
+    shifts made before and everything shifted must be balanced within the
+    maximum shifting time. Hence, the number of variables and constraints
+    grows with O(T) instead of O(H * T).
+
+    Results only differ for a positive initial energy level, which is
+    applied to the upshift level here, whereas LoadShiftOptimizationModel
+    applies it to the downshift level.
+
+    Variables `dsm_do_shift`, `dsm_up`, `balance_dsm_do` and
+    `balance_dsm_up` are indexed by time only and correspond to the sums
+    over all shifting times of their counterparts in
+    LoadShiftOptimizationModel.
+
+    If presolve is active, shifts and balancing which cannot occur due to
+    missing capacity or at the borders of the optimization timeframe are
+    fixed to zero, hence passed to the solver as constants.
+
+    For attributes, please refer to LoadShiftOptimizationModel.
+    """
+
+    def _setup_model(self):
+        """Set up the optimization model"""
+        model = pyo.ConcreteModel("Compact load shift optimization model")
+        self.model = model
+        max_shifting_time = self.shifting_times[-1]
+        can_reduce, can_increase = self._get_capacity_flags()
+
+        #  ************* SETS *********************************
+
+        model.T = pyo.Set(
+            initialize=range(len(self.normalized_baseline_load)),
+            doc="time steps of the model",
+        )
+
+        #  ************* VARIABLES *****************************
+
+        model.demand_after = pyo.Var(
+            model.T,
+            initialize=0,
+            within=pyo.NonNegativeReals,
+            doc="resulting demand (i.e. capacity) after load shifting",
+        )
+
+        model.peak_load = pyo.Var(
+            initialize=0,
+            within=pyo.NonNegativeReals,
+            doc="resulting peak load after load shifting",
+        )
+
+        model.dsm_do_shift = pyo.Var(
+            model.T,
+            initialize=0,
+            within=pyo.NonNegativeReals,
+            doc="capacity shifted downwards",
+        )
+
+        model.dsm_up = pyo.Var(
+            model.T,
+            initialize=0,
+            within=pyo.NonNegativeReals,
+            doc="capacity shifted upwards",
+        )
+
+        model.balance_dsm_do = pyo.Var(
+            model.T,
+            initialize=0,
+            within=pyo.NonNegativeReals,
+            doc="balancing of capacity shifted downwards",
+        )
+
+        model.balance_dsm_up = pyo.Var(
+            model.T,
+            initialize=0,
+            within=pyo.NonNegativeReals,
+            doc="balancing of capacity shifted upwards",
+        )
+
+        model.dsm_do_cumulated = pyo.Var(
+            model.T,
+            initialize=0,
+            within=pyo.NonNegativeReals,
+            doc="capacity shifted downwards until time step",
+        )
+
+        model.dsm_up_cumulated = pyo.Var(
+            model.T,
+            initialize=0,
+            within=pyo.NonNegativeReals,
+            doc="capacity shifted upwards until time step (after losses)",
+        )
+
+        model.balance_dsm_do_cumulated = pyo.Var(
+            model.T,
+            initialize=0,
+            within=pyo.NonNegativeReals,
+            doc="balancing of downwards shifts until time step (after "
+            "losses)",
+        )
+
+        model.balance_dsm_up_cumulated = pyo.Var(
+            model.T,
+            initialize=0,
+            within=pyo.NonNegativeReals,
+            doc="balancing of upwards shifts until time step",
+        )
+
+        model.demand_change = pyo.Var(
+            model.T,
+            initialize=0,
+            within=pyo.Reals,
+            doc="change in demand due to shifting",
+        )
+
+        model.dsm_do_level = pyo.Var(
+            model.T,
+            initialize=0,
+            within=pyo.NonNegativeReals,
+            doc="fictitious energy storage level for (initial) downshifts",
+        )
+
+        model.dsm_up_level = pyo.Var(
+            model.T,
+            initialize=0,
+            within=pyo.NonNegativeReals,
+            doc="fictitious energy storage level for (initial) upshifts",
+        )
+
+        if self.presolve:
+            self._fix_structural_zeros(can_reduce, can_increase)
+
+        #  ************* CONSTRAINTS *****************************
+
+        def _peak_load_definition_rule(model):
+            """Peak load is the maximum demand after demand response"""
+            for t in model.T:
+                lhs = model.peak_load
+                rhs = model.demand_after[t]
+                model.peak_load_definition.add(t, (lhs >= rhs))
+
+        model.peak_load_definition = pyo.Constraint(model.T, noruleinit=True)
+        model.peak_load_definition_build = pyo.BuildAction(
+            rule=_peak_load_definition_rule
+        )
+
+        def _demand_change_defition_rule(model):
+            """Demand change is the sum of upshifts minus downshifts"""
+            for t in model.T:
+                lhs = model.demand_change[t]
+                rhs = (
+                    model.dsm_up[t]
+                    + model.balance_dsm_do[t]
+                    - model.dsm_do_shift[t]
+                    - model.balance_dsm_up[t]
+                )
+                model.demand_change_definition.add(t, (lhs == rhs))
+
+        model.demand_change_definition = pyo.Constraint(
+            model.T, noruleinit=True
+        )
+        model.demand_change_definition_build = pyo.BuildAction(
+            rule=_demand_change_defition_rule
+        )
+
+        def _demand_after_definition_rule(model):
+            """Relation determining actual demand after demand response"""
+            for t in model.T:
+                lhs = model.demand_after[t]
+                rhs = (
+                    self.normalized_baseline_load[t] * self.peak_demand_before
+                    + model.demand_change[t]
+                )
+                model.demand_after_definition.add(t, (lhs == rhs))
+
+        model.demand_after_definition = pyo.Constraint(
+            model.T, noruleinit=True
+        )
+        model.demand_after_definition_build = pyo.BuildAction(
+            rule=_demand_after_definition_rule
+        )
+
+        def _cumulation_rule(model):
+            """Cumulate shifts and balancing over time (after losses for
+            load increases)"""
+            cumulations = [
+                (model.dsm_do_cumulated, model.dsm_do_shift, 1),
+                (
+                    model.balance_dsm_do_cumulated,
+                    model.balance_dsm_do,
+                    self.efficiency,
+                ),
+                (model.dsm_up_cumulated, model.dsm_up, self.efficiency),
+                (model.balance_dsm_up_cumulated, model.balance_dsm_up, 1),
+            ]
+            for number, (cumulated, shift, factor) in enumerate(cumulations):
+                for t in model.T:
+                    lhs = cumulated[t]
+                    rhs = shift[t] * factor
+                    if t > 0:
+                        rhs += cumulated[t - 1]
+                    model.cumulation.add((number, t), (lhs == rhs))
+
+        model.cumulation = pyo.Constraint(
+            range(4), model.T, noruleinit=True
+        )
+        model.cumulation_build = pyo.BuildAction(rule=_cumulation_rule)
+
+        def _capacity_balance_red_rule(model):
+            """Load reduction must be balanced by load increase
+            within allowed maximum shifting time"""
+            for t in model.T:
+                # balancing only for load reductions made before
+                lhs = model.balance_dsm_do_cumulated[t]
+                if t > 0:
+                    rhs = model.dsm_do_cumulated[t - 1]
+                    model.capacity_balance_red.add((0, t), (lhs <= rhs))
+                else:
+                    model.capacity_balance_red.add((0, t), (lhs == 0))
+
+                # balancing not later than maximum shifting time
+                if t >= max_shifting_time:
+                    rhs = model.dsm_do_cumulated[t - max_shifting_time]
+                    model.capacity_balance_red.add((1, t), (lhs >= rhs))
+
+        model.capacity_balance_red = pyo.Constraint(
+            range(2), model.T, noruleinit=True
+        )
+        model.capacity_balance_red_build = pyo.BuildAction(
+            rule=_capacity_balance_red_rule
+        )
+
+        def _capacity_balance_inc_rule(model):
+            """Load increase must be balanced by load reduction
+            within allowed maximum shifting time"""
+            for t in model.T:
+                # balancing only for load increases made before
+                lhs = model.balance_dsm_up_cumulated[t]
+                if t > 0:
+                    rhs = model.dsm_up_cumulated[t - 1]
+                    model.capacity_balance_inc.add((0, t), (lhs <= rhs))
+                else:
+                    model.capacity_balance_inc.add((0, t), (lhs == 0))
+
+                # balancing not later than maximum shifting time
+                if t >= max_shifting_time:
+                    rhs = model.dsm_up_cumulated[t - max_shifting_time]
+                    model.capacity_balance_inc.add((1, t), (lhs >= rhs))
+
+        model.capacity_balance_inc = pyo.Constraint(
+            range(2), model.T, noruleinit=True
+        )
+        model.capacity_balance_inc_build = pyo.BuildAction(
+            rule=_capacity_balance_inc_rule
+        )
+
+        def _full_compensation_rule(model):
+            """All shifts have to be balanced within the optimization
+            timeframe"""
+            t = model.T.at(-1)
+            lhs = model.balance_dsm_do_cumulated[t]
+            rhs = model.dsm_do_cumulated[t]
+            model.full_compensation.add(0, (lhs == rhs))
+            lhs = model.balance_dsm_up_cumulated[t]
+            rhs = model.dsm_up_cumulated[t]
+            model.full_compensation.add(1, (lhs == rhs))
+
+        model.full_compensation = pyo.Constraint(range(2), noruleinit=True)
+        model.full_compensation_build = pyo.BuildAction(
+            rule=_full_compensation_rule
+        )
+
+        def _availability_red_rule(model):
+            """Load reduction must be smaller than or equal to the
+            (time-dependent) capacity limit"""
+            for t in model.T:
+                # all load reductions fixed to zero by presolve
+                if self.presolve and not can_reduce[t]:
+                    continue
+                lhs = model.dsm_do_shift[t] + model.balance_dsm_up[t]
+                rhs = self.availability_down[t] * self.max_capacity_down
+                model.availability_red.add(t, (lhs <= rhs))
+
+        model.availability_red = pyo.Constraint(model.T, noruleinit=True)
+        model.availability_red_build = pyo.BuildAction(
+            rule=_availability_red_rule
+        )
+
+        def _availability_inc_rule(model):
+            """Load increase must be smaller than or equal to the
+            (time-dependent) capacity limit"""
+            for t in model.T:
+                # all load increases fixed to zero by presolve
+                if self.presolve and not can_increase[t]:
+                    continue
+                lhs = model.dsm_up[t] + model.balance_dsm_do[t]
+                rhs = self.availability_up[t] * self.max_capacity_up
+                model.availability_inc.add(t, (lhs <= rhs))
+
+        model.availability_inc = pyo.Constraint(model.T, noruleinit=True)
+        model.availability_inc_build = pyo.BuildAction(
+            rule=_availability_inc_rule
+        )
+
+        def _dr_storage_red_rule(model):
+            """Fictitious demand response storage level for load reductions
+            transition equation"""
+            for t in model.T:
+                lhs = model.dsm_do_level[t]
+                rhs = self.time_increment[t] * (
+                    model.dsm_do_shift[t]
+                    - model.balance_dsm_do[t] * self.efficiency
+                )
+                if t > 0:
+                    rhs += model.dsm_do_level[t - 1]
+                elif self.initial_energy_level < 0:
+                    rhs += -self.initial_energy_level
+                model.dr_storage_red.add(t, (lhs == rhs))
+
+        model.dr_storage_red = pyo.Constraint(model.T, noruleinit=True)
+        model.dr_storage_red_build = pyo.BuildAction(rule=_dr_storage_red_rule)
+
+        def _dr_storage_inc_rule(model):
+            """Fictitious demand response storage level for load increase
+            transition equation"""
+            for t in model.T:
+                lhs = model.dsm_up_level[t]
+                rhs = self.time_increment[t] * (
+                    model.dsm_up[t] * self.efficiency - model.balance_dsm_up[t]
+                )
+                if t > 0:
+                    rhs += model.dsm_up_level[t - 1]
+                elif self.initial_energy_level > 0:
+                    rhs += self.initial_energy_level
+                model.dr_storage_inc.add(t, (lhs == rhs))
+
+        model.dr_storage_inc = pyo.Constraint(model.T, noruleinit=True)
+        model.dr_storage_inc_build = pyo.BuildAction(rule=_dr_storage_inc_rule)
+
+        def _dr_storage_limit_red_rule(model):
+            """Fictitious demand response storage level for reduction limit"""
+            for t in model.T:
+                lhs = model.dsm_do_level[t]
+                rhs = (
+                    self.availability_down_mean
+                    * self.max_capacity_down
+                    * self.interference_time
+                )
+                model.dr_storage_limit_red.add(t, (lhs <= rhs))
+
+        model.dr_storage_limit_red = pyo.Constraint(model.T, noruleinit=True)
+        model.dr_storage_level_red_build = pyo.BuildAction(
+            rule=_dr_storage_limit_red_rule
+        )
+
+        def _dr_storage_limit_inc_rule(model):
+            """Fictitious demand response storage level for increase limit"""
+            for t in model.T:
+                lhs = model.dsm_up_level[t]
+                rhs = (
+                    self.availability_up_mean
+                    * self.max_capacity_up
+                    * self.interference_time
+                )
+                model.dr_storage_limit_inc.add(t, (lhs <= rhs))
+
+        model.dr_storage_limit_inc = pyo.Constraint(model.T, noruleinit=True)
+        model.dr_storage_level_inc_build = pyo.BuildAction(
+            rule=_dr_storage_limit_inc_rule
+        )
+
+        def _dr_logical_constraint_rule(model):
+            """Similar to equation 10 from Zerrahn and Schill (2015):
+            The sum of upwards and downwards shifts must not be greater
+            than the (bigger) capacity limit to avoid activation of more than
+            overall existing capacity."""
+            for t in model.T:
+                # all shifts fixed to zero by presolve
+                if self.presolve and not (can_reduce[t] or can_increase[t]):
+                    continue
+                # sum of load increases and reductions
+                lhs = (
+                    model.dsm_up[t]
+                    + model.balance_dsm_do[t]
+                    + model.dsm_do_shift[t]
+                    + model.balance_dsm_up[t]
+                )
+                rhs = max(
+                    self.availability_down[t] * self.max_capacity_down,
+                    self.availability_up[t] * self.max_capacity_up,
+                )
+                model.dr_logical_constraint.add(t, (lhs <= rhs))
+
+        model.dr_logical_constraint = pyo.Constraint(model.T, noruleinit=True)
+        model.dr_logical_constraint_build = pyo.BuildAction(
+            rule=_dr_logical_constraint_rule
+        )
+
+        # ************* Optional Constraints *****************************
+
+        def _dr_yearly_limit_red_rule(model):
+            """Introduce overall annual (energy) limit for load reductions
+            resp. overall limit for optimization timeframe considered"""
+            if self.activate_annual_limits:
+                lhs = model.dsm_do_cumulated[model.T.at(-1)]
+                rhs = (
+                    self.availability_down_mean
+                    * self.max_capacity_down
+                    * self.interference_time
+                    * self.max_activations
+                )
+                return lhs <= rhs
+
+            else:
+                return pyo.Constraint.Skip
+
+        model.dr_yearly_limit_red = pyo.Constraint(
+            rule=_dr_yearly_limit_red_rule
+        )
+
+        def _dr_yearly_limit_inc_rule(model):
+            """Introduce overall annual (energy) limit for load increases
+            resp. overall limit for optimization timeframe considered"""
+            if self.activate_annual_limits:
+                lhs = model.dsm_up_cumulated[model.T.at(-1)] / self.efficiency
+                rhs = (
+                    self.availability_up_mean
+                    * self.max_capacity_up
+                    * self.interference_time
+                    * self.max_activations
+                )
+                return lhs <= rhs
+
+            else:
+                return pyo.Constraint.Skip
+
+        model.dr_yearly_limit_inc = pyo.Constraint(
+            rule=_dr_yearly_limit_inc_rule
+        )
+
+        #  ************* OBJECTIVE ****************************
+
+        def _objective_rule(model):
+            """Objective expression of the model"""
+            overall_energy_costs = self._get_overall_energy_costs(model)
+            overall_peak_load_costs = model.peak_load * self.peak_load_price
+            overall_variable_costs = sum(
+                (model.dsm_do_shift[t] + model.balance_dsm_up[t])
+                * self.variable_costs_down[t]
+                * self.time_increment[t]
+                + (model.dsm_up[t] + model.balance_dsm_do[t])
+                * self.variable_costs_up[t]
+                * self.time_increment[t]
+                for t in model.T
+            )
+
+            model.overall_energy_costs = pyo.Expression(
+                expr=overall_energy_costs
+            )
+            model.overall_peak_load_costs = pyo.Expression(
+                expr=overall_peak_load_costs
+            )
+            model.overall_variable_costs = pyo.Expression(
+                expr=overall_variable_costs
+            )
+            model.costs = pyo.Expression(
+                expr=(
+                    overall_energy_costs
+                    + overall_peak_load_costs
+                    + overall_variable_costs
+                )
+            )
+
+            return model.costs
+
+        model.objective = pyo.Objective(
+            rule=_objective_rule, sense=pyo.minimize
+        )
+
+        self.model = model
+        self._set_presolve_statistics()
+
+    def _fix_structural_zeros(self, can_reduce, can_increase):
+        """Fix shifts and balancing to zero where these cannot occur
+
+        Load cannot be shifted without capacity, shifts cannot be balanced
+        after the last time step and there is nothing to balance in the
+        first time step.
+        """
+        model = self.model
+        for t in model.T:
+            if not can_reduce[t]:
+                model.dsm_do_shift[t].fix(0)
+                model.balance_dsm_up[t].fix(0)
+            if not can_increase[t]:
+                model.dsm_up[t].fix(0)
+                model.balance_dsm_do[t].fix(0)
+        model.dsm_do_shift[model.T.at(-1)].fix(0)
+        model.dsm_up[model.T.at(-1)].fix(0)
+        model.balance_dsm_do[model.T.at(1)].fix(0)
+        model.balance_dsm_up[model.T.at(1)].fix(0)
+
+    def _set_presolve_statistics(self):
+        """Count variables fixed and constraints eliminated by presolve"""
+        n_time_steps = len(self.normalized_baseline_load)
+        self.presolve_statistics = {
+            "variables_eliminated": sum(
+                variable.fixed
+                for variable in self.model.component_data_objects(pyo.Var)
+            ),
+            "constraints_eliminated": sum(
+                n_time_steps - len(getattr(self.model, constraint))
+                for constraint in [
+                    "availability_red",
+                    "availability_inc",
+                    "dr_logical_constraint",
+                ]
+            ),
+        }
+
+    def get_shifted_capacity(self, variable_name):
+        """Return values of a shifting variable per time step"""
+        variable = getattr(self.model, variable_name)
+        return [pyo.value(variable[t]) for t in self.model.T]
@@ -1,8 +1,12 @@
+import time
 import warnings
 
+import numpy as np
 import pyomo.environ as pyo
 from numpy import mean
 
+from .solving import solve_model
+
 
 class LoadShiftOptimizationModel:
     """A model to minimize the energy procurement costs for load shifting
@@ -67,6 +71,34 @@ class LoadShiftOptimizationModel:
 
     solver: str
         Solver to use for solving the mathematical optimization problem
+
+    solver_interface: str
+        Pyomo interface used for solving, i.e. an in-memory interface if
+        available for the solver and the model, else the default one
+
+    termination_condition: str
+        Termination condition reported by the solver
+
+    build_seconds: float
+        Seconds needed to set up the optimization model
+
+    solve_timings: dict
+        Seconds needed to write the model, solve it and load the results
+        (write and load are None if included in solving)
+
+    presolve: bool
+        If True, variables which are zero due to the input data, i.e. shifts
+        without availability or without the chance to be balanced within the
+        optimization timeframe, are omitted when setting up the model
+
+    presolve_statistics: dict
+        Number of variables and constraints eliminated by the presolve
+
+    pwl_segments: int
+        Number of linear segments to approximate the energy costs due to the
+        price sensitivity with; the segments span the demand changes possible
+        given the shifting power margins. If 0, the exact (quadratic) costs
+        are used.
     """
 
     def __init__(
@@ -90,6 +122,8 @@ class LoadShiftOptimizationModel:
         initial_energy_level=0,
         time_increment=None,
         solver="gurobi",
+        presolve=True,
+        pwl_segments=0,
     ):
         """Initialize a load shift optimization model
 
@@ -146,7 +180,27 @@ class LoadShiftOptimizationModel:
         self.initial_energy_level = initial_energy_level
         self.model = None
         self.solver = solver
+        self.solver_interface = None
+        self.termination_condition = None
+        self.solve_timings = {}
+        self.presolve = presolve
+        if pwl_segments < 0:
+            raise ValueError(
+                f"Number of segments must not be negative; got {pwl_segments}."
+            )
+        if pwl_segments and min(price_sensitivity) < 0:
+            raise ValueError(
+                "A piecewise-linear approximation requires a non-negative "
+                "price sensitivity."
+            )
+        self.pwl_segments = pwl_segments
+        self.presolve_statistics = {
+            "variables_eliminated": 0,
+            "constraints_eliminated": 0,
+        }
+        start = time.perf_counter()
         self._setup_model()
+        self.build_seconds = time.perf_counter() - start
         self._solve_model()
 
     def _setup_model(self):
@@ -166,6 +220,31 @@ class LoadShiftOptimizationModel:
             doc="possible shifting times",
         )
 
+        shift_indices = self._get_shift_indices()
+        model.HT_dsm_do_shift = pyo.Set(
+            dimen=2,
+            initialize=shift_indices["dsm_do_shift"],
+            doc="shifting times and time steps of downwards shifts",
+        )
+
+        model.HT_dsm_up = pyo.Set(
+            dimen=2,
+            initialize=shift_indices["dsm_up"],
+            doc="shifting times and time steps of upwards shifts",
+        )
+
+        model.HT_balance_dsm_do = pyo.Set(
+            dimen=2,
+            initialize=shift_indices["balance_dsm_do"],
+            doc="shifting times and time steps of balancing downwards shifts",
+        )
+
+        model.HT_balance_dsm_up = pyo.Set(
+            dimen=2,
+            initialize=shift_indices["balance_dsm_up"],
+            doc="shifting times and time steps of balancing upwards shifts",
+        )
+
         #  ************* VARIABLES *****************************
 
         model.demand_after = pyo.Var(
@@ -182,32 +261,28 @@ class LoadShiftOptimizationModel:
         )
 
         model.dsm_do_shift = pyo.Var(
-            model.H,
-            model.T,
+            model.HT_dsm_do_shift,
             initialize=0,
             within=pyo.NonNegativeReals,
             doc="capacity shifted downwards",
         )
 
         model.dsm_up = pyo.Var(
-            model.H,
-            model.T,
+            model.HT_dsm_up,
             initialize=0,
             within=pyo.NonNegativeReals,
             doc="capacity shifted upwards",
         )
 
         model.balance_dsm_do = pyo.Var(
-            model.H,
-            model.T,
+            model.HT_balance_dsm_do,
             initialize=0,
             within=pyo.NonNegativeReals,
             doc="balancing of capacity shifted downwards",
         )
 
         model.balance_dsm_up = pyo.Var(
-            model.H,
-            model.T,
+            model.HT_balance_dsm_up,
             initialize=0,
             within=pyo.NonNegativeReals,
             doc="balancing of capacity shifted upwards",
@@ -252,12 +327,11 @@ class LoadShiftOptimizationModel:
             """Demand change is the sum of upshifts minus downshifts"""
             for t in model.T:
                 lhs = model.demand_change[t]
-                rhs = sum(
-                    model.dsm_up[h, t]
-                    + model.balance_dsm_do[h, t]
-                    - model.dsm_do_shift[h, t]
-                    - model.balance_dsm_up[h, t]
-                    for h in self.shifting_times
+                rhs = (
+                    sum(self._at(model.dsm_up, t))
+                    + sum(self._at(model.balance_dsm_do, t))
+                    - sum(self._at(model.dsm_do_shift, t))
+                    - sum(self._at(model.balance_dsm_up, t))
                 )
                 model.demand_change_definition.add(t, (lhs == rhs))
 
@@ -290,6 +364,10 @@ class LoadShiftOptimizationModel:
             within allowed maximum shifting time"""
             for t in model.T:
                 for h in self.shifting_times:
+                    # balancing omitted by presolve
+                    if (h, t) not in model.balance_dsm_do:
+                        continue
+
                     # main use case
                     if t >= h:
                         lhs = model.balance_dsm_do[h, t]
@@ -314,6 +392,10 @@ class LoadShiftOptimizationModel:
             within allowed maximum shifting time"""
             for t in model.T:
                 for h in self.shifting_times:
+                    # balancing omitted by presolve
+                    if (h, t) not in model.balance_dsm_up:
+                        continue
+
                     # main use case
                     if t >= h:
                         lhs = model.balance_dsm_up[h, t]
@@ -339,7 +421,7 @@ class LoadShiftOptimizationModel:
             for t in model.T:
                 for h in self.shifting_times:
 
-                    if t > model.T.at(-1) - h:
+                    if t > model.T.at(-1) - h and (h, t) in model.dsm_do_shift:
                         # no load reduction anymore (dsm_do_shift = 0)
                         lhs = model.dsm_do_shift[h, t]
                         rhs = 0
@@ -358,7 +440,7 @@ class LoadShiftOptimizationModel:
             for t in model.T:
                 for h in self.shifting_times:
 
-                    if t > model.T.at(-1) - h:
+                    if t > model.T.at(-1) - h and (h, t) in model.dsm_up:
                         # no load increase anymore (dsm_up = 0)
                         lhs = model.dsm_up[h, t]
                         rhs = 0
@@ -375,10 +457,13 @@ class LoadShiftOptimizationModel:
             """Load reduction must be smaller than or equal to the
             (time-dependent) capacity limit"""
             for t in model.T:
-                lhs = sum(
-                    model.dsm_do_shift[h, t] + model.balance_dsm_up[h, t]
-                    for h in self.shifting_times
+                shifts = self._at(model.dsm_do_shift, t) + self._at(
+                    model.balance_dsm_up, t
                 )
+                # trivially fulfilled if all shifts are omitted by presolve
+                if not shifts:
+                    continue
+                lhs = sum(shifts)
                 rhs = self.availability_down[t] * self.max_capacity_down
                 model.availability_red.add(t, (lhs <= rhs))
 
@@ -391,10 +476,13 @@ class LoadShiftOptimizationModel:
             """Load increase must be smaller than or equal to the
             (time-dependent) capacity limit"""
             for t in model.T:
-                lhs = sum(
-                    model.dsm_up[h, t] + model.balance_dsm_do[h, t]
-                    for h in self.shifting_times
+                shifts = self._at(model.dsm_up, t) + self._at(
+                    model.balance_dsm_do, t
                 )
+                # trivially fulfilled if all shifts are omitted by presolve
+                if not shifts:
+                    continue
+                lhs = sum(shifts)
                 rhs = self.availability_up[t] * self.max_capacity_up
                 model.availability_inc.add(t, (lhs <= rhs))
 
@@ -409,12 +497,10 @@ class LoadShiftOptimizationModel:
             for t in model.T:
                 # avoid time steps prior to t = 0
                 if t > 0:
-                    lhs = self.time_increment[t] * sum(
-                        (
-                            model.dsm_do_shift[h, t]
-                            - model.balance_dsm_do[h, t] * self.efficiency
-                        )
-                        for h in self.shifting_times
+                    lhs = self.time_increment[t] * (
+                        sum(self._at(model.dsm_do_shift, t))
+                        - sum(self._at(model.balance_dsm_do, t))
+                        * self.efficiency
                     )
                     rhs = model.dsm_do_level[t] - model.dsm_do_level[t - 1]
                     model.dr_storage_red.add(t, (lhs == rhs))
@@ -424,10 +510,7 @@ class LoadShiftOptimizationModel:
                     lhs = model.dsm_do_level[t]
                     rhs = (
                         self.time_increment[t]
-                        * sum(
-                            model.dsm_do_shift[h, t]
-                            for h in self.shifting_times
-                        )
+                        * sum(self._at(model.dsm_do_shift, t))
                         + red_level_initial
                     )
                     model.dr_storage_red.add(t, (lhs == rhs))
@@ -435,7 +518,7 @@ class LoadShiftOptimizationModel:
                 else:
                     lhs = model.dsm_do_level[t]
                     rhs = self.time_increment[t] * sum(
-                        model.dsm_do_shift[h, t] for h in self.shifting_times
+                        self._at(model.dsm_do_shift, t)
                     )
                     model.dr_storage_red.add(t, (lhs == rhs))
 
@@ -448,12 +531,9 @@ class LoadShiftOptimizationModel:
             for t in model.T:
                 # avoid time steps prior to t = 0
                 if t > 0:
-                    lhs = self.time_increment[t] * sum(
-                        (
-                            model.dsm_up[h, t] * self.efficiency
-                            - model.balance_dsm_up[h, t]
-                        )
-                        for h in self.shifting_times
+                    lhs = self.time_increment[t] * (
+                        sum(self._at(model.dsm_up, t)) * self.efficiency
+                        - sum(self._at(model.balance_dsm_up, t))
                     )
                     rhs = model.dsm_up_level[t] - model.dsm_up_level[t - 1]
                     model.dr_storage_inc.add(t, (lhs == rhs))
@@ -463,18 +543,17 @@ class LoadShiftOptimizationModel:
                     lhs = model.dsm_do_level[t]
                     rhs = (
                         self.time_increment[t]
-                        * sum(
-                            model.dsm_do_shift[h, t]
-                            for h in self.shifting_times
-                        )
+                        * sum(self._at(model.dsm_do_shift, t))
                         + inc_level_initial
                     )
                     model.dr_storage_red.add(t, (lhs == rhs))
 
                 else:
                     lhs = model.dsm_up_level[t]
-                    rhs = self.time_increment[t] * sum(
-                        model.dsm_up[h, t] for h in self.shifting_times
+                    rhs = (
+                        self.time_increment[t]
+                        * sum(self._at(model.dsm_up, t))
+                        * self.efficiency
                     )
                     model.dr_storage_inc.add(t, (lhs == rhs))
 
@@ -520,13 +599,16 @@ class LoadShiftOptimizationModel:
             overall existing capacity."""
             for t in model.T:
                 # sum of load increases and reductions
-                lhs = sum(
-                    model.dsm_up[h, t]
-                    + model.balance_dsm_do[h, t]
-                    + model.dsm_do_shift[h, t]
-                    + model.balance_dsm_up[h, t]
-                    for h in self.shifting_times
+                shifts = (
+                    self._at(model.dsm_up, t)
+                    + self._at(model.balance_dsm_do, t)
+                    + self._at(model.dsm_do_shift, t)
+                    + self._at(model.balance_dsm_up, t)
                 )
+                # trivially fulfilled if all shifts are omitted by presolve
+                if not shifts:
+                    continue
+                lhs = sum(shifts)
                 rhs = max(
                     self.availability_down[t] * self.max_capacity_down,
                     self.availability_up[t] * self.max_capacity_up,
@@ -543,11 +625,8 @@ class LoadShiftOptimizationModel:
         def _dr_yearly_limit_red_rule(model):
             """Introduce overall annual (energy) limit for load reductions
             resp. overall limit for optimization timeframe considered"""
-            if self.activate_annual_limits:
-                lhs = sum(
-                    sum(model.dsm_do_shift[h, t] for h in self.shifting_times)
-                    for t in model.T
-                )
+            if self.activate_annual_limits and len(model.dsm_do_shift) > 0:
+                lhs = sum(model.dsm_do_shift.values())
                 rhs = (
                     self.availability_down_mean
                     * self.max_capacity_down
@@ -566,11 +645,8 @@ class LoadShiftOptimizationModel:
         def _dr_yearly_limit_inc_rule(model):
             """Introduce overall annual (energy) limit for load increases
             resp. overall limit for optimization timeframe considered"""
-            if self.activate_annual_limits:
-                lhs = sum(
-                    sum(model.dsm_up[h, t] for h in self.shifting_times)
-                    for t in model.T
-                )
+            if self.activate_annual_limits and len(model.dsm_up) > 0:
+                lhs = sum(model.dsm_up.values())
                 rhs = (
                     self.availability_up_mean
                     * self.max_capacity_up
@@ -594,37 +670,19 @@ class LoadShiftOptimizationModel:
             overall_peak_load_costs = 0
             overall_variable_costs = 0
 
-            overall_energy_costs += sum(
-                (
-                    (
-                        self.normalized_baseline_load[t]
-                        * self.peak_demand_before
-                        + model.demand_change[t]
-                    )
-                    * (
-                        self.energy_price[t]
-                        + (model.demand_change[t] * self.price_sensitivity[t])
-                    )
-                )
-                * self.time_increment[t]
-                for t in model.T
-            )
+            overall_energy_costs += self._get_overall_energy_costs(model)
             overall_peak_load_costs += model.peak_load * self.peak_load_price
 
             overall_variable_costs += sum(
                 (
-                    sum(model.dsm_do_shift[h, t] for h in self.shifting_times)
-                    + sum(
-                        model.balance_dsm_up[h, t] for h in self.shifting_times
-                    )
+                    sum(self._at(model.dsm_do_shift, t))
+                    + sum(self._at(model.balance_dsm_up, t))
                 )
                 * self.variable_costs_down[t]
                 * self.time_increment[t]
                 + (
-                    sum(model.dsm_up[h, t] for h in self.shifting_times)
-                    + sum(
-                        model.balance_dsm_do[h, t] for h in self.shifting_times
-                    )
+                    sum(self._at(model.dsm_up, t))
+                    + sum(self._at(model.balance_dsm_do, t))
                 )
                 * self.variable_costs_up[t]
                 * self.time_increment[t]
@@ -655,11 +713,269 @@ class LoadShiftOptimizationModel:
         )
 
         self.model = model
+        self._set_presolve_statistics()
+
+    def _get_overall_energy_costs(self, model):
+        """Return energy costs for the optimization timeframe
+
+        The costs due to the price sensitivity, i.e. the quadratic term,
+        are approximated piecewise linearly if pwl_segments is set.
+        """
+        if not self.pwl_segments:
+            return sum(
+                (
+                    (
+                        self.normalized_baseline_load[t]
+                        * self.peak_demand_before
+                        + model.demand_change[t]
+                    )
+                    * (
+                        self.energy_price[t]
+                        + (model.demand_change[t] * self.price_sensitivity[t])
+                    )
+                )
+                * self.time_increment[t]
+                for t in model.T
+            )
+
+        self._add_price_sensitivity_approximation(model)
+        return sum(
+            (
+                (
+                    self.normalized_baseline_load[t] * self.peak_demand_before
+                    + model.demand_change[t]
+                )
+                * self.energy_price[t]
+                + self.normalized_baseline_load[t]
+                * self.peak_demand_before
+                * self.price_sensitivity[t]
+                * model.demand_change[t]
+            )
+            * self.time_increment[t]
+            for t in model.T
+        ) + sum(
+            model.price_sensitivity_costs[t] * self.time_increment[t]
+            for t in model.T_price_sensitive
+        )
+
+    def _add_price_sensitivity_approximation(self, model):
+        """Add piecewise-linear approximation of the price sensitivity costs
+
+        The squared demand change is overestimated by the secants between
+        the breakpoints of the demand change. Since it is convex, no binary
+        variables are needed.
+        """
+        model.T_price_sensitive = pyo.Set(
+            initialize=[t for t in model.T if self.price_sensitivity[t] > 0],
+            doc="time steps with a price sensitivity",
+        )
+
+        model.price_sensitivity_costs = pyo.Var(
+            model.T_price_sensitive,
+            initialize=0,
+            within=pyo.NonNegativeReals,
+            doc="approximated price change due to demand change times "
+            "demand change",
+        )
+
+        breakpoints = self.get_breakpoints()
+        segments = list(zip(breakpoints[:-1], breakpoints[1:]))
+
+        def _price_sensitivity_costs_rule(model):
+            """Price sensitivity costs lie above all secants"""
+            for t in model.T_price_sensitive:
+                for number, (lower, upper) in enumerate(segments):
+                    lhs = model.price_sensitivity_costs[t]
+                    rhs = self.price_sensitivity[t] * (
+                        (lower + upper) * model.demand_change[t]
+                        - lower * upper
+                    )
+                    model.price_sensitivity_costs_definition.add(
+                        (number, t), (lhs >= rhs)
+                    )
+
+        model.price_sensitivity_costs_definition = pyo.Constraint(
+            range(len(segments)), model.T_price_sensitive, noruleinit=True
+        )
+        model.price_sensitivity_costs_build = pyo.BuildAction(
+            rule=_price_sensitivity_costs_rule
+        )
+
+    def get_breakpoints(self):
+        """Return breakpoints of the demand change for the approximation
+
+        The breakpoints span the shifting power margins, i.e. the maximum
+        power available for upwards resp. downwards shifts. Unless there is
+        only one segment, 0 is a breakpoint and segments are distributed
+        proportionally to the margins.
+        """
+        margin_down = max(self.availability_down) * self.max_capacity_down
+        margin_up = max(self.availability_up) * self.max_capacity_up
+        if margin_down + margin_up <= 0:
+            return [0.0]
+        if self.pwl_segments == 1:
+            return sorted({-margin_down, margin_up})
+        segments_down = round(
+            self.pwl_segments * margin_down / (margin_down + margin_up)
+        )
+        if margin_down > 0 and margin_up > 0:
+            segments_down = min(max(segments_down, 1), self.pwl_segments - 1)
+        segments_up = max(self.pwl_segments - segments_down, 1)
+        breakpoints = np.concatenate(
+            [
+                np.linspace(-margin_down, 0, segments_down + 1),
+                np.linspace(0, margin_up, segments_up + 1),
+            ]
+        )
+        return sorted(set(breakpoints.tolist()))
+
+    def get_approximation_error(self):
+        """Return overestimation of the energy costs by the piecewise-linear
+        approximation for the solution found (0 if exact costs are used)"""
+        if not self.pwl_segments:
+            return 0.0
+        return sum(
+            (
+                pyo.value(self.model.price_sensitivity_costs[t])
+                - self.price_sensitivity[t]
+                * pyo.value(self.model.demand_change[t]) ** 2
+            )
+            * self.time_increment[t]
+            for t in self.model.T_price_sensitive
+        )
+
+    def _get_capacity_flags(self):
+        """Return whether load can be reduced resp. increased per time step"""
+        can_reduce = [
+            availability * self.max_capacity_down > 0
+            for availability in self.availability_down
+        ]
+        can_increase = [
+            availability * self.max_capacity_up > 0
+            for availability in self.availability_up
+        ]
+        return can_reduce, can_increase
+
+    def _get_shift_indices(self):
+        """Return (h, t) indices of the shifting variables
+
+        If presolve is active, shifts are omitted if there is no capacity
+        available for them or for their balancing within the optimization
+        timeframe. Balancing is omitted if there is no shift to balance.
+        """
+        time_steps = range(len(self.normalized_baseline_load))
+        if not self.presolve:
+            indices = [(h, t) for h in self.shifting_times for t in time_steps]
+            return {
+                "dsm_do_shift": indices,
+                "dsm_up": indices,
+                "balance_dsm_do": indices,
+                "balance_dsm_up": indices,
+            }
+
+        can_reduce, can_increase = self._get_capacity_flags()
+        last = time_steps[-1]
+        dsm_do_shift = [
+            (h, t)
+            for h in self.shifting_times
+            for t in time_steps
+            if t + h <= last and can_reduce[t] and can_increase[t + h]
+        ]
+        dsm_up = [
+            (h, t)
+            for h in self.shifting_times
+            for t in time_steps
+            if t + h <= last and can_increase[t] and can_reduce[t + h]
+        ]
+        return {
+            "dsm_do_shift": dsm_do_shift,
+            "dsm_up": dsm_up,
+            "balance_dsm_do": self._get_balancing_indices(
+                dsm_do_shift, can_increase
+            ),
+            "balance_dsm_up": self._get_balancing_indices(
+                dsm_up, can_reduce
+            ),
+        }
+
+    def _get_balancing_indices(self, shift_indices, can_balance):
+        """Return (h, t) indices of balancing variables for given shifts
+
+        Balancing before the respective shifting time has passed is not
+        linked to any shift and kept if capacity is available, except for
+        the first time step.
+        """
+        balanced = {(h, t + h) for h, t in shift_indices}
+        return [
+            (h, t)
+            for h in self.shifting_times
+            for t in range(1, len(self.normalized_baseline_load))
+            if can_balance[t] and (t < h or (h, t) in balanced)
+        ]
+
+    def _at(self, variable, t):
+        """Return the shifting variables of time step t not presolved"""
+        return [
+            variable[h, t] for h in self.shifting_times if (h, t) in variable
+        ]
+
+    def _set_presolve_statistics(self):
+        """Count variables and constraints eliminated by presolve"""
+        n_time_steps = len(self.normalized_baseline_load)
+        n_shift_variables = sum(
+            len(getattr(self.model, variable))
+            for variable in [
+                "dsm_do_shift",
+                "dsm_up",
+                "balance_dsm_do",
+                "balance_dsm_up",
+            ]
+        )
+        n_balance = sum(
+            max(n_time_steps - h, 0) + 1 for h in self.shifting_times
+        )
+        n_no_compensation = sum(
+            min(h, n_time_steps) for h in self.shifting_times
+        )
+        full_constraints = {
+            "capacity_balance_red": n_balance,
+            "capacity_balance_inc": n_balance,
+            "no_compensation_red": n_no_compensation,
+            "no_compensation_inc": n_no_compensation,
+            "availability_red": n_time_steps,
+            "availability_inc": n_time_steps,
+            "dr_logical_constraint": n_time_steps,
+            "dr_yearly_limit_red": int(self.activate_annual_limits),
+            "dr_yearly_limit_inc": int(self.activate_annual_limits),
+        }
+        self.presolve_statistics = {
+            "variables_eliminated": (
+                4 * len(self.shifting_times) * n_time_steps
+                - n_shift_variables
+            ),
+            "constraints_eliminated": sum(
+                n_constraints - len(getattr(self.model, constraint))
+                for constraint, n_constraints in full_constraints.items()
+            ),
+        }
 
     def _solve_model(self):
         """Solve the optimization model and return its results"""
-        solver = pyo.SolverFactory(self.solver)
-        return solver.solve(self.model, keepfiles=False, tee=False)
+        results, self.solver_interface, self.solve_timings = solve_model(
+            self.model, self.solver
+        )
+        self.termination_condition = str(
+            results.solver.termination_condition
+        )
+        return results
+
+    def get_shifted_capacity(self, variable_name):
+        """Return values of a shifting variable summed up per time step"""
+        variable = getattr(self.model, variable_name)
+        return [
+            sum(pyo.value(shift) for shift in self._at(variable, t))
+            for t in self.model.T
+        ]
 
     def add_results(self, results):
         for key, val in results.items():
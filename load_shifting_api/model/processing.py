@@ -22,33 +22,13 @@ def extract_results(lsm, rounding_precision=4, tolerance=1e-4):
         round(pyo.value(lsm.model.demand_after[t]), rounding_precision)
         for t in lsm.model.T
     ]
-    dsm_up = [
-        sum(pyo.value(lsm.model.dsm_up[h, t]) for h in lsm.shifting_times)
-        for t in lsm.model.T
-    ]
-    balance_dsm_do = [
-        sum(
-            pyo.value(lsm.model.balance_dsm_do[h, t])
-            for h in lsm.shifting_times
-        )
-        for t in lsm.model.T
-    ]
+    dsm_up = lsm.get_shifted_capacity("dsm_up")
+    balance_dsm_do = lsm.get_shifted_capacity("balance_dsm_do")
     upshift = [
         round(sum(i), rounding_precision) for i in zip(dsm_up, balance_dsm_do)
     ]
-    dsm_do_shift = [
-        sum(
-            pyo.value(lsm.model.dsm_do_shift[h, t]) for h in lsm.shifting_times
-        )
-        for t in lsm.model.T
-    ]
-    balance_dsm_up = [
-        sum(
-            pyo.value(lsm.model.balance_dsm_up[h, t])
-            for h in lsm.shifting_times
-        )
-        for t in lsm.model.T
-    ]
+    dsm_do_shift = lsm.get_shifted_capacity("dsm_do_shift")
+    balance_dsm_up = lsm.get_shifted_capacity("balance_dsm_up")
     downshift = [
         round(sum(i), rounding_precision)
         for i in zip(dsm_do_shift, balance_dsm_up)
@@ -0,0 +1,87 @@
+import logging as log
+import time
+from typing import Dict, Tuple
+
+import pyomo.environ as pyo
+from pyomo.common.errors import PyomoException
+
+# Pyomo interfaces passing the model to the solver in memory, by solver name;
+# the default interfaces of these solvers exchange LP files with executables
+IN_MEMORY_INTERFACES = {
+    "gurobi": "gurobi_persistent",
+    "cplex": "cplex_persistent",
+    "xpress": "xpress_persistent",
+}
+
+
+def solve_model(
+    model: pyo.ConcreteModel, solver: str
+) -> Tuple[object, str, Dict[str, float]]:
+    """Solve a model, preferably using an in-memory solver interface
+
+    The in-memory interface is set up with the model (write), solves it
+    (solve) and loads the solution back to the model (load). If there is
+    none for the solver, it is not available or does not support the
+    model, the solver's default (e.g. file-based) interface is used. Its
+    timings cannot be separated, so writing and loading is included in
+    the solve time.
+
+    Parameters
+    ----------
+    model: pyo.ConcreteModel
+        The optimization model to solve
+
+    solver: str
+        Solver name as used by pyomo's SolverFactory
+
+    Returns
+    -------
+    Solver results, name of the interface used and timings in seconds
+    """
+    interface = IN_MEMORY_INTERFACES.get(solver)
+    if interface is not None:
+        opt = pyo.SolverFactory(interface)
+        if opt.available(exception_flag=False):
+            try:
+                start = time.perf_counter()
+                opt.set_instance(model)
+                write_time = time.perf_counter() - start
+            except PyomoException as error:
+                log.info(
+                    f"Using file-based interface for solver {solver}: {error}"
+                )
+            else:
+                return solve_in_memory(model, opt, interface, write_time)
+
+    start = time.perf_counter()
+    results = pyo.SolverFactory(solver).solve(
+        model, keepfiles=False, tee=False
+    )
+    timings = {
+        "write": None,
+        "solve": time.perf_counter() - start,
+        "load": None,
+    }
+    return results, solver, timings
+
+
+def solve_in_memory(
+    model: pyo.ConcreteModel, opt, interface: str, write_time: float
+) -> Tuple[object, str, Dict[str, float]]:
+    """Solve a model already set up with an in-memory solver interface"""
+    start = time.perf_counter()
+    results = opt.solve(model, load_solutions=False)
+    solve_completion = time.perf_counter()
+    if pyo.check_optimal_termination(results):
+        opt.load_vars()
+    else:
+        log.warning(
+            "No optimal solution found; termination condition: "
+            f"{results.solver.termination_condition}"
+        )
+    timings = {
+        "write": write_time,
+        "solve": solve_completion - start,
+        "load": time.perf_counter() - solve_completion,
+    }
+    return results, interface, timings
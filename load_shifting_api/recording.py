@@ -0,0 +1,91 @@
+import gzip
+import json
+import os
+import threading
+import time
+from datetime import datetime
+from typing import Dict, Iterator
+
+from fastapi.encoders import jsonable_encoder
+
+from .micro_model import Inputs
+
+# Metadata of a model run recorded alongside the inputs
+RECORDED_TIMINGS = [
+    "build_seconds",
+    "write_seconds",
+    "solve_seconds",
+    "load_seconds",
+    "extract_seconds",
+]
+
+
+class RequestRecorder:
+    """Record incoming micro model requests for an offline replay
+
+    Each request is written as a gzipped json file to a session folder
+    created within the given directory, holding the inputs, the time it
+    was received relative to the start of the session and the timings of
+    building, solving and extracting results of the model.
+
+    Attributes
+    ----------
+    session_folder: str
+        Folder the requests of the current session are recorded to
+    """
+
+    def __init__(self, directory: str):
+        self.session_folder = (
+            f"{directory}/session_{datetime.now():%Y%m%d_%H%M%S_%f}"
+        )
+        os.makedirs(self.session_folder, exist_ok=True)
+        self._start = time.perf_counter()
+        self._number = 0
+        self._lock = threading.Lock()
+
+    def record(
+        self,
+        inputs: Inputs,
+        metadata: Dict,
+        received: float,
+        duration: float,
+        cache_hit: bool,
+    ) -> None:
+        """Record a request and the timings of answering it
+
+        :param Inputs inputs: micro model inputs
+        :param dict metadata: metadata of the model run
+        :param float received: perf_counter value when request was received
+        :param float duration: seconds needed to answer the request
+        :param bool cache_hit: whether the response was served from cache
+        """
+        with self._lock:
+            number = self._number
+            self._number += 1
+        record = {
+            "received_seconds": received - self._start,
+            "duration_seconds": duration,
+            "cache_hit": cache_hit,
+            "timings": {
+                timing: metadata.get(timing) for timing in RECORDED_TIMINGS
+            },
+            "inputs": jsonable_encoder(inputs),
+        }
+        file_path = f"{self.session_folder}/request_{number:06d}.json.gz"
+        with gzip.open(file_path, "wt", encoding="utf-8") as file:
+            json.dump(record, file)
+
+
+def read_session(session_folder: str) -> Iterator[Dict]:
+    """Yield recorded requests of a session in order of their receipt"""
+    file_names = sorted(
+        file_name
+        for file_name in os.listdir(session_folder)
+        if file_name.startswith("request_")
+        and file_name.endswith(".json.gz")
+    )
+    for file_name in file_names:
+        with gzip.open(
+            f"{session_folder}/{file_name}", "rt", encoding="utf-8"
+        ) as file:
+            yield json.load(file)
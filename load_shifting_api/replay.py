@@ -0,0 +1,180 @@
+"""Replay a recorded session of requests against the load shifting API
+
+Sends the requests recorded by the server (see `record_requests` in
+config.yml) at a given concurrency and reports latency percentiles and
+throughput. If no url is given, a local server without response cache is
+started, so that every request is actually solved.
+
+Run from the repository root, e.g.:
+python -m load_shifting_api.replay results/recordings/session_<...> \\
+    --concurrency 4
+"""
+import argparse
+import json
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List
+
+import numpy as np
+import pandas as pd
+
+from .main import LoadShiftingApiThread
+from .micro_model import DEFAULT_FORMULATION, FORMULATIONS
+from .recording import read_session
+
+LATENCY_PERCENTILES = [50, 90, 99]
+SERVER_START_TIMEOUT = 120
+
+
+def send_request(url: str, record: Dict, timeout: float) -> Dict:
+    """Send a recorded request and return its latency and status
+
+    Requests failing without response, e.g. by exceeding the timeout or a
+    dropped connection, are returned with status None and their error.
+    """
+    request = urllib.request.Request(
+        url,
+        data=json.dumps(record["inputs"]).encode("utf-8"),
+        headers={"Content-Type": "application/json"},
+        method="POST",
+    )
+    start = time.perf_counter()
+    error_message = None
+    try:
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            response.read()
+            status = response.status
+            cache = response.headers.get("X-Cache")
+    except urllib.error.HTTPError as error:
+        status = error.code
+        cache = None
+    except OSError as error:
+        # Covers socket timeouts, URLError and dropped connections
+        status = None
+        cache = None
+        error_message = f"{type(error).__name__}: {error}"
+    return {
+        "latency_seconds": time.perf_counter() - start,
+        "status": status,
+        "cache": cache,
+        "error": error_message,
+        "recorded_seconds": record["duration_seconds"],
+    }
+
+
+def replay_session(
+    url: str, records: List[Dict], concurrency: int, timeout: float
+) -> pd.DataFrame:
+    """Send recorded requests using a given number of parallel clients"""
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        return pd.DataFrame(
+            executor.map(
+                lambda record: send_request(url, record, timeout), records
+            )
+        )
+
+
+def summarize_replay(results: pd.DataFrame, wall_seconds: float) -> pd.Series:
+    """Return throughput and latency percentiles of a replay"""
+    succeeded = results.loc[results["status"] == 200]
+    if succeeded.empty:
+        raise ValueError(
+            "All requests failed with status codes "
+            f"{sorted(results['status'].dropna().unique())} and errors "
+            f"{sorted(results['error'].dropna().unique())}."
+        )
+    summary = {
+        "requests": len(results),
+        "errors": len(results) - len(succeeded),
+        "errors_without_response": results["status"].isna().sum(),
+        "wall_seconds": wall_seconds,
+        "throughput_per_second": len(succeeded) / wall_seconds,
+    }
+    for percentile in LATENCY_PERCENTILES:
+        summary[f"latency_p{percentile}_seconds"] = np.percentile(
+            succeeded["latency_seconds"], percentile
+        )
+    summary["latency_max_seconds"] = succeeded["latency_seconds"].max()
+    summary["recorded_p50_seconds"] = np.percentile(
+        succeeded["recorded_seconds"], 50
+    )
+    return pd.Series(summary)
+
+
+def start_local_server(
+    formulation: str,
+    pwl_segments: int,
+    warm_up_solver: str,
+    max_concurrent_solves: int = 1,
+) -> str:
+    """Start a local server without response cache and return its url"""
+    thread = LoadShiftingApiThread(
+        formulation,
+        pwl_segments,
+        cache_size=0,
+        max_concurrent_solves=max_concurrent_solves,
+        warm_up_solver=warm_up_solver,
+    )
+    thread.start()
+    thread.wait_until_ready(SERVER_START_TIMEOUT)
+    # POST requests are not redirected to the url with trailing slash
+    return thread.get_url().rstrip("/")
+
+
+def add_args():
+    """Parse command-line arguments"""
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("session", help="folder of the recorded session")
+    parser.add_argument(
+        "--url", default=None, help="server to send requests to"
+    )
+    parser.add_argument(
+        "--concurrency", type=int, default=1, help="parallel clients"
+    )
+    parser.add_argument(
+        "--limit", type=int, default=None, help="maximum requests to send"
+    )
+    parser.add_argument(
+        "--timeout", type=float, default=600, help="seconds per request"
+    )
+    parser.add_argument(
+        "--formulation",
+        default=DEFAULT_FORMULATION,
+        choices=list(FORMULATIONS),
+        help="formulation of the local server",
+    )
+    parser.add_argument(
+        "--pwl-segments",
+        type=int,
+        default=0,
+        help="price sensitivity segments of the local server",
+    )
+    parser.add_argument(
+        "--max-concurrent-solves",
+        type=int,
+        default=1,
+        help="requests solved in parallel by the local server",
+    )
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = add_args()
+    records = list(read_session(args.session))[: args.limit]
+    if not records:
+        raise SystemExit(
+            f"No requests to replay in session {args.session} "
+            f"with --limit {args.limit}."
+        )
+    url = args.url or start_local_server(
+        args.formulation,
+        args.pwl_segments,
+        records[0]["inputs"]["solver"],
+        args.max_concurrent_solves,
+    )
+    start = time.perf_counter()
+    results = replay_session(url, records, args.concurrency, args.timeout)
+    summary = summarize_replay(results, time.perf_counter() - start)
+    print(summary.to_string())
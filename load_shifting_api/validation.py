@@ -0,0 +1,282 @@
+"""Validate the compact against the H-indexed load shifting formulation
+
+Solves both formulations for representative load shifting clusters on
+synthetic, yet typical time series and compares costs, schedules and
+model sizes. Alternatively, compares the piecewise-linear approximation of
+the price sensitivity costs against the exact (quadratic) costs.
+
+Run from the repository root, e.g.:
+python -m load_shifting_api.validation --hours 336 --solver gurobi
+python -m load_shifting_api.validation --price-sensitivity 0.1 \
+    --pwl-segments 8
+"""
+import argparse
+import time
+from typing import Dict
+
+import numpy as np
+import pandas as pd
+import pyomo.environ as pyo
+
+from .micro_model import FORMULATIONS, Inputs
+from .model.processing import extract_results
+
+# Typical parameters of the load shifting clusters analysed in the workflow
+REPRESENTATIVE_CLUSTERS = {
+    "hoho_cluster_shift_only": {
+        "max_shifting_time": 3,
+        "interference_time": 1,
+        "efficiency": 1.0,
+        "max_activations": 1000000,
+        "activate_annual_limits": False,
+    },
+    "tcs_cluster_shift_only": {
+        "max_shifting_time": 4,
+        "interference_time": 2,
+        "efficiency": 0.95,
+        "max_activations": 200,
+        "activate_annual_limits": True,
+    },
+    "ind_cluster_shift_only": {
+        "max_shifting_time": 12,
+        "interference_time": 4,
+        "efficiency": 1.0,
+        "max_activations": 40,
+        "activate_annual_limits": True,
+    },
+}
+COMPARISON_TOLERANCE = 1e-4
+SCHEDULE_TOLERANCE = 1e-3
+
+
+def create_inputs(
+    cluster_parameters: Dict,
+    hours: int,
+    solver: str,
+    price_sensitivity: float = 0.0,
+    seed: int = 0,
+) -> Inputs:
+    """Create model inputs with synthetic daily patterns for a cluster"""
+    rng = np.random.default_rng(seed)
+    hour_of_day = np.arange(hours) % 24
+    daily_pattern = np.sin((hour_of_day - 6) / 24 * 2 * np.pi)
+    baseline_load = 0.7 + 0.2 * daily_pattern + 0.05 * rng.random(hours)
+    energy_price = 60 + 25 * daily_pattern + 15 * rng.standard_normal(hours)
+    availability = 0.6 + 0.3 * rng.random(hours)
+
+    return Inputs(
+        peak_load_price=5000.0,
+        variable_costs_down=[1.0] * hours,
+        variable_costs_up=[1.0] * hours,
+        peak_demand_before=100.0,
+        max_capacity_down=20.0,
+        max_capacity_up=20.0,
+        solver=solver,
+        initial_energy_level=0.0,
+        normalized_baseline_load=baseline_load.tolist(),
+        energy_price=energy_price.tolist(),
+        availability_up=availability.tolist(),
+        availability_down=np.roll(availability, 3).tolist(),
+        price_sensitivity=[price_sensitivity] * hours,
+        **cluster_parameters,
+    )
+
+
+def solve_formulation(
+    inputs: Inputs, formulation: str, pwl_segments: int = 0
+) -> Dict:
+    """Solve a formulation and return its schedule, costs and size"""
+    start = time.perf_counter()
+    lsm = FORMULATIONS[formulation](
+        normalized_baseline_load=inputs.normalized_baseline_load,
+        energy_price=inputs.energy_price,
+        availability_up=inputs.availability_up,
+        availability_down=inputs.availability_down,
+        peak_load_price=inputs.peak_load_price,
+        variable_costs_down=inputs.variable_costs_down,
+        variable_costs_up=inputs.variable_costs_up,
+        max_shifting_time=inputs.max_shifting_time,
+        interference_time=inputs.interference_time,
+        peak_demand_before=inputs.peak_demand_before,
+        max_capacity_down=inputs.max_capacity_down,
+        max_capacity_up=inputs.max_capacity_up,
+        price_sensitivity=inputs.price_sensitivity,
+        efficiency=inputs.efficiency,
+        activate_annual_limits=inputs.activate_annual_limits,
+        solver=inputs.solver,
+        max_activations=inputs.max_activations,
+        initial_energy_level=inputs.initial_energy_level,
+        presolve=inputs.presolve,
+        pwl_segments=pwl_segments,
+    )
+    duration = time.perf_counter() - start
+    extract_results(lsm)
+
+    return {
+        "demand_after": np.array(lsm.demand_after),
+        "upshift": np.array(lsm.upshift),
+        "downshift": np.array(lsm.downshift),
+        "costs": pyo.value(lsm.model.costs),
+        "variable_costs": pyo.value(lsm.model.overall_variable_costs),
+        "approximation_error": lsm.get_approximation_error(),
+        "variables": lsm.model.nvariables(),
+        "constraints": lsm.model.nconstraints(),
+        "duration": duration,
+    }
+
+
+def compare_formulations(inputs: Inputs) -> Dict:
+    """Compare results of the compact and the H-indexed formulation"""
+    reference = solve_formulation(inputs, "h_indexed")
+    compact = solve_formulation(inputs, "compact")
+    shifted_energy = max(reference["upshift"].sum(), 1.0)
+
+    return {
+        "variables_h_indexed": reference["variables"],
+        "variables_compact": compact["variables"],
+        "constraints_h_indexed": reference["constraints"],
+        "constraints_compact": compact["constraints"],
+        "seconds_h_indexed": reference["duration"],
+        "seconds_compact": compact["duration"],
+        "costs_rel_deviation": abs(compact["costs"] - reference["costs"])
+        / abs(reference["costs"]),
+        "variable_costs_rel_deviation": abs(
+            compact["variable_costs"] - reference["variable_costs"]
+        )
+        / max(abs(reference["variable_costs"]), 1.0),
+        "demand_after_max_abs_deviation": np.abs(
+            compact["demand_after"] - reference["demand_after"]
+        ).max(),
+        "shifted_energy_rel_deviation": abs(
+            compact["upshift"].sum() - reference["upshift"].sum()
+        )
+        / shifted_energy,
+    }
+
+
+def compare_approximation(
+    inputs: Inputs, formulation: str, pwl_segments: int
+) -> Dict:
+    """Compare the piecewise-linear approximation to the exact costs
+
+    Besides the deviation of the objective values, the exact costs of the
+    approximated schedule are compared to the exact optimum.
+    """
+    exact = solve_formulation(inputs, formulation)
+    approximated = solve_formulation(inputs, formulation, pwl_segments)
+    exact_costs_of_approximation = (
+        approximated["costs"] - approximated["approximation_error"]
+    )
+
+    return {
+        "seconds_exact": exact["duration"],
+        "seconds_approximated": approximated["duration"],
+        "costs_rel_deviation": abs(approximated["costs"] - exact["costs"])
+        / abs(exact["costs"]),
+        "approximation_error": approximated["approximation_error"],
+        "costs_rel_suboptimality": (
+            exact_costs_of_approximation - exact["costs"]
+        )
+        / abs(exact["costs"]),
+        "demand_after_max_abs_deviation": np.abs(
+            approximated["demand_after"] - exact["demand_after"]
+        ).max(),
+    }
+
+
+def validate_cluster(cluster: str, args: argparse.Namespace) -> Dict:
+    """Run the comparison chosen by the command-line arguments"""
+    inputs = create_inputs(
+        REPRESENTATIVE_CLUSTERS[cluster],
+        args.hours,
+        args.solver,
+        args.price_sensitivity,
+    )
+    if args.pwl_segments > 0:
+        return compare_approximation(
+            inputs, args.formulation, args.pwl_segments
+        )
+
+    return compare_formulations(inputs)
+
+
+def add_args():
+    """Parse command-line arguments"""
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument(
+        "--hours", type=int, default=168, help="time steps per model run"
+    )
+    parser.add_argument(
+        "--solver", default="gurobi", help="solver to use (pyomo name)"
+    )
+    parser.add_argument(
+        "--price-sensitivity",
+        type=float,
+        default=0.0,
+        help="price sensitivity in EUR/MWh per MW (> 0 yields a QP)",
+    )
+    parser.add_argument(
+        "--pwl-segments",
+        type=int,
+        default=0,
+        help="if > 0, compare an approximation of the price sensitivity "
+        "costs with this number of segments against the exact costs",
+    )
+    parser.add_argument(
+        "--formulation",
+        default="h_indexed",
+        choices=list(FORMULATIONS),
+        help="formulation to use when comparing the approximation",
+    )
+    parser.add_argument(
+        "--clusters",
+        nargs="+",
+        default=list(REPRESENTATIVE_CLUSTERS),
+        choices=list(REPRESENTATIVE_CLUSTERS),
+        help="clusters to validate",
+    )
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=COMPARISON_TOLERANCE,
+        help="maximum relative deviation of total costs",
+    )
+    parser.add_argument(
+        "--schedule-tolerance",
+        type=float,
+        default=SCHEDULE_TOLERANCE,
+        help="maximum absolute deviation of demand after shifting in MW",
+    )
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = add_args()
+    comparison = pd.DataFrame(
+        {cluster: validate_cluster(cluster, args) for cluster in args.clusters}
+    )
+    with pd.option_context("display.width", 200, "display.max_columns", None):
+        print(comparison)
+    deviating = comparison.columns[
+        comparison.loc["costs_rel_deviation"] > args.tolerance
+    ]
+    if len(deviating) > 0:
+        raise SystemExit(
+            f"Costs deviate by more than {args.tolerance} for "
+            f"{list(deviating)}"
+        )
+    # approximated schedules may deviate even for matching costs
+    if args.pwl_segments == 0:
+        deviating = comparison.columns[
+            comparison.loc["demand_after_max_abs_deviation"]
+            > args.schedule_tolerance
+        ]
+        if len(deviating) > 0:
+            raise SystemExit(
+                f"Demand after shifting deviates by more than "
+                f"{args.schedule_tolerance} MW for {list(deviating)}"
+            )
+    if args.pwl_segments > 0:
+        print("Approximation matches the exact price sensitivity costs.")
+    else:
+        print("Compact formulation matches the H-indexed formulation.")
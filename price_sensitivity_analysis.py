@@ -1,56 +1,124 @@
-from typing import Dict
+from concurrent.futures import Executor, ThreadPoolExecutor
+from typing import Dict, List
 
-import matplotlib as mpl
-
-mpl.use("Agg")
-
-import matplotlib.pyplot as plt
 import numpy as np
 import pandas as pd
 
+from dr_analyses.fame_time_series import (
+    convert_to_fame_time_stamps,
+    read_fame_time_series,
+    save_series_for_fame,
+)
+from dr_analyses.results_reader import (
+    get_output_fingerprint,
+    read_agent_output,
+)
 from dr_analyses.time import create_time_index, cut_leap_days
-from dr_analyses.workflow_routines import make_directory_if_missing
+from dr_analyses.workflow_routines import (
+    make_directory_if_missing,
+    get_file_fingerprint,
+)
+
+# Residual load per baseline output; see calculate_residual_load
+RESIDUAL_LOAD_CACHE = {}
+PLOT_MODES = ["immediate", "deferred", "none"]
+
+
+def analyse_price_sensitivities_for_dr_scen(
+    config: Dict, dr_scens: List[str], power_margins: Dict
+) -> List[Dict]:
+    """Analyze price sensitivity for all tariff scenarios of a dr scenario
+
+    Residual load and wholesale prices are taken from the baseline run and
+    hence shared by all tariff scenarios. Per year calculations are run in
+    parallel. Scatter plots are either created immediately, deferred, i.e.
+    returned to be created by create_deferred_price_sensitivity_plots,
+    or skipped entirely, depending on config["price_sensitivity"]["plots"].
+    """
+    residual_load = calculate_residual_load(config, dr_scens[0])
+    electricity_price = prepare_electricity_price(
+        config, "EnergyExchangeMulti.csv", dr_scens[0]
+    )
+    plot_mode = config["price_sensitivity"]["plots"]
+    if plot_mode not in PLOT_MODES:
+        raise ValueError(
+            f"Invalid price sensitivity plot mode {plot_mode}. "
+            f"Must be one of {PLOT_MODES}."
+        )
+    deferred_plots = []
+    with ThreadPoolExecutor(
+        max_workers=config["price_sensitivity"]["n_workers"]
+    ) as executor:
+        for dr_scen in dr_scens:
+            consumer_energy_price = analyse_price_sensitivity(
+                config,
+                dr_scen,
+                power_margins,
+                residual_load=residual_load,
+                electricity_price=electricity_price,
+                executor=executor,
+                make_plots=plot_mode == "immediate",
+            )
+            if plot_mode == "deferred":
+                deferred_plots.append(
+                    {
+                        "dr_scen": dr_scen,
+                        "residual_load": residual_load,
+                        "consumer_energy_price": consumer_energy_price,
+                    }
+                )
 
+    return deferred_plots
 
-def analyse_price_sensitivity(config: Dict, dr_scen: str, power_margins: Dict):
-    """Analyze price sensitivity for given cluster and tariff scenario"""
-    residual_load = calculate_residual_load(config, dr_scen)
-    consumer_energy_price = calculate_consumer_energy_price(config, dr_scen)
-    sensitivity = {}
-    price_sensitivity = pd.DataFrame(
-        index=residual_load.index, columns=["residual_load", "sensitivity"]
-    )
-    price_sensitivity["residual_load"] = residual_load
-    for iter_year in residual_load.index.year.unique():
-        residual_load_iter_year = residual_load.loc[str(iter_year)]
-        consumer_energy_price_iter_year = consumer_energy_price.loc[
-            str(iter_year)
-        ]
-        create_price_sensitivity_scatter_plot(
-            residual_load_iter_year,
-            consumer_energy_price_iter_year,
+
+def create_deferred_price_sensitivity_plots(
+    config: Dict, deferred_plots: List[Dict]
+):
+    """Create scatter plots postponed by the price sensitivity analysis"""
+    for plot in deferred_plots:
+        create_price_sensitivity_scatter_plots(
+            plot["residual_load"],
+            plot["consumer_energy_price"],
             config,
-            dr_scen,
-            iter_year,
+            plot["dr_scen"],
         )
-        determine_price_sensitivity_proxy(
-            residual_load_iter_year,
-            consumer_energy_price_iter_year,
-            sensitivity,
-            iter_year,
-            power_margins,
+
+
+def analyse_price_sensitivity(
+    config: Dict,
+    dr_scen: str,
+    power_margins: Dict,
+    residual_load: pd.Series = None,
+    electricity_price: pd.Series = None,
+    executor: Executor = None,
+    make_plots: bool = True,
+) -> pd.Series:
+    """Analyze price sensitivity for given cluster and tariff scenario
+
+    Residual load and electricity price are read from the baseline results
+    if not given. Return the consumer energy price used for the estimate.
+    """
+    if residual_load is None:
+        residual_load = calculate_residual_load(config, dr_scen)
+    consumer_energy_price = calculate_consumer_energy_price(
+        config, dr_scen, electricity_price
+    )
+    years = [str(year) for year in residual_load.index.year.unique()]
+    map_function = executor.map if executor is not None else map
+    price_sensitivity = pd.concat(
+        map_function(
+            lambda year: determine_price_sensitivity_for_year(
+                residual_load.loc[year],
+                consumer_energy_price.loc[year],
+                power_margins,
+            ),
+            years,
         )
-        conditions = [
-            residual_load_iter_year
-            < sensitivity[iter_year]["residual_load_lower"],
-            residual_load_iter_year
-            > sensitivity[iter_year]["residual_load_upper"],
-        ]
-        choices = [0, 0]
-        price_sensitivity.loc[str(iter_year), "sensitivity"] = np.select(
-            conditions, choices, sensitivity[iter_year]["slope"]
+    )
+    if make_plots:
+        create_price_sensitivity_scatter_plots(
+            residual_load, consumer_energy_price, config, dr_scen
         )
-    price_sensitivity = price_sensitivity["sensitivity"]
     path_inputs = (
         f"{config['input_folder']}/"
         f"{config['data_sub_folder']}/"
@@ -64,9 +132,47 @@ def analyse_price_sensitivity(config: Dict, dr_scen: str, power_margins: Dict):
         filename=f"price_sensitivity_estimate_{dr_scen}",
     )
 
+    return consumer_energy_price
+
+
+def determine_price_sensitivity_for_year(
+    residual_load: pd.Series,
+    consumer_energy_price: pd.Series,
+    power_margins: Dict[str, float],
+) -> pd.Series:
+    """Determine price sensitivity time series for a single year
+
+    Sensitivity is set to zero outside the residual load range
+    between minimum and maximum price extended by the power margins.
+    """
+    sensitivity = {}
+    year = residual_load.index.year[0]
+    determine_price_sensitivity_proxy(
+        residual_load,
+        consumer_energy_price,
+        sensitivity,
+        year,
+        power_margins,
+    )
+    conditions = [
+        residual_load < sensitivity[year]["residual_load_lower"],
+        residual_load > sensitivity[year]["residual_load_upper"],
+    ]
+    choices = [0, 0]
+    return pd.Series(
+        index=residual_load.index,
+        data=np.select(conditions, choices, sensitivity[year]["slope"]),
+        name="sensitivity",
+    )
+
+
+def calculate_residual_load(config: Dict, dr_scen: str) -> pd.Series:
+    """Calculate residual load from demand and vRES infeed
 
-def calculate_residual_load(config: Dict, dr_scen: str):
-    """Calculate residual load from demand and vRES infeed"""
+    The residual load only depends on the baseline results of the demand
+    response scenario, hence it is calculated once per baseline output and
+    simulation time frame and served from cache afterwards.
+    """
     dr_scen_short = dr_scen.split("_", 1)[0]
     path_results = (
         f"{config['output_folder']}/"
@@ -74,18 +180,43 @@ def calculate_residual_load(config: Dict, dr_scen: str):
         f"{dr_scen_short}/"
         f"scenario_wo_dr_{dr_scen_short}"
     )
-    demand = pd.read_csv(f"{path_results}/DemandTrader.csv", sep=";")
-    demand = demand["AwardedEnergyInMWH"].dropna().reset_index(drop=True)
-    vres_infeed = pd.read_csv(
-        f"{path_results}/VariableRenewableOperator.csv", sep=";"
+    demand_file = f"{path_results}/DemandTrader.csv"
+    vres_file = f"{path_results}/VariableRenewableOperator.csv"
+    output_fingerprint = get_output_fingerprint(path_results)
+    if output_fingerprint is not None:
+        # Outputs were loaded to memory, no csv files exist
+        input_fingerprints = (path_results, output_fingerprint)
+    else:
+        input_fingerprints = (
+            demand_file,
+            get_file_fingerprint(demand_file),
+            vres_file,
+            get_file_fingerprint(vres_file),
+        )
+    cache_key = (
+        config["output_reader"]["downcast_to_float32"],
+        config["simulation"]["StartTime"],
+        config["simulation"]["StopTime"],
+        *input_fingerprints,
+    )
+    if cache_key not in RESIDUAL_LOAD_CACHE:
+        RESIDUAL_LOAD_CACHE[cache_key] = derive_residual_load(
+            config, path_results
+        )
+
+    return RESIDUAL_LOAD_CACHE[cache_key].copy()
+
+
+def derive_residual_load(config: Dict, path_results: str) -> pd.Series:
+    """Derive residual load reading only the columns needed"""
+    demand = read_agent_output(path_results, "DemandTrader", config)
+    vres_infeed = sum_per_time_step(
+        read_agent_output(path_results, "VariableRenewableOperator", config),
+        "OfferedPowerInMW",
     )
-    vres_infeed = (
-        vres_infeed.loc[vres_infeed["OfferedPowerInMW"].notna()]
-        .groupby("TimeStep")
-        .sum()["OfferedPowerInMW"]
-        .reset_index(drop=True)
+    residual_load = pd.Series(
+        demand["AwardedEnergyInMWH"].values - vres_infeed
     )
-    residual_load = demand - vres_infeed
     residual_load_index = create_time_index(
         start_time=config["simulation"]["StartTime"],
         end_time=config["simulation"]["StopTime"],
@@ -96,7 +227,20 @@ def calculate_residual_load(config: Dict, dr_scen: str):
     return cut_leap_days(residual_load)
 
 
-def calculate_consumer_energy_price(config: Dict, dr_scen: str):
+def sum_per_time_step(data: pd.DataFrame, column: str) -> np.ndarray:
+    """Sum up values of given column for all agents per time step
+
+    Uses a single integer-keyed bincount instead of a groupby operation.
+    """
+    _, time_step_positions = np.unique(
+        data["TimeStep"].values, return_inverse=True
+    )
+    return np.bincount(time_step_positions, weights=data[column].values)
+
+
+def calculate_consumer_energy_price(
+    config: Dict, dr_scen: str, electricity_price: pd.Series = None
+):
     """Calculate energy price considering static components and dynamic ones"""
     tariff_case = dr_scen.split("_", 1)[-1]
     path_inputs = (
@@ -111,9 +255,10 @@ def calculate_consumer_energy_price(config: Dict, dr_scen: str):
     dynamic_multiplier = prepare_tariff_series(
         path_inputs, f"dynamic_multiplier_{tariff_case}_annual.csv"
     )
-    electricity_price = prepare_electricity_price(
-        config, "EnergyExchangeMulti.csv", dr_scen
-    )
+    if electricity_price is None:
+        electricity_price = prepare_electricity_price(
+            config, "EnergyExchangeMulti.csv", dr_scen
+        )
     consumer_energy_price = (
         static_price + electricity_price * dynamic_multiplier
     )
@@ -122,13 +267,10 @@ def calculate_consumer_energy_price(config: Dict, dr_scen: str):
 
 def prepare_tariff_series(path: str, file_name: str) -> pd.Series:
     """Read, reindex, resample and return tariff series"""
-    tariff_series = pd.read_csv(
-        f"{path}/{file_name}", sep=";", index_col=0, header=None
-    )
-    tariff_series.index = pd.to_datetime(
-        tariff_series.index.str.replace("_", " ")
+    tariff_series = read_fame_time_series(
+        f"{path}/{file_name}", parse_dates=True
     )
-    return resample_to_hourly_frequency(tariff_series[1])
+    return resample_to_hourly_frequency(tariff_series)
 
 
 def prepare_electricity_price(
@@ -142,7 +284,9 @@ def prepare_electricity_price(
         f"{dr_scen_short}/"
         f"scenario_wo_dr_{dr_scen_short}"
     )
-    electricity_price = pd.read_csv(f"{path_outputs}/{file_name}", sep=";")
+    electricity_price = read_agent_output(
+        path_outputs, "EnergyExchangeMulti", config, file_name=file_name
+    )
     electricity_price_index = create_time_index(
         start_time=config["simulation"]["StartTime"],
         end_time=config["simulation"]["StopTime"],
@@ -190,6 +334,23 @@ def determine_price_sensitivity_proxy(
     }
 
 
+def create_price_sensitivity_scatter_plots(
+    residual_load: pd.Series,
+    consumer_energy_price: pd.Series,
+    config: Dict,
+    dr_scen: str,
+):
+    """Create price sensitivity scatter plots for all years"""
+    for year in residual_load.index.year.unique():
+        create_price_sensitivity_scatter_plot(
+            residual_load.loc[str(year)],
+            consumer_energy_price.loc[str(year)],
+            config,
+            dr_scen,
+            year,
+        )
+
+
 def create_price_sensitivity_scatter_plot(
     residual_load: pd.Series,
     consumer_energy_price: pd.Series,
@@ -198,6 +359,12 @@ def create_price_sensitivity_scatter_plot(
     year: int,
 ):
     """Create a scatter plot for prices over residual load for given year"""
+    # Imported on first use, since plots may be skipped or deferred
+    import matplotlib as mpl
+
+    mpl.use("Agg")
+    import matplotlib.pyplot as plt
+
     path_plots = (
         f"{config['input_folder']}/"
         f"{config['data_sub_folder']}/"
@@ -304,9 +471,8 @@ def convert_time_series_index_to_fame_time(
         manipulated DataFrame with FAME time stamps
     """
     time_series_reindexed = time_series.copy()
-    time_series_reindexed.index = time_series_reindexed.index.astype(str)
-    time_series_reindexed.index = time_series_reindexed.index.str.replace(
-        " ", "_"
+    time_series_reindexed.index = convert_to_fame_time_stamps(
+        time_series_reindexed.index
     )
 
     if save:
@@ -335,17 +501,15 @@ def save_given_data_set_for_fame(
     if isinstance(data_set, pd.DataFrame):
         if not isinstance(data_set.columns, pd.MultiIndex):
             for col in data_set.columns:
-                data_set[col].to_csv(
-                    f"{path}{filename}_{col}.csv", header=False, sep=";"
+                save_series_for_fame(
+                    data_set[col], f"{path}{filename}_{col}.csv"
                 )
         else:
             for col in data_set.columns:
-                data_set[col].to_csv(
-                    f"{path}{filename}_{col[0]}_{col[1]}.csv",
-                    header=False,
-                    sep=";",
+                save_series_for_fame(
+                    data_set[col], f"{path}{filename}_{col[0]}_{col[1]}.csv"
                 )
     elif isinstance(data_set, pd.Series):
-        data_set.to_csv(f"{path}{filename}.csv", header=False, sep=";")
+        save_series_for_fame(data_set, f"{path}{filename}.csv")
     else:
         raise ValueError("Data set must be of type pd.DataFrame or pd.Series.")
@@ -1,54 +1,36 @@
-from dr_analyses.container import Container
+from dr_analyses.container import trim_file_name
 from dr_analyses.cross_scenario_evaluation import (
     concat_results,
     evaluate_all_parameter_results,
+    get_missing_scenario_results,
     read_scenario_result,
 )
-from dr_analyses.plotting import (
-    plot_bar_charts,
-    configure_plots,
-    plot_heat_maps,
-)
-from dr_analyses.results_summary import calc_summary_parameters
-from dr_analyses.results_workflow import (
-    add_power_payments,
-    calc_load_shifting_results,
-    obtain_scenario_and_baseline_prices,
-    write_results,
-    extract_load_shifting_cashflows,
-    add_capacity_payments,
-    calculate_net_present_value,
-    add_discounted_payments_to_results,
-    calculate_load_shifting_annuity,
-    calculate_net_present_value_per_capacity,
+from dr_analyses.job_queue import JobQueue, format_progress, get_queue_file
+from dr_analyses.run_manifest import STAGES, RunManifest, get_manifest_file
+from dr_analyses.sharding import (
+    SharedStage,
+    get_run_key,
+    get_shared_folder,
+    select_shard,
 )
 from dr_analyses.workflow_config import (
-    add_args,
+    add_workflow_args,
     extract_simple_config,
     extract_config_plotting,
     extract_fame_config,
     update_run_properties,
 )
 from dr_analyses.workflow_routines import (
-    convert_amiris_results,
-    make_scenario_config,
-    run_amiris,
     make_directory_if_missing,
-    read_load_shifting_template,
-    read_load_shedding_template,
+    read_templates,
     prepare_tariff_configs,
     initialize_scenario_results_dict,
     prepare_scenario_dicts,
-    store_price_forecast_from_baseline,
-    read_investment_results_template,
-    prepare_tariffs_from_workflow,
-    load_yaml_file,
 )
-from load_shifting_api.main import LoadShiftingApiThread
-from price_sensitivity_analysis import analyse_price_sensitivity
+from dr_analyses.yaml_io import load_yaml_file
 
 if __name__ == "__main__":
-    args = add_args()
+    args = add_workflow_args()
     config_file = load_yaml_file(args.file)
     config_workflow = extract_simple_config(config_file, "config_workflow")
     config_plotting = extract_config_plotting(config_file)
@@ -75,14 +57,7 @@ if __name__ == "__main__":
         for dr_scen in config_workflow["demand_response_scenarios"]:
             prepare_tariff_configs(config_workflow, dr_scen)
 
-    templates = {
-        "tariffs": {},
-        "load_shifting": read_load_shifting_template(config_workflow),
-        "load_shedding": read_load_shedding_template(config_workflow),
-        "investment_results": read_investment_results_template(
-            config_workflow
-        ),
-    }
+    templates = read_templates(config_workflow)
 
     (
         scenario_files,
@@ -92,122 +67,246 @@ if __name__ == "__main__":
     ) = prepare_scenario_dicts(templates, config_workflow)
 
     scenario_results = initialize_scenario_results_dict(config_workflow)
+    deferred_price_sensitivity_plots = []
+
+    # Shards only simulate; results of all shards are evaluated by merging
+    if not (
+        config_workflow["amiris_analyses"]["skip_simulation"] or args.merge
+    ):
+        # Heavy dependencies (fameio, matplotlib, pyomo, fastapi) are only
+        # imported by the stages using them, keeping evaluation runs fast
+        from dr_analyses.workflow_stages import (
+            aggregate_scenario_results,
+            clear_time_series_pool,
+            drain_job_queue,
+            enqueue_tariff_scenarios,
+            group_scenarios_by_dr_scenario,
+            load_baseline_results,
+            make_scenarios,
+            prepare_tariff_inputs,
+            prepare_tariff_scenarios,
+            process_scenario_results,
+            release_scenario_outputs,
+            run_baseline_stages,
+            simulate_scenarios,
+        )
+        from price_sensitivity_analysis import (
+            create_deferred_price_sensitivity_plots,
+        )
 
-    if not config_workflow["amiris_analyses"]["skip_simulation"]:
+        manifest = RunManifest(
+            get_manifest_file(
+                config_workflow,
+                args.shard,
+                args.worker_name if args.worker else None,
+            ),
+            resume=args.resume,
+        )
+        job_queue = None
+        if args.enqueue or args.worker:
+            job_queue = JobQueue(
+                get_queue_file(config_workflow),
+                config_workflow["job_queue"]["heartbeat_interval"],
+                config_workflow["job_queue"]["heartbeat_timeout"],
+                config_workflow["job_queue"]["max_attempts"],
+            )
+        load_shifting_api_thread = None
         if config_workflow["amiris_analyses"]["start_web_service"]:
-            load_shifting_api_thread = LoadShiftingApiThread()
+            from load_shifting_api.main import LoadShiftingApiThread
+
+            amiris_analyses = config_workflow["amiris_analyses"]
+            load_shifting_api_thread = LoadShiftingApiThread(
+                formulation=amiris_analyses["load_shifting_formulation"],
+                pwl_segments=amiris_analyses["pwl_segments"],
+                cache_size=amiris_analyses["response_cache"]["max_entries"],
+                cache_directory=amiris_analyses["response_cache"][
+                    "directory"
+                ],
+                record_directory=amiris_analyses["record_requests"],
+                max_concurrent_solves=amiris_analyses["max_concurrent_solves"],
+                warm_up_solver=templates["load_shifting"]["Attributes"][
+                    "Strategy"
+                ]["Api"]["Solver"],
+            )
             load_shifting_api_thread.start()
+            load_shifting_api_thread.wait_until_ready(
+                amiris_analyses["api_ready_timeout"]
+            )
 
             service_url = load_shifting_api_thread.get_url()
             templates["load_shifting"]["Attributes"]["Strategy"]["Api"][
                 "ServiceUrl"
             ] = service_url
 
-        for dr_scen, scenario in scenario_files.items():
-            dr_scen_short = dr_scen.split("_", 1)[0]
-            cont = Container(
-                scenario,
+        if args.worker:
+            # Workers only simulate tariff scenarios taken from the queue
+            drain_job_queue(
+                job_queue,
+                templates,
                 config_workflow,
                 config_convert,
                 config_make,
-                baseline_scenarios[dr_scen_short],
+                run_properties,
+                load_shifting_api_thread,
+                manifest,
+                investment_expenses,
+                fixed_costs,
             )
-
-            cont.adapt_simulation_time_frame(
-                cont.config_workflow["simulation"]
+            dr_scen_groups = {}
+        else:
+            dr_scen_groups = group_scenarios_by_dr_scenario(
+                scenario_files, baseline_scenarios
             )
-            cont.adapt_shortage_capacity(
-                config_workflow["simulation"][
-                    "artificial_shortage_capacity_in_MW"
-                ]
-            )
-
-            if scenario != baseline_scenarios[dr_scen_short]:
-                cont.add_load_shifting_agent(
-                    templates["load_shifting"], dr_scen
+        for dr_scen_short, dr_scen_scenarios in dr_scen_groups.items():
+            all_tariff_scenarios = dr_scen_scenarios["tariffs"]
+            if args.shard is not None:
+                all_tariff_scenarios = select_shard(
+                    all_tariff_scenarios, args.shard
                 )
-                if config_workflow["tariff_config"]["mode"] == "from_workflow":
-                    prepare_tariffs_from_workflow(cont, templates)
-                cont.add_load_shifting_config(dr_scen, templates)
-                cont.update_price_forecast(dr_scen)
-                cont.change_contract_location(
-                    f"{cont.config_workflow['input_folder']}/contracts_w_dr"
+            # Completed scenarios are skipped when resuming a run
+            tariff_scenarios = {
+                dr_scen: scenario
+                for dr_scen, scenario in all_tariff_scenarios.items()
+                if manifest.plan(trim_file_name(scenario), STAGES)
+            }
+            if args.enqueue:
+                # Scenarios queued, running or done are not queued again
+                job_statuses = job_queue.get_statuses()
+                tariff_scenarios = {
+                    dr_scen: scenario
+                    for dr_scen, scenario in tariff_scenarios.items()
+                    if job_statuses.get(dr_scen, "failed") == "failed"
+                }
+            # Baseline first, since tariff scenarios depend on its results
+            baseline_key, baseline_scenario = dr_scen_scenarios["baseline"]
+            baseline_stages_args = (
+                baseline_key,
+                baseline_scenario,
+                templates,
+                config_workflow,
+                config_convert,
+                config_make,
+                run_properties[dr_scen_short],
+                load_shifting_api_thread,
+                manifest,
+            )
+            if args.shard is None:
+                baseline_conts = run_baseline_stages(
+                    *baseline_stages_args, bool(tariff_scenarios)
                 )
             else:
-                cont.create_dummy_price_forecast(dr_scen)
-                cont.update_price_forecast(dr_scen)
-
-            cont.update_load_shedding_config(
-                dr_scen, templates["load_shedding"]
-            )
-            cont.add_investment_capacities_for_scenario(
-                dr_scen, templates["investment_results"]
-            )
-            cont.update_opex_for_scenario(dr_scen)
-            cont.update_all_paths_with_focus_cluster()
-            if scenario != baseline_scenarios[dr_scen_short]:
-                power_margins = cont.evaluate_shifting_power_margins()
-                analyse_price_sensitivity(
-                    cont.config_workflow, dr_scen, power_margins
+                # The baseline and shared tariff inputs are prepared by the
+                # first shard getting to it, all others wait for them
+                shared_stage = SharedStage(
+                    get_shared_folder(config_workflow),
+                    f"baseline_{dr_scen_short}",
+                    get_run_key(args.file, args.run_id),
+                    config_workflow["sharding"]["baseline_timeout"],
                 )
-                cont.replace_price_sensitivity_for_load_shifting(dr_scen)
-            cont.save_scenario_yaml()
+                if shared_stage.claim():
+                    with shared_stage.hold():
+                        baseline_conts = run_baseline_stages(
+                            *baseline_stages_args, True
+                        )
+                        prepare_tariff_inputs(
+                            dr_scen_scenarios["tariffs"],
+                            templates,
+                            baseline_scenario,
+                            config_workflow,
+                            config_convert,
+                            config_make,
+                        )
+                elif tariff_scenarios:
+                    baseline_conts = load_baseline_results(
+                        baseline_scenario,
+                        templates,
+                        config_workflow,
+                        config_convert,
+                        config_make,
+                    )
+                else:
+                    baseline_conts = []
 
-            if config_workflow["amiris_analyses"]["make_scenario"]:
-                make_scenario_config(cont)
-            if config_workflow["amiris_analyses"]["run_amiris"]:
-                if not load_shifting_api_thread.is_alive():
-                    raise Exception("LoadShiftingAPI is not available.")
-                run_amiris(run_properties[dr_scen_short], cont)
-            if config_workflow["amiris_analyses"]["convert_results"]:
-                convert_amiris_results(cont)
-                if scenario == baseline_scenarios[dr_scen_short]:
-                    store_price_forecast_from_baseline(cont)
-            if (
-                config_workflow["amiris_analyses"]["process_results"]
-                and "_wo_dr" not in scenario
-            ):
-                obtain_scenario_and_baseline_prices(cont)
-                calc_load_shifting_results(cont, dr_scen)
-                add_power_payments(
-                    cont,
-                    config_workflow["amiris_analyses"][
-                        "use_baseline_prices_for_comparison"
-                    ],
-                )
-                add_capacity_payments(
-                    cont,
+            # Prepare and compile all tariff scenarios at once
+            tariff_conts, deferred_plots = prepare_tariff_scenarios(
+                tariff_scenarios,
+                templates,
+                baseline_scenario,
+                config_workflow,
+                config_convert,
+                config_make,
+                prepare_all_tariffs=args.shard is None,
+            )
+            for cont in tariff_conts.values():
+                manifest.complete(
+                    cont.trimmed_scenario, "prepare", persistent=False
                 )
-                add_discounted_payments_to_results(
-                    [
-                        "BaselineTotalPayments",
-                        "ShiftingTotalPayments",
-                        "VariableShiftingCostsFromOptimiser",
-                    ],
-                    cont,
+            deferred_price_sensitivity_plots.extend(deferred_plots)
+            if args.enqueue:
+                enqueue_tariff_scenarios(
+                    tariff_conts, job_queue, dr_scen_short, baseline_scenario
                 )
-                cont.add_cashflows(
-                    extract_load_shifting_cashflows(cont, dr_scen, fixed_costs)
+                release_scenario_outputs(baseline_conts)
+                continue
+            if config_workflow["amiris_analyses"]["make_scenario"]:
+                make_scenarios(
+                    list(tariff_conts.values()), config_workflow, manifest
                 )
-                cont.add_npv(
-                    calculate_net_present_value(
-                        cont, dr_scen, investment_expenses, fixed_costs
+                # Time series paths differ between dr scenarios
+                clear_time_series_pool()
+
+            simulate_scenarios(
+                list(tariff_conts.values()),
+                run_properties[dr_scen_short],
+                load_shifting_api_thread,
+                manifest,
+            )
+            for dr_scen, cont in tariff_conts.items():
+                if config_workflow["amiris_analyses"][
+                    "process_results"
+                ] and manifest.is_pending(cont.trimmed_scenario, "process"):
+                    process_scenario_results(
+                        cont,
+                        dr_scen,
+                        investment_expenses,
+                        fixed_costs,
+                        manifest,
                     )
-                )
-                cont.add_npv_per_capacity(
-                    calculate_net_present_value_per_capacity(cont)
-                )
-                cont.add_annuity(calculate_load_shifting_annuity(cont))
-                if config_workflow["write_results"]:
-                    write_results(cont)
-            if (
-                config_workflow["amiris_analyses"]["aggregate_results"]
-                and "_wo_dr" not in scenario
-            ):
-                calc_summary_parameters(cont)
-                scenario_results[dr_scen_short][dr_scen] = cont.summary_series
-
-    if config_workflow["evaluate_cross_scenarios"]:
+                if config_workflow["amiris_analyses"][
+                    "aggregate_results"
+                ] and manifest.is_pending(cont.trimmed_scenario, "aggregate"):
+                    scenario_results[dr_scen_short][
+                        dr_scen
+                    ] = aggregate_scenario_results(cont, manifest)
+            release_scenario_outputs([*baseline_conts, *tariff_conts.values()])
+
+        create_deferred_price_sensitivity_plots(
+            config_workflow, deferred_price_sensitivity_plots
+        )
+        if job_queue is not None:
+            print(f"Job queue: {format_progress(job_queue.get_progress())}")
+
+    if args.merge:
+        missing_results = get_missing_scenario_results(
+            config_workflow, scenario_files
+        )
+        if missing_results:
+            raise FileNotFoundError(
+                f"No results for scenarios {missing_results}. "
+                "Make sure all shards or workers completed before merging."
+            )
+    # Shards and workers only hold part of the results, see --merge
+    partial_run = args.shard is not None or args.enqueue or args.worker
+    if config_workflow["financial_sweep"]["enabled"] and not partial_run:
+        # Financial parameters are evaluated from processed results only
+        from dr_analyses.financial_sweep import run_financial_sweep
+
+        run_financial_sweep(
+            config_workflow, scenario_files, investment_expenses, fixed_costs
+        )
+    if (
+        config_workflow["evaluate_cross_scenarios"] or args.merge
+    ) and not partial_run:
         for dr_scen, scenario in scenario_files.items():
             if "_wo_dr" not in scenario:
                 dr_scen_short = dr_scen.split("_", 1)[0]
@@ -227,6 +326,12 @@ if __name__ == "__main__":
                 config_workflow, overall_results, dr_scen
             )
             if config_workflow["make_plots"]:
+                from dr_analyses.plotting import (
+                    configure_plots,
+                    plot_bar_charts,
+                    plot_heat_maps,
+                )
+
                 configure_plots(config_plotting)
                 plot_bar_charts(
                     config_workflow,